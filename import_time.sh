@@ -0,0 +1,2 @@
+#/bin/bash
+python3 -m src.casambi.__main__import_time "$@"
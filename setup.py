@@ -22,12 +22,22 @@ setup(
     url="https://github.com/hellqvio86/casambi",
     download_url="https://github.com/hellqvio86/casambi/archive/v_01.tar.gz",
     keywords=["casambi", "light"],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     install_requires=["requests", "websocket-client", "pyyaml"],
     extras_require={
+        "async": [
+            "aiohttp",
+        ],
+        "numpy": [
+            "numpy",
+        ],
+        "fast": [
+            "orjson",
+        ],
         "tests": [
+            "pytest",
             "pyyaml",
-        ]
+        ],
     },
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -35,6 +45,5 @@ setup(
         "Topic :: Software Development :: Build Tools",
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
     ],
 )
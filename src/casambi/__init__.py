@@ -2,9 +2,45 @@
 """
 Library for Casambi Cloud api.
 Request api_key at: https://developer.casambi.com/
+
+The clients are imported on first use, so importing casambi does not load
+requests, websocket-client or aiohttp.
 """
-import logging
 
-from .public_casambi_api import Casambi
+import importlib
+
+__all__ = ["Casambi", "AsyncCasambi", "CasambiNetworkManager"]
+
+# Attributes and the module they are imported from on first use
+_LAZY_ATTRIBUTES = {
+    "Casambi": ".public_casambi_api",
+    "CasambiNetworkManager": ".network_manager",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+
+        globals()[name] = value
+        return value
+
+    if name == "AsyncCasambi":
+        try:
+            from .async_casambi_api import AsyncCasambi
+        except ImportError as err:
+            # aiohttp is only installed with the "async" extra
+            raise AttributeError(
+                f"module {__name__!r} has no attribute {name!r}, "
+                'install casambi[async] to use it'
+            ) from err
+
+        globals()["AsyncCasambi"] = AsyncCasambi
+        return AsyncCasambi
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-_LOGGER = logging.getLogger(__name__)
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
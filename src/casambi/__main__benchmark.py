@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+"""
+End to end load benchmark against casambi.mock_cloud, reports commands/s,
+send to unitChanged event latency and client memory for synthetic networks
+of different sizes. The mock cloud runs in its own process so the memory
+numbers are for the client only.
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from pprint import pprint
+
+sys.path.append(os.path.split(os.path.dirname(sys.argv[0]))[0])
+
+try:
+    import casambi
+except ModuleNotFoundError as err:
+    pprint(sys.path)
+    raise err
+
+from casambi.mock_cloud import MockCasambiCloud
+
+logging.basicConfig(level=logging.WARNING)
+
+DEFAULT_UNITS = (10, 100, 1000, 10000)
+DEFAULT_COMMANDS = 2000
+
+
+def run_mock_cloud(*, units, latency, jitter, ports, stop):
+    with MockCasambiCloud(units=units, latency=latency, jitter=jitter) as cloud:
+        ports.put(cloud.port)
+        stop.wait()
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+
+    return values[index]
+
+
+def run_benchmark(*, units, commands, latency, jitter, timeout):
+    ports = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=run_mock_cloud,
+        kwargs={
+            "units": units,
+            "latency": latency,
+            "jitter": jitter,
+            "ports": ports,
+            "stop": stop,
+        },
+        daemon=True,
+    )
+    process.start()
+    port = ports.get()
+
+    worker = casambi.Casambi(
+        api_key="benchmark",
+        email="benchmark@example.com",
+        user_password="benchmark",
+        network_password="benchmark",
+        api_url=f"http://127.0.0.1:{port}/v1",
+        ws_url=f"ws://127.0.0.1:{port}/v1/bridge/",
+    )
+
+    sent_at = collections.defaultdict(collections.deque)
+    latencies = []
+    done = threading.Event()
+
+    def unit_changed(message):
+        pending = sent_at[message["id"]]
+
+        if not pending:
+            return
+
+        latencies.append(time.perf_counter() - pending.popleft())
+
+        if len(latencies) == commands:
+            done.set()
+
+    try:
+        worker.create_network_session()
+        worker.ws_open()
+
+        # Only trace after requests and websocket are imported on first use
+        tracemalloc.start()
+
+        worker.start_state_mirror(queue_size=commands + units)
+        worker.add_event_callback(unit_changed, method="unitChanged")
+
+        start = time.perf_counter()
+
+        for index in range(commands):
+            unit_id = index % units + 1
+            sent_at[unit_id].append(time.perf_counter())
+            worker.set_unit_value(unit_id=unit_id, value=(index % 100) / 100)
+
+        sent = time.perf_counter()
+        done.wait(timeout)
+        end = time.perf_counter()
+
+        (_, peak_memory) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        worker.close()
+        stop.set()
+        process.join()
+
+    return {
+        "units": units,
+        "commands": commands,
+        "events": len(latencies),
+        "send_rate": commands / (sent - start),
+        "rate": len(latencies) / (end - start),
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "memory": peak_memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--units", type=int, nargs="+", default=DEFAULT_UNITS)
+    parser.add_argument("--commands", type=int, default=DEFAULT_COMMANDS)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added by the cloud"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random 0 - jitter seconds added"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(
+        f"{'units':>6} {'commands':>8} {'events':>8} {'sent/s':>10}"
+        f" {'commands/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'memory MiB':>10}"
+    )
+
+    for units in args.units:
+        result = run_benchmark(
+            units=units,
+            commands=args.commands,
+            latency=args.latency,
+            jitter=args.jitter,
+            timeout=args.timeout,
+        )
+
+        print(
+            f"{result['units']:>6} {result['commands']:>8} {result['events']:>8}"
+            f" {result['send_rate']:>10.0f} {result['rate']:>10.0f}"
+            f" {result['p50'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f}"
+            f" {result['memory'] / (1024 * 1024):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
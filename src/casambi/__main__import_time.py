@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Import time benchmark, runs python -X importtime in fresh interpreters and
+reports the median time to import casambi and to load the Casambi client.
+
+Exits with 1 when a plain "import casambi" loads one of the heavy
+dependencies or takes longer than the budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = (
+    "import casambi",
+    "import casambi; casambi.Casambi",
+)
+
+# Dependencies that should only be loaded on first use
+HEAVY_MODULES = ("requests", "urllib3", "websocket", "aiohttp", "numpy", "orjson")
+
+DEFAULT_RUNS = 7
+DEFAULT_BUDGET_MS = 5.0
+
+
+def _run_importtime(statement: str) -> dict:
+    """
+    Self import time in microseconds per module imported by a fresh
+    interpreter running statement, interpreter startup included
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(package_dir)] + [env.get("PYTHONPATH", "")]
+    ).rstrip(os.pathsep)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    modules = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        (self_time, _, name) = line[len("import time:") :].split("|", 2)
+
+        if self_time.strip() == "self [us]":
+            continue
+
+        modules[name.strip()] = int(self_time)
+
+    return modules
+
+
+def import_time(statement: str):
+    """
+    Import time in microseconds of everything statement imports beyond
+    what a bare interpreter imports, and the names of those modules.
+
+    -X importtime lists the imports of a module before the module itself,
+    so the modules are the difference with a baseline run of "pass".
+    """
+    baseline = _run_importtime("pass")
+    modules = {
+        name: self_time
+        for name, self_time in _run_importtime(statement).items()
+        if name not in baseline
+    }
+
+    return (sum(modules.values()), list(modules))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help='maximum median time for "import casambi"',
+    )
+    args = parser.parse_args()
+
+    failed = False
+
+    for statement in STATEMENTS:
+        runs = [import_time(statement) for _ in range(args.runs)]
+        median = statistics.median(total for (total, _) in runs) / 1000.0
+        modules = runs[0][1]
+
+        print(f"{statement:<40} {median:>8.2f} ms {len(modules):>4} modules")
+
+        if statement != STATEMENTS[0]:
+            continue
+
+        heavy = sorted(
+            {name.split(".")[0] for name in modules} & set(HEAVY_MODULES)
+        )
+
+        if heavy:
+            print(f"  heavy modules imported: {', '.join(heavy)}")
+            failed = True
+
+        if median > args.budget_ms:
+            print(f"  over budget of {args.budget_ms} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,26 @@ def print_unit_information(*, worker: casambi.Casambi, unit_id: int):
     print(f"Does unit support rgb: {supports_rgb}")
 
 
+def print_units_information(*, worker: casambi.Casambi, unit_ids):
+    states = worker.get_unit_states(unit_ids=unit_ids)
+    fixture_ids = [
+        state["fixtureId"]
+        for state in states.values()
+        if isinstance(state, dict) and "fixtureId" in state
+    ]
+    fixtures = worker.get_fixtures_information(fixture_ids=fixture_ids)
+
+    for unit_id, state in states.items():
+        msg = f"Unit state for unit_id: {unit_id}"
+        msg += f"\n{pformat(state)}\n"
+        print(msg)
+
+    for fixture_id, data in fixtures.items():
+        msg = f"Fixture information for fixture: {fixture_id}"
+        msg += f"\n{pformat(data)}\n"
+        print(msg)
+
+
 def main():
     verbose = True
     config = parse_config()
@@ -98,9 +118,9 @@ def main():
     if len(units) == 0:
         units.append(unit_id)
 
-    for unit_id in units:
-        print_unit_information(worker=worker, unit_id=unit_id)
+    print_units_information(worker=worker, unit_ids=units)
 
+    for unit_id in units:
         print(f"Turn unit: {unit_id} on!")
         worker.turn_unit_on(unit_id=unit_id)
         time.sleep(60)
@@ -0,0 +1,708 @@
+#!/usr/bin/python3
+"""
+Asyncio version of the Casambi Cloud api client.
+Request api_key at: https://developer.casambi.com/
+"""
+import asyncio
+import uuid
+import json
+import logging
+import datetime
+import time
+from typing import Tuple
+
+import aiohttp
+
+from .capabilities import (
+    DEFAULT_CAPABILITY_TTL,
+    CapabilityCache,
+    UnitCapabilities,
+)
+from .color import color_temperature, rgb_to_hue_sat
+from .exceptions import CasambiApiException
+from .frames import to_int_id
+from .http_session import DEFAULT_API_URL, DEFAULT_POOL_SIZE, DEFAULT_WS_URL
+from .metrics import (
+    REST_REQUEST_SECONDS,
+    MetricsRegistry,
+    endpoint_name,
+    observe_ws_event,
+    observe_ws_send,
+)
+from .session_store import select_network_id
+from .unit_state import UnitState
+
+_LOGGER = logging.getLogger(__name__)
+
+# Status codes of a rejected session
+AUTH_FAILURE_STATUS_CODES = (401, 403)
+
+
+class AsyncCasambi:
+    """
+    Casambi api object for asyncio, has the same methods as Casambi but
+    every method doing I/O is a coroutine
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key,
+        email,
+        user_password,
+        network_password,
+        wire_id=1,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        headers=None,
+        capability_ttl=DEFAULT_CAPABILITY_TTL,
+        relogin_on_auth_failure=True,
+        api_url=DEFAULT_API_URL,
+        ws_url=DEFAULT_WS_URL,
+        metrics: MetricsRegistry = None,
+    ):
+        self.web_sock = None
+
+        self.connected = False
+        self.network_id = None
+        self._session_id = None
+
+        self.wire_id = wire_id
+        self.api_key = api_key
+        self.email = email
+        self.user_password = user_password
+        self.network_password = network_password
+        self.api_url = api_url.rstrip("/")
+        self.ws_url = ws_url
+        self.metrics = metrics
+
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._headers = {
+            "X-Casambi-Key": self.api_key,
+            "Content-type": "application/json",
+        }
+
+        if headers:
+            self._headers.update(headers)
+
+        # The aiohttp session needs a running event loop, it is created on
+        # first use
+        self._http = None
+
+        self._capabilities = CapabilityCache(ttl=capability_ttl)
+
+        self.relogin_on_auth_failure = relogin_on_auth_failure
+        # Created on first use like the aiohttp session, before Python 3.10
+        # a lock is bound to the event loop it was created in
+        self._relogin_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the websocket (if open) and the pooled HTTP connections
+        """
+        if self.web_sock:
+            await self.web_sock.close()
+            self.web_sock = None
+
+        if self._http:
+            await self._http.close()
+            self._http = None
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                limit_per_host=self._pool_size,
+                force_close=not self._keep_alive,
+            )
+            self._http = aiohttp.ClientSession(
+                connector=connector, headers=self._headers
+            )
+
+        return self._http
+
+    async def _request(
+        self, method: str, url: str, *, name: str, session=False, **kwargs
+    ):
+        """
+        Do a REST call and return the decoded json response. With session
+        the call is made with the session, logs in again and retries once
+        if the session is rejected
+        """
+        if session:
+            session_id = self._session_id
+            kwargs["headers"] = self._session_headers()
+
+        (status, data) = await self._send_request(method, url, **kwargs)
+
+        if (
+            session
+            and status in AUTH_FAILURE_STATUS_CODES
+            and self.relogin_on_auth_failure
+        ):
+            if self._relogin_lock is None:
+                self._relogin_lock = asyncio.Lock()
+
+            # Concurrent calls all get rejected, only the first one logs in
+            # again and the others retry with its session
+            async with self._relogin_lock:
+                if self._session_id == session_id:
+                    _LOGGER.debug(
+                        f"{name}: got status_code: {status}, logging in again"
+                    )
+                    await self.relogin()
+
+            kwargs["headers"] = self._session_headers()
+            (status, data) = await self._send_request(method, url, **kwargs)
+
+        if status != 200:
+            reason = f"{name}: url: {url} "
+            reason += 'message: "Got a invalid status_code",'
+            reason += f"status_code: {status},"
+            reason += f"response: {data}"
+
+            raise CasambiApiException(reason)
+
+        _LOGGER.debug(f"{name}: response: {data}")
+
+        return data
+
+    async def _send_request(self, method: str, url: str, **kwargs):
+        """
+        The status and the decoded json response, or the response text if
+        the status is not 200
+        """
+        start = time.perf_counter()
+
+        async with self._get_http().request(method, url, **kwargs) as response:
+            if self.metrics:
+                self.metrics.observe(
+                    REST_REQUEST_SECONDS,
+                    time.perf_counter() - start,
+                    endpoint=endpoint_name(url),
+                    method=method,
+                    status=str(response.status),
+                )
+
+            if response.status != 200:
+                return (response.status, await response.text())
+
+            return (response.status, await response.json(content_type=None))
+
+    def _session_headers(self) -> dict:
+        if not self._session_id:
+            raise CasambiApiException("No session id is set. Need to login!")
+
+        return {"X-Casambi-Session": self._session_id}
+
+    async def create_user_session(self):
+        """
+        Function for creating a user session in Casambis cloud api
+        """
+        url = f"{self.api_url}/users/session/"
+
+        payload = {"email": self.email, "password": self.user_password}
+
+        data = await self._request(
+            "POST", url, name="create_user_session", json=payload
+        )
+
+        self._session_id = data["sessionId"]
+        self.network_id = select_network_id(
+            self.network_id,
+            [network["id"] for network in data["networks"].values()],
+        )
+
+        return data["sessionId"]
+
+    async def create_network_session(self):
+        """
+        Function for creating a network session in Casambis cloud api
+        """
+        url = f"{self.api_url}/networks/session/"
+
+        payload = {"email": self.email, "password": self.network_password}
+
+        data = await self._request(
+            "POST", url, name="create_network_session", json=payload
+        )
+
+        self.network_id = select_network_id(self.network_id, data.keys())
+        self._session_id = data[self.network_id]["sessionId"]
+
+        return data.keys()
+
+    async def login(self):
+        """
+        Create new user and network sessions
+        """
+        await self.create_user_session()
+        await self.create_network_session()
+
+    async def relogin(self):
+        """
+        Log in again with new user and network sessions
+        """
+        await self.login()
+
+    async def get_network_information(self):
+        """
+        Function for getting the network information from Casambis cloud api
+        """
+        url = f"{self.api_url}/networks/{self.network_id}"
+
+        return await self._request(
+            "GET",
+            url,
+            name="get_network_information",
+            session=True,
+        )
+
+    async def get_unit_state(self, *, unit_id):
+        """
+        Getter for getting the unit state from Casambis cloud api
+        """
+        data = await self._fetch_unit_state(unit_id=unit_id)
+
+        self._capabilities.update(unit_id=int(unit_id), data=data)
+
+        return data
+
+    async def _fetch_unit_state(self, *, unit_id):
+        url = f"{self.api_url}/networks/"
+        url += f"{self.network_id}/units/{unit_id}/state"
+
+        return await self._request("GET", url, name="get_unit_state", session=True)
+
+    async def get_unit_state_model(self, *, unit_id) -> UnitState:
+        """
+        The unit state parsed into a UnitState, see get_unit_state
+        """
+        data = await self._fetch_unit_state(unit_id=unit_id)
+
+        state = UnitState.from_dict(data, unit_id=unit_id)
+        self._capabilities.update_from_state(state)
+
+        return state
+
+    async def get_unit_capabilities(self, *, unit_id: int) -> UnitCapabilities:
+        """
+        Return the capabilities of a unit, only fetches the unit state when
+        the unit is missing in the capability cache or the entry has expired
+        """
+        capabilities = self._capabilities.get(int(unit_id))
+
+        if capabilities is None:
+            # Not read back from the cache, with ttl 0 it is expired already
+            data = await self._fetch_unit_state(unit_id=unit_id)
+            capabilities = self._capabilities.update(unit_id=int(unit_id), data=data)
+
+        return capabilities
+
+    def invalidate_unit_capabilities(self, *, unit_id=None):
+        """
+        Drop cached capabilities for a unit, or for all units if no unit_id
+        is given
+        """
+        if unit_id is not None:
+            unit_id = int(unit_id)
+
+        self._capabilities.invalidate(unit_id)
+
+    async def get_supported_color_temperature(
+        self, *, unit_id: int
+    ) -> Tuple[int, int, float]:
+        """
+        Return the supported color temperatures
+
+        Returns (0, 0, 0) if nothing is supported
+        """
+        state = await self.get_unit_state_model(unit_id=unit_id)
+
+        if not state.supports_color_temperature:
+            return (0, 0, 0)
+
+        return (state.cct_min, state.cct_max, state.cct)
+
+    async def unit_supports_rgbw(self, *, unit_id: int) -> bool:
+        """
+        Returns true if unit supports rgbw
+        """
+        return (await self.get_unit_capabilities(unit_id=unit_id)).rgbw
+
+    async def unit_supports_rgb(self, *, unit_id: int) -> bool:
+        """
+        Returns true if unit supports rgb
+        """
+        return (await self.get_unit_capabilities(unit_id=unit_id)).rgb
+
+    async def unit_supports_color_temperature(self, *, unit_id: int) -> bool:
+        """
+        Returns true if unit supports color temperature
+        """
+        capabilities = await self.get_unit_capabilities(unit_id=unit_id)
+
+        return capabilities.color_temperature
+
+    async def get_unit_list(self):
+        """
+        Getter for unit lists
+        """
+        if not self.network_id:
+            raise CasambiApiException("network_id is not set!")
+
+        url = f"{self.api_url}/networks/"
+        url += f"{self.network_id}/units"
+
+        return await self._request("GET", url, name="get_unit_list", session=True)
+
+    async def get_scenes_list(self):
+        """
+        Getter for Scenes list
+        """
+        url = f"{self.api_url}/networks/"
+        url += f"{self.network_id}/scenes"
+
+        return await self._request("GET", url, name="get_scenes_list", session=True)
+
+    async def get_fixture_information(
+        self, *, unit_id: int = None, fixture_id: int = None
+    ):
+        """
+        GET https://door.casambi.com/v1/fixtures/{id}
+
+        The id is the fixtureId of a unit, see Casambi.get_fixture_information
+        """
+        if fixture_id is None:
+            fixture_id = unit_id
+
+        if fixture_id is None:
+            raise CasambiApiException("expected fixture_id (or unit_id), got none")
+
+        url = f"{self.api_url}/fixtures/{fixture_id}"
+
+        return await self._request(
+            "GET",
+            url,
+            name="get_fixture_information",
+            session=True,
+        )
+
+    async def get_network_state(self):
+        """
+        Getter for network state
+        """
+        url = f"{self.api_url}/networks/{self.network_id}/state"
+
+        return await self._request("GET", url, name="get_network_state", session=True)
+
+    async def get_network_datapoints(
+        self, *, from_time=None, to_time=None, sensor_type=0
+    ):
+        """
+        sensorType: [0 = Casambi | 1 = Vendor]
+        from: yyyyMMdd[hh[mm[ss]]]
+        to: yyyyMMdd[hh[mm[ss]]]
+        """
+        if sensor_type not in [0, 1]:
+            raise CasambiApiException("invalid sentor_type")
+
+        now = datetime.datetime.now()
+
+        if not to_time:
+            to_time = now.strftime("%Y%m%d%H%M")
+
+        if not from_time:
+            from_time = (now - datetime.timedelta(days=7)).strftime("%Y%m%d%H%M")
+
+        url = f"{self.api_url}/networks/{self.network_id}/datapoints"
+        params = {"sensorType": sensor_type, "from": from_time, "to": to_time}
+
+        return await self._request(
+            "GET",
+            url,
+            name="get_network_datapoints",
+            session=True,
+            params=params,
+        )
+
+    async def ws_open(self) -> bool:
+        """
+        Open the websocket and the wire, see Casambi.ws_open
+        """
+        url = self.ws_url
+
+        reference = "{}".format(uuid.uuid1())
+
+        if not self._session_id:
+            raise CasambiApiException("No session id is set. Need to login!")
+
+        if not self.network_id:
+            raise CasambiApiException("Network id needs to be set!")
+
+        message = {
+            "method": "open",
+            "id": self.network_id,
+            "session": self._session_id,
+            "ref": reference,
+            "wire": self.wire_id,  # wire id
+            "type": 1,  # Client type, use value 1 (FRONTEND)
+        }
+
+        self.web_sock = await self._get_http().ws_connect(
+            url, protocols=[self.api_key]
+        )
+        await self.web_sock.send_str(json.dumps(message))
+
+        data = await self.ws_recieve_message()
+
+        _LOGGER.debug(f"ws_open response: {data}")
+
+        if "wireStatus" in data and data["wireStatus"] == "openWireSucceed":
+            return True
+
+        if (
+            (("method" in data) and (data["method"] == "peerChanged"))
+            and (("wire" in data) and (data["wire"] == self.wire_id))
+            and (("online" in data) and data["online"])
+        ):
+            return True
+        return False
+
+    async def _ws_send(self, message: dict):
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        frame = json.dumps(message)
+        start = time.perf_counter()
+
+        await self.web_sock.send_str(frame)
+
+        if self.metrics:
+            observe_ws_send(self.metrics, frame, time.perf_counter() - start)
+
+    async def _control_unit(self, *, unit_id, target_controls: dict):
+        message = {
+            "wire": self.wire_id,
+            "method": "controlUnit",
+            "id": unit_id,
+            "targetControls": target_controls,
+        }
+
+        await self._ws_send(message)
+
+    async def turn_unit_off(self, *, unit_id: int):
+        """
+        Function for turning a unit of using the websocket
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        await self._control_unit(
+            unit_id=unit_id, target_controls={"Dimmer": {"value": 0}}
+        )
+
+    async def turn_unit_on(self, *, unit_id):
+        """
+        Function for turning a unit on using the websocket
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        await self._control_unit(
+            unit_id=unit_id, target_controls={"Dimmer": {"value": 1}}
+        )
+
+    async def set_unit_vertical(self, *, unit_id: int, value: float):
+        """
+        Support for setting vertical (dual led value)
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        if value < 0.0 or value > 1.0:
+            raise CasambiApiException("Value needs to be between 0 and 1")
+
+        await self._control_unit(
+            unit_id=unit_id, target_controls={"Vertical": {"value": value}}
+        )
+
+    async def set_unit_target_controls(self, *, unit_id, target_controls):
+        """
+        Send target controls for a unit
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        await self._control_unit(unit_id=unit_id, target_controls=target_controls)
+
+    async def set_unit_value(self, *, unit_id: int, value):
+        """
+        Set the dimmer value (0-1) of a unit
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        if not (value >= 0 and value <= 1):
+            raise CasambiApiException("value needs to be between 0 and 1")
+
+        await self._control_unit(
+            unit_id=unit_id, target_controls={"Dimmer": {"value": value}}
+        )
+
+    async def set_unit_rgbw_color(
+        self, *, unit_id: int, color_value: Tuple[int, int, int, int]
+    ):
+        """
+        Setter for RGBW color
+        """
+        (red, green, blue, white) = color_value
+
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        target_controls = {
+            "RGB": {"rgb": f"rgb({red}, {green}, {blue})"},
+            "Colorsource": {"source": "RGB"},
+            "White": {"value": white / 255.0},
+        }
+
+        await self._control_unit(unit_id=unit_id, target_controls=target_controls)
+
+    async def set_unit_rgb_color(
+        self, *, unit_id: int, color_value: Tuple[int, int, int], send_rgb_format=False
+    ):
+        """
+        Setter for RGB color
+        """
+        (red, green, blue) = color_value
+
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        if not send_rgb_format:
+            # Same conversion as the sync client
+            (hue, sat) = rgb_to_hue_sat([color_value], use_numpy=False)[0]
+            target_controls = {
+                "RGB": {"hue": hue, "sat": sat},
+                "Colorsource": {"source": "RGB"},
+            }
+        else:
+            target_controls = {
+                "RGB": {"rgb": f"rgb({red}, {green}, {blue})"},
+                "Colorsource": {"source": "RGB"},
+            }
+
+        await self._control_unit(unit_id=unit_id, target_controls=target_controls)
+
+    async def set_unit_color_temperature(
+        self, *, unit_id: int, value: int, source="TW"
+    ):
+        """
+        Setter for unit color temperature (kelvin)
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        capabilities = await self.get_unit_capabilities(unit_id=unit_id)
+
+        # Snapped up to the nearest 50 kelvin like the GUI and clamped to
+        # the supported range
+        target_value = color_temperature(
+            value,
+            cct_min=capabilities.cct_min,
+            cct_max=capabilities.cct_max,
+            source=source,
+        )
+
+        target_controls = {
+            "ColorTemperature": {"value": target_value},
+            "Colorsource": {"source": "TW"},
+        }
+
+        await self._control_unit(unit_id=unit_id, target_controls=target_controls)
+
+    async def _control_scene(self, *, scene_id, level):
+        scene_id = to_int_id(scene_id, "scene_id")
+
+        message = {
+            "wire": self.wire_id,
+            "method": "controlScene",
+            "id": scene_id,
+            "level": level,
+        }
+
+        await self._ws_send(message)
+
+    async def turn_scene_off(self, *, scene_id: int):
+        """
+        Turn a scene off
+        """
+        await self._control_scene(scene_id=scene_id, level=0)
+
+    async def turn_scene_on(self, *, scene_id):
+        """
+        Turn a scene on
+        """
+        await self._control_scene(scene_id=scene_id, level=1)
+
+    async def ws_recieve_message(self):
+        """
+        Wait for and return the next message on the websocket
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        msg = await self.web_sock.receive()
+
+        if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+            return self._decode_message(msg.data)
+
+        raise CasambiApiException(f"ws_recieve_message: got: {msg.type}")
+
+    def _decode_message(self, frame):
+        start = time.perf_counter()
+        data = json.loads(frame)
+
+        if self.metrics:
+            observe_ws_event(
+                self.metrics, data, len(frame), time.perf_counter() - start
+            )
+
+        return data
+
+    async def ws_recieve_messages(self, *, timeout=0.1):
+        """
+        Return the messages received until none arrives for timeout seconds
+        or the websocket is closed, see Casambi.ws_recieve_messages
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        messages = []
+
+        while True:
+            try:
+                msg = await self.web_sock.receive(timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+
+            if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                break
+
+            messages.append(self._decode_message(msg.data))
+
+        return messages
+
+    async def ws_close(self):
+        """
+        Close the wire
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        message = {"method": "close", "wire": self.wire_id}
+
+        await self.web_sock.send_str(json.dumps(message))
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+Per unit capability cache for the Casambi clients.
+"""
+import logging
+import threading
+import time
+
+from .unit_state import (
+    CAP_CCT,
+    CAP_DIMMER,
+    CAP_RGB,
+    CAP_RGBW,
+    CAP_VERTICAL,
+    UnitState,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CAPABILITY_TTL = 300.0
+
+
+class UnitCapabilities:
+    """
+    Capabilities of a unit, the flags are read from the CAP_* bitmask of
+    the UnitState they were taken from
+    """
+
+    __slots__ = ("unit_id", "capabilities", "cct_min", "cct_max", "fetched_at")
+
+    def __init__(self, *, unit_id: int, capabilities=0, cct_min=0, cct_max=0):
+        self.unit_id = unit_id
+        self.capabilities = capabilities
+        self.cct_min = cct_min
+        self.cct_max = cct_max
+        self.fetched_at = time.monotonic()
+
+    def supports(self, bits: int) -> bool:
+        return self.capabilities & bits == bits
+
+    @property
+    def dimmer(self) -> bool:
+        return self.supports(CAP_DIMMER)
+
+    @property
+    def vertical(self) -> bool:
+        return self.supports(CAP_VERTICAL)
+
+    @property
+    def rgb(self) -> bool:
+        return self.supports(CAP_RGB)
+
+    @property
+    def rgbw(self) -> bool:
+        return self.supports(CAP_RGBW)
+
+    @property
+    def color_temperature(self) -> bool:
+        return self.supports(CAP_CCT)
+
+    def __repr__(self):
+        return (
+            f"UnitCapabilities(unit_id={self.unit_id!r}, "
+            f"capabilities={self.capabilities!r}, "
+            f"cct_min={self.cct_min!r}, cct_max={self.cct_max!r})"
+        )
+
+
+def capabilities_from_state(state: UnitState) -> UnitCapabilities:
+    return UnitCapabilities(
+        unit_id=state.unit_id,
+        capabilities=state.capabilities,
+        cct_min=state.cct_min,
+        cct_max=state.cct_max,
+    )
+
+
+class CapabilityCache:
+    """
+    Thread safe cache of UnitCapabilities with a time to live in seconds,
+    ttl=None keeps entries until they are invalidated
+    """
+
+    def __init__(self, *, ttl=DEFAULT_CAPABILITY_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, unit_id: int):
+        """
+        Return the cached capabilities for unit_id or None if missing or
+        expired
+        """
+        with self._lock:
+            capabilities = self._entries.get(unit_id)
+
+            if capabilities is None:
+                return None
+
+            if (
+                self.ttl is not None
+                and time.monotonic() - capabilities.fetched_at > self.ttl
+            ):
+                del self._entries[unit_id]
+                return None
+
+            return capabilities
+
+    def update(self, *, unit_id: int, data: dict) -> UnitCapabilities:
+        """
+        Parse and store the capabilities from a unit state
+        """
+        return self.update_from_state(UnitState.from_dict(data, unit_id=unit_id))
+
+    def update_from_state(self, state: UnitState) -> UnitCapabilities:
+        """
+        Store the capabilities of an already parsed unit state
+        """
+        unit_id = state.unit_id
+        capabilities = capabilities_from_state(state)
+
+        with self._lock:
+            self._entries[unit_id] = capabilities
+
+        return capabilities
+
+    def invalidate(self, unit_id=None):
+        """
+        Drop the cached capabilities for unit_id, or for all units
+        """
+        with self._lock:
+            if unit_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(unit_id, None)
@@ -0,0 +1,289 @@
+#!/usr/bin/python3
+"""
+Batch color conversion for color commands to many units: RGB colors to
+hue/saturation and mired or Kelvin values to snapped and clamped color
+temperatures, with the same results as set_unit_rgb_color and
+set_unit_color_temperature.
+
+NumPy is used when it is installed (pip install casambi[numpy]), otherwise
+color temperatures are looked up in tables precomputed per color
+temperature range (so per fixture type) and RGB colors are converted once
+per distinct color in a batch.
+"""
+import logging
+
+from functools import lru_cache
+
+_LOGGER = logging.getLogger(__name__)
+
+# Color temperatures are snapped up to a multiple of CCT_STEP Kelvin, like
+# the app is doing
+CCT_STEP = 50
+
+# Mired values up to this are looked up in the tables, 1000 mired is 1000 K
+TABLE_MAX_MIRED = 1000
+
+_NUMPY_UNSET = object()
+_numpy_module = _NUMPY_UNSET
+
+
+def _numpy():
+    """
+    The numpy module, None when it is not installed. Only imported on first
+    use so importing casambi stays fast.
+    """
+    global _numpy_module  # pylint: disable=global-statement
+
+    if _numpy_module is _NUMPY_UNSET:
+        try:
+            import numpy  # pylint: disable=import-outside-toplevel
+
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = None
+
+    return _numpy_module
+
+
+def _use_numpy(use_numpy):
+    if use_numpy is None:
+        return _numpy()
+
+    if not use_numpy:
+        return None
+
+    numpy = _numpy()
+
+    if numpy is None:
+        raise ImportError(
+            "numpy is needed for use_numpy=True, "
+            "install it with: pip install casambi[numpy]"
+        )
+
+    return numpy
+
+
+def snap_kelvin(value) -> int:
+    """
+    Round a Kelvin value up to the next multiple of CCT_STEP
+    """
+    if value % CCT_STEP != 0:
+        return int(value / CCT_STEP) * CCT_STEP + CCT_STEP
+
+    # A whole number float like 3000.0 is sent as 3000 like every other value
+    return int(value)
+
+
+def check_mired(value):
+    """
+    Mired values needs to be positive, 0 mired would be infinite Kelvin
+    """
+    if not value > 0:
+        raise ValueError(f"mired value needs to be positive, got: {value}")
+
+
+def mired_to_kelvin(value) -> int:
+    check_mired(value)
+
+    return round(1000000 / value)
+
+
+def clamp(value, cct_min, cct_max):
+    if value < cct_min:
+        return cct_min
+
+    if value > cct_max:
+        return cct_max
+
+    return value
+
+
+def color_temperature(value, *, cct_min, cct_max, source="TW"):
+    """
+    Color temperature to send for a Kelvin (source "TW") or mired (source
+    "mired") value, snapped to CCT_STEP and clamped to cct_min..cct_max
+    """
+    if source == "mired":
+        value = mired_to_kelvin(value)
+
+    return _snap_clamp(value, cct_min, cct_max)
+
+
+def _snap_clamp(value, cct_min, cct_max) -> int:
+    # Ranges reported as floats are truncated like the NumPy path does
+    return int(clamp(snap_kelvin(value), cct_min, cct_max))
+
+
+class CctTable:
+    """
+    Snapped and clamped color temperatures of one color temperature range
+    for every whole Kelvin value up to cct_max + CCT_STEP and every whole
+    mired value from 1 up to TABLE_MAX_MIRED, other values are computed.
+    Fixtures may report the range as floats.
+    """
+
+    def __init__(self, *, cct_min, cct_max):
+        self.cct_min = cct_min
+        self.cct_max = cct_max
+
+        self.kelvin = [
+            _snap_clamp(value, cct_min, cct_max)
+            for value in range(0, max(int(cct_max), 0) + CCT_STEP + 1)
+        ]
+        # Index 0 is never looked up, 0 mired is rejected
+        self.mired = [None] + [
+            _snap_clamp(mired_to_kelvin(value), cct_min, cct_max)
+            for value in range(1, TABLE_MAX_MIRED + 1)
+        ]
+
+    def lookup(self, value, *, source="TW"):
+        if source == "mired":
+            check_mired(value)
+            table = self.mired
+        else:
+            table = self.kelvin
+
+        if isinstance(value, int) and 0 <= value < len(table):
+            return table[value]
+
+        return color_temperature(
+            value, cct_min=self.cct_min, cct_max=self.cct_max, source=source
+        )
+
+
+@lru_cache(maxsize=64)
+def cct_table(cct_min, cct_max) -> CctTable:
+    """
+    The shared table for a color temperature range, units of the same
+    fixture have the same range
+    """
+    return CctTable(cct_min=cct_min, cct_max=cct_max)
+
+
+def color_temperatures(values, *, cct_min, cct_max, source="TW", use_numpy=None):
+    """
+    color_temperature for many values in one call. cct_min and cct_max are
+    a single range or a range per value.
+
+    Returns a list of ints, or a NumPy array when NumPy is used. use_numpy
+    None uses NumPy when it is installed. Raises ValueError for mired
+    values that are not positive, on every path.
+    """
+    if source not in ("TW", "mired"):
+        raise ValueError(f"Unknown color temperature source: {source}")
+
+    values = list(values)
+
+    if source == "mired":
+        for value in values:
+            check_mired(value)
+
+    numpy = _use_numpy(use_numpy)
+
+    if numpy is not None:
+        return _color_temperatures_numpy(
+            numpy, values, cct_min=cct_min, cct_max=cct_max, source=source
+        )
+
+    if isinstance(cct_min, (int, float)) and isinstance(cct_max, (int, float)):
+        table = cct_table(cct_min, cct_max)
+
+        return [table.lookup(value, source=source) for value in values]
+
+    return [
+        cct_table(value_min, value_max).lookup(value, source=source)
+        for (value, value_min, value_max) in zip(values, cct_min, cct_max)
+    ]
+
+
+def _color_temperatures_numpy(numpy, values, *, cct_min, cct_max, source):
+    kelvin = numpy.asarray(values, dtype=numpy.float64)
+
+    if source == "mired":
+        kelvin = numpy.round(1000000 / kelvin)
+
+    kelvin = numpy.where(
+        kelvin % CCT_STEP != 0,
+        numpy.trunc(kelvin / CCT_STEP) * CCT_STEP + CCT_STEP,
+        kelvin,
+    )
+
+    # Same order as clamp, below the minimum wins over above the maximum
+    cct_min = numpy.asarray(cct_min, dtype=numpy.float64)
+    cct_max = numpy.asarray(cct_max, dtype=numpy.float64)
+    kelvin = numpy.where(
+        kelvin < cct_min, cct_min, numpy.where(kelvin > cct_max, cct_max, kelvin)
+    )
+
+    return kelvin.astype(numpy.int64)
+
+
+def rgb_to_hue_sat(colors, *, ndigits=1, use_numpy=None):
+    """
+    Hue and saturation (0-1, rounded to ndigits) for many (red, green,
+    blue) colors in one call, like set_unit_rgb_color.
+
+    Returns a list of (hue, sat) tuples, or an array of shape (n, 2) when
+    NumPy is used. use_numpy None uses NumPy when it is installed.
+    """
+    numpy = _use_numpy(use_numpy)
+
+    if numpy is None:
+        from colorsys import rgb_to_hsv  # pylint: disable=import-outside-toplevel
+
+        # Effects send the same color to many units
+        converted = {}
+        result = []
+
+        for color in colors:
+            color = tuple(color)
+            hue_sat = converted.get(color)
+
+            if hue_sat is None:
+                (hue, sat, _) = rgb_to_hsv(*color)
+                hue_sat = (round(hue, ndigits), round(sat, ndigits))
+                converted[color] = hue_sat
+
+            result.append(hue_sat)
+
+        return result
+
+    rgb = numpy.asarray(colors, dtype=numpy.float64).reshape(-1, 3)
+    (red, green, blue) = (rgb[:, 0], rgb[:, 1], rgb[:, 2])
+
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        sat = numpy.where(maxc > 0, delta / maxc, 0.0)
+
+        red_c = (maxc - red) / delta
+        green_c = (maxc - green) / delta
+        blue_c = (maxc - blue) / delta
+
+    hue = numpy.where(
+        red == maxc,
+        blue_c - green_c,
+        numpy.where(green == maxc, 2.0 + red_c - blue_c, 4.0 + green_c - red_c),
+    )
+    hue = numpy.where(delta > 0, (hue / 6.0) % 1.0, 0.0)
+
+    return _round_like_python(numpy, numpy.stack((hue, sat), axis=1), ndigits)
+
+
+def _round_like_python(numpy, values, ndigits):
+    """
+    numpy.round scales by 10 ** ndigits before rounding, which rounds
+    values close to a tie differently from round(), those are rounded with
+    round() so both paths give the same frames
+    """
+    scaled = values * 10.0 ** ndigits
+    result = numpy.round(scaled) / 10.0 ** ndigits
+
+    near_tie = numpy.abs(numpy.abs(scaled - numpy.floor(scaled)) - 0.5) < 1e-6
+
+    for index in zip(*numpy.nonzero(near_tie)):
+        result[index] = round(float(values[index]), ndigits)
+
+    return result
@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+"""
+Outgoing command queue that coalesces control frames per unit and control
+type and limits the send rate per unit and in total.
+"""
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_UNIT_RATE = 10.0
+DEFAULT_GLOBAL_RATE = 100.0
+
+# Methods that goes through the queue, everything else is sent directly
+QUEUED_METHODS = ("controlUnit", "controlScene")
+
+
+def command_key(message: dict) -> tuple:
+    """
+    Messages with the same key replaces each other in the queue, a unit
+    control only replaces a pending control of the same control types
+    """
+    method = message["method"]
+
+    if method == "controlUnit":
+        controls = tuple(sorted(message.get("targetControls", {}).keys()))
+        return (method, message["id"], controls)
+
+    return (method, message["id"])
+
+
+class CommandQueue:
+    """
+    Latest wins queue of encoded frames in front of send(frame).
+
+    A target for the same unit and control types that is still waiting
+    replaces the pending one. The unit keeps its place in the queue, but
+    the replaced target moves behind the other pending targets of the unit,
+    so the last command to a unit is also sent last (an RGB target after a
+    CCT target leaves the unit on RGB). Each unit (or scene) gets at most
+    unit_rate frames/s and all units together at most global_rate frames/s.
+    """
+
+    def __init__(
+        self,
+        *,
+        send,
+        unit_rate=DEFAULT_UNIT_RATE,
+        global_rate=DEFAULT_GLOBAL_RATE,
+        clock=time.monotonic,
+    ):
+        if unit_rate <= 0 or global_rate <= 0:
+            raise ValueError("unit_rate and global_rate needs to be positive")
+
+        self._send = send
+        self._clock = clock
+        self.unit_interval = 1.0 / unit_rate
+        self.global_interval = 1.0 / global_rate
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.errors = 0
+
+        self._pending = {}
+        # (method, id) -> deque of its pending keys in queue order, a unit
+        # is in here as long as it has exactly one entry in _ready
+        self._unit_keys = {}
+        # Heap of (time the unit may send next, sequence, (method, id))
+        self._ready = []
+        self._sequence = itertools.count()
+        # (method, id) -> time it may send next, dropped through _expiry
+        # (a heap of (time, (method, id))) once passed with nothing pending
+        self._unit_next = {}
+        self._expiry = []
+        self._global_next = 0.0
+        self._sending = False
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="casambi-command-queue", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def put_frame(self, key: tuple, frame: str):
+        """
+        Queue an already encoded frame, key is the command_key of the message
+        """
+        with self._condition:
+            if key in self._pending:
+                self.coalesced += 1
+                self._move_key_last(key)
+            else:
+                self._add_key(key)
+
+            self._pending[key] = frame
+            self.enqueued += 1
+
+            self._condition.notify()
+
+    def _add_key(self, key: tuple):
+        unit = key[:2]
+        keys = self._unit_keys.get(unit)
+
+        if keys is None:
+            keys = collections.deque()
+            self._unit_keys[unit] = keys
+            heapq.heappush(
+                self._ready,
+                (self._unit_next.get(unit, 0.0), next(self._sequence), unit),
+            )
+
+        keys.append(key)
+
+    def _move_key_last(self, key: tuple):
+        keys = self._unit_keys[key[:2]]
+
+        if keys[-1] != key:
+            keys.remove(key)
+            keys.append(key)
+
+    def supersede(self, controls) -> int:
+        """
+        Drop the pending controlUnit frames that only set control types in
+        controls, for a controlNetwork that sets them on every unit. Returns
+        how many pending controlUnit frames still set one of them.
+        """
+        controls = set(controls)
+        overlapping = 0
+
+        with self._condition:
+            for key in list(self._pending):
+                if key[0] != "controlUnit" or not controls.intersection(key[2]):
+                    continue
+
+                if controls.issuperset(key[2]):
+                    del self._pending[key]
+                    self.coalesced += 1
+                else:
+                    overlapping += 1
+
+            self._condition.notify_all()
+
+        return overlapping
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Wait until every pending message is sent, returns False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: (not self._pending and not self._sending) or self._stopped,
+                timeout,
+            )
+
+    def stop(self, *, flush=True, timeout=None):
+        """
+        Stop the sender thread, optionally sending the pending messages first
+        """
+        if flush:
+            self.flush(timeout)
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _next_message(self):
+        """
+        Pop the first message allowed to be sent now, otherwise return the
+        number of seconds until one is
+        """
+        now = self._clock()
+
+        self._expire(now)
+
+        if now < self._global_next:
+            return None, self._global_next - now
+
+        while self._ready:
+            (unit_next, _, unit) = self._ready[0]
+
+            if unit_next > now:
+                return None, unit_next - now
+
+            heapq.heappop(self._ready)
+            keys = self._unit_keys[unit]
+
+            # Keys dropped by supersede are skipped here
+            while keys and keys[0] not in self._pending:
+                keys.popleft()
+
+            if not keys:
+                del self._unit_keys[unit]
+                continue
+
+            message = self._pending.pop(keys.popleft())
+
+            unit_next = now + self.unit_interval
+            self._unit_next[unit] = unit_next
+            heapq.heappush(self._expiry, (unit_next, unit))
+
+            if keys:
+                heapq.heappush(
+                    self._ready, (unit_next, next(self._sequence), unit)
+                )
+            else:
+                del self._unit_keys[unit]
+
+            self._global_next = now + self.global_interval
+            return message, None
+
+        return None, None
+
+    def _expire(self, now: float):
+        """
+        Forget when units may send next once that time has passed and they
+        have nothing pending
+        """
+        while self._expiry and self._expiry[0][0] <= now:
+            (unit_next, unit) = heapq.heappop(self._expiry)
+
+            if self._unit_next.get(unit) == unit_next and unit not in self._unit_keys:
+                del self._unit_next[unit]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+
+                    if self._pending:
+                        message, wait = self._next_message()
+
+                        if message is not None:
+                            self._sending = True
+                            break
+                    else:
+                        wait = None
+
+                    self._condition.wait(wait)
+
+            try:
+                self._send(message)
+                self.sent += 1
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                _LOGGER.exception(f"_run: failed to send {message}")
+
+            with self._condition:
+                self._sending = False
+
+                if not self._pending:
+                    self._condition.notify_all()
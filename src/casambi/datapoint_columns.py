@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""
+Columnar (NumPy) representation of network datapoints.
+
+NumPy is an optional dependency, install with: pip install casambi[numpy]
+"""
+import array
+import datetime
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+COLUMNS = ("time", "unit_id", "value")
+
+DEFAULT_TIME_KEY = "time"
+DEFAULT_UNIT_KEY = "unitId"
+DEFAULT_VALUE_KEY = "value"
+
+
+def _import_numpy():
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(
+            "numpy is needed for columnar datapoints, "
+            "install it with: pip install casambi[numpy]"
+        ) from err
+
+    return numpy
+
+
+def to_epoch_ms(value) -> int:
+    """
+    Datapoint time as epoch milliseconds, numbers are taken as already
+    being epoch milliseconds and strings are parsed as ISO 8601. Times
+    without a timezone are local time, like parse_time takes them.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        value = datetime.datetime.fromisoformat(value)
+
+    if isinstance(value, datetime.datetime):
+        # Naive datetimes are taken as local time by timestamp
+        return int(value.timestamp() * 1000)
+
+    raise ValueError(f"unsupported datapoint time: {value}")
+
+
+def datapoints_to_columns(
+    records,
+    *,
+    time_key=DEFAULT_TIME_KEY,
+    unit_key=DEFAULT_UNIT_KEY,
+    value_key=DEFAULT_VALUE_KEY,
+) -> dict:
+    """
+    Convert an iterable of datapoint dicts to column arrays in one pass:
+
+    time: int64 epoch milliseconds
+    unit_id: int32
+    value: float32, NaN when the record has no value
+
+    records can be a generator (for example from iter_network_datapoints),
+    only the compact columns are kept in memory.
+    """
+    numpy = _import_numpy()
+
+    times = array.array("q")
+    unit_ids = array.array("i")
+    values = array.array("f")
+    nan = float("nan")
+
+    for record in records:
+        times.append(to_epoch_ms(record[time_key]))
+        unit_ids.append(int(record.get(unit_key, -1)))
+
+        value = record.get(value_key)
+        values.append(nan if value is None else float(value))
+
+    return {
+        "time": numpy.frombuffer(times, dtype=numpy.int64),
+        "unit_id": numpy.frombuffer(unit_ids, dtype=numpy.int32),
+        "value": numpy.frombuffer(values, dtype=numpy.float32),
+    }
+
+
+def save_columns(path, columns: dict):
+    """
+    Save columns as a compressed .npz file
+    """
+    numpy = _import_numpy()
+
+    numpy.savez_compressed(path, **{name: columns[name] for name in COLUMNS})
+
+
+def load_columns(path) -> dict:
+    """
+    Load columns saved with save_columns
+    """
+    numpy = _import_numpy()
+
+    with numpy.load(path) as data:
+        return {name: data[name] for name in COLUMNS}
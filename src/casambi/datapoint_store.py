@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+"""
+Local SQLite store for network datapoints, keyed on network, sensor type
+and time bucket.
+"""
+import datetime
+import json
+import logging
+import threading
+
+from .datapoints import format_time, parse_time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BUCKET = datetime.timedelta(days=1)
+
+# Buckets that ended less than this long ago are fetched again, the cloud
+# might not have received every datapoint for them yet
+DEFAULT_SETTLE_TIME = datetime.timedelta(minutes=15)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    network_id TEXT NOT NULL,
+    sensor_type INTEGER NOT NULL,
+    bucket_start TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (network_id, sensor_type, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS datapoints (
+    network_id TEXT NOT NULL,
+    sensor_type INTEGER NOT NULL,
+    bucket_start TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (network_id, sensor_type, bucket_start, seq)
+);
+"""
+
+
+def split_buckets(*, from_time, to_time, bucket=DEFAULT_BUCKET) -> list:
+    """
+    Return the (start, end) of every bucket overlapping from_time - to_time,
+    buckets are aligned to multiples of bucket since 1970-01-01 and end one
+    second before the next bucket starts
+    """
+    start = parse_time(from_time)
+    end = parse_time(to_time)
+
+    bucket_start = _EPOCH + ((start - _EPOCH) // bucket) * bucket
+    buckets = []
+
+    while bucket_start <= end:
+        buckets.append(
+            (bucket_start, bucket_start + bucket - datetime.timedelta(seconds=1))
+        )
+        bucket_start += bucket
+
+    return buckets
+
+
+class DatapointStore:
+    """
+    Datapoints of complete and partial buckets, a bucket is complete when
+    it can not get any more datapoints and never needs to be fetched again
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def complete_buckets(self, *, network_id, sensor_type) -> set:
+        """
+        Start (as datetime) of every complete bucket
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bucket_start FROM buckets"
+                " WHERE network_id = ? AND sensor_type = ? AND complete = 1",
+                (str(network_id), sensor_type),
+            ).fetchall()
+
+        return {parse_time(row[0]) for row in rows}
+
+    def get_bucket(self, *, network_id, sensor_type, bucket_start) -> list:
+        """
+        Records stored for a bucket, in the order they were fetched
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT record FROM datapoints"
+                " WHERE network_id = ? AND sensor_type = ? AND bucket_start = ?"
+                " ORDER BY seq",
+                (str(network_id), sensor_type, format_time(bucket_start)),
+            ).fetchall()
+
+        return [json.loads(row[0]) for row in rows]
+
+    def put_bucket(
+        self, *, network_id, sensor_type, bucket_start, records, complete: bool
+    ):
+        """
+        Replace the records of a bucket
+        """
+        key = (str(network_id), sensor_type, format_time(bucket_start))
+        fetched_at = format_time(datetime.datetime.now())
+
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM datapoints"
+                " WHERE network_id = ? AND sensor_type = ? AND bucket_start = ?",
+                key,
+            )
+            self._db.executemany(
+                "INSERT INTO datapoints VALUES (?, ?, ?, ?, ?)",
+                (
+                    key + (seq, json.dumps(record))
+                    for (seq, record) in enumerate(records)
+                ),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)",
+                key + (int(complete), fetched_at),
+            )
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Helpers for fetching network datapoints in time windows.
+"""
+import datetime
+import logging
+
+from .exceptions import CasambiApiException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = datetime.timedelta(days=1)
+DEFAULT_MAX_WORKERS = 4
+
+# The api takes times as yyyyMMdd[hh[mm[ss]]]
+_TIME_FORMATS = {
+    8: "%Y%m%d",
+    10: "%Y%m%d%H",
+    12: "%Y%m%d%H%M",
+    14: "%Y%m%d%H%M%S",
+}
+
+
+def parse_time(value) -> datetime.datetime:
+    """
+    Parse a yyyyMMdd[hh[mm[ss]]] string, naive datetimes are returned as
+    is. Times are naive local time like the api takes them, timezone aware
+    datetimes are converted to that.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+
+        return value
+
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+
+    time_format = _TIME_FORMATS.get(len(value))
+
+    if time_format:
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+
+    raise CasambiApiException(f"expected time as yyyyMMdd[hh[mm[ss]]], got: {value}")
+
+
+def format_time(value: datetime.datetime) -> str:
+    return value.strftime("%Y%m%d%H%M%S")
+
+
+def split_windows(*, from_time, to_time, window=DEFAULT_WINDOW) -> list:
+    """
+    Split from_time - to_time (both inclusive) into consecutive windows of
+    at most window, returned as (from, to) datetimes where every window ends
+    one second before the next starts
+    """
+    start = parse_time(from_time)
+    end = parse_time(to_time)
+
+    if window < datetime.timedelta(seconds=1):
+        raise CasambiApiException("window needs to be at least one second")
+
+    windows = []
+
+    while start <= end:
+        window_end = min(start + window - datetime.timedelta(seconds=1), end)
+        windows.append((start, window_end))
+        start = window_end + datetime.timedelta(seconds=1)
+
+    return windows
+
+
+def datapoint_time(record: dict):
+    """
+    Default sort key for datapoints
+    """
+    return record.get("time", 0)
@@ -0,0 +1,435 @@
+#!/usr/bin/python3
+"""
+Effects engine for fades, color loops and color temperature ramps, keyframed
+transitions for sets of units are sampled on one monotonic clock and only
+the units whose quantized value changed are sent each frame.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from dataclasses import dataclass, field
+
+from .color import color_temperature, rgb_to_hue_sat
+from .exceptions import CasambiApiException
+from .frames import LEVEL_STEPS, quantize_level, target_controls
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FRAME_RATE = 20.0
+DEFAULT_MIN_FRAME_RATE = 2.0
+
+# Share of the frames of the previous frame still waiting in the command
+# queue when the next frame is due before the frame rate is lowered
+DEFAULT_MAX_BACKLOG = 0.5
+
+# The frame rate is divided by this when the queue backs up and multiplied
+# by FRAME_RATE_RECOVERY for every frame that finds the queue empty
+FRAME_RATE_BACKOFF = 2.0
+FRAME_RATE_RECOVERY = 1.1
+
+CONTROLS = ("Dimmer", "Vertical", "CCT", "RGB")
+
+
+@dataclass(eq=False)
+class Transition:
+    """
+    Keyframes (seconds from the start, value) for control on unit_ids.
+
+    Values are 0-1 for Dimmer and Vertical, Kelvin for CCT and (red, green,
+    blue) for RGB, between keyframes values are interpolated linearly. With
+    repeat the keyframes loop, for example for a color loop.
+    """
+
+    unit_ids: list
+    control: str
+    keyframes: list
+    repeat: bool = False
+    started_at: float = None
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def __post_init__(self):
+        if self.control not in CONTROLS:
+            raise ValueError(
+                f"Unknown control: {self.control}, "
+                f"expected one of {', '.join(CONTROLS)}"
+            )
+
+        if not self.keyframes:
+            raise ValueError("A transition needs at least one keyframe")
+
+        self.unit_ids = [int(unit_id) for unit_id in self.unit_ids]
+        self.keyframes = sorted(self.keyframes, key=lambda keyframe: keyframe[0])
+        self._times = [offset for (offset, _) in self.keyframes]
+
+    @property
+    def duration(self) -> float:
+        return self._times[-1]
+
+    def value_at(self, elapsed: float):
+        """
+        Interpolated value elapsed seconds after the start
+        """
+        if self.repeat and self.duration > 0:
+            elapsed %= self.duration
+
+        index = bisect.bisect_right(self._times, elapsed)
+
+        if index == 0:
+            return self.keyframes[0][1]
+
+        if index == len(self.keyframes):
+            return self.keyframes[-1][1]
+
+        (start, start_value) = self.keyframes[index - 1]
+        (end, end_value) = self.keyframes[index]
+        ratio = (elapsed - start) / (end - start)
+
+        if isinstance(start_value, (tuple, list)):
+            return tuple(
+                first + (second - first) * ratio
+                for (first, second) in zip(start_value, end_value)
+            )
+
+        return start_value + (end_value - start_value) * ratio
+
+    def done_at(self, elapsed: float) -> bool:
+        return not self.repeat and elapsed >= self.duration
+
+    def wait(self, timeout=None) -> bool:
+        """
+        Wait until the last keyframe is sent, returns False on timeout
+        """
+        return self.finished.wait(timeout)
+
+
+def frame_controls(control: str, value) -> dict:
+    """
+    targetControls for a quantized Dimmer or Vertical level, Kelvin value
+    or (hue, sat)
+    """
+    if control in ("Dimmer", "Vertical"):
+        value = value / LEVEL_STEPS
+
+    return target_controls(control, value)
+
+
+class EffectsEngine:
+    """
+    Sends the transitions added to it at frame_rate frames/s through
+    casambi.set_units_target_controls, a unit gets a frame only when one of
+    its quantized values changed. Adding a transition for a unit and control
+    takes it over from the transition that had it before.
+
+    When the command queue of the client backs up (or sending a frame takes
+    longer than a frame) the frame rate is lowered down to min_frame_rate,
+    and it recovers once the queue keeps up again. Frames are never sent
+    late in a bunch, frames that are missed are skipped.
+    """
+
+    def __init__(
+        self,
+        *,
+        casambi,
+        frame_rate=DEFAULT_FRAME_RATE,
+        min_frame_rate=DEFAULT_MIN_FRAME_RATE,
+        max_backlog=DEFAULT_MAX_BACKLOG,
+        clock=time.monotonic,
+    ):
+        if frame_rate <= 0 or min_frame_rate <= 0 or min_frame_rate > frame_rate:
+            raise ValueError("Need 0 < min_frame_rate <= frame_rate")
+
+        self.casambi = casambi
+        self.max_frame_rate = frame_rate
+        self.min_frame_rate = min_frame_rate
+        self.max_backlog = max_backlog
+        self.frame_rate = frame_rate
+        self._clock = clock
+
+        self.frames = 0
+        self.skipped_frames = 0
+        self.sent = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.slowdowns = 0
+
+        self._transitions = []
+        # (unit id, control) -> transition currently driving it
+        self._owners = {}
+        # (unit id, control) -> quantized value last sent
+        self._last_sent = {}
+        # Unit id -> (cct_min, cct_max)
+        self._cct_ranges = {}
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return len(self._transitions)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self.running:
+            raise CasambiApiException("Effects engine is already running!")
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="casambi-effects", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop sending frames, the units keep their last sent values. The
+        engine stays running if the thread did not exit within timeout.
+        """
+        self._stop.set()
+
+        thread = self._thread
+
+        if thread is None or thread is threading.current_thread():
+            return
+
+        thread.join(timeout)
+
+        if not thread.is_alive():
+            self._thread = None
+
+    def add(self, transition: Transition) -> Transition:
+        """
+        Start a transition, it starts now unless started_at (on the engine
+        clock) is set. Color temperature ranges of the units are fetched
+        here so frames never wait for the REST api.
+        """
+        if transition.control == "CCT":
+            for unit_id in transition.unit_ids:
+                if unit_id not in self._cct_ranges:
+                    capabilities = self.casambi.get_unit_capabilities(unit_id=unit_id)
+                    self._cct_ranges[unit_id] = (
+                        capabilities.cct_min,
+                        capabilities.cct_max,
+                    )
+
+        if transition.started_at is None:
+            transition.started_at = self._clock()
+
+        with self._lock:
+            for unit_id in transition.unit_ids:
+                self._owners[(unit_id, transition.control)] = transition
+
+            self._transitions.append(transition)
+
+        return transition
+
+    def fade(self, *, unit_ids, control="Dimmer", start, end, duration):
+        """
+        Add a transition from start to end over duration seconds
+        """
+        return self.add(
+            Transition(
+                unit_ids=list(unit_ids),
+                control=control,
+                keyframes=[(0.0, start), (duration, end)],
+            )
+        )
+
+    def remove(self, transition: Transition):
+        """
+        Stop a transition, its units keep their last sent values
+        """
+        with self._lock:
+            self._release(transition)
+
+        transition.finished.set()
+
+    def _release(self, transition: Transition):
+        self._transitions = [
+            entry for entry in self._transitions if entry is not transition
+        ]
+
+        for unit_id in transition.unit_ids:
+            key = (unit_id, transition.control)
+            if self._owners.get(key) is transition:
+                del self._owners[key]
+
+    def _quantize(self, control: str, value, unit_ids) -> dict:
+        """
+        Quantized value per unit id, the value is the same for every unit
+        except for color temperatures clamped to the range of each unit
+        """
+        if control in ("Dimmer", "Vertical"):
+            return dict.fromkeys(unit_ids, quantize_level(value))
+
+        if control == "RGB":
+            color = tuple(min(max(round(channel), 0), 255) for channel in value)
+            hue_sat = rgb_to_hue_sat([color], use_numpy=False)[0]
+            return dict.fromkeys(unit_ids, hue_sat)
+
+        by_range = {}
+        result = {}
+
+        for unit_id in unit_ids:
+            cct_range = self._cct_ranges.get(unit_id, (0, 0))
+            kelvin = by_range.get(cct_range)
+
+            if kelvin is None:
+                kelvin = color_temperature(
+                    value, cct_min=cct_range[0], cct_max=cct_range[1]
+                )
+                by_range[cct_range] = kelvin
+
+            result[unit_id] = kelvin
+
+        return result
+
+    def render(self, now: float) -> dict:
+        """
+        Target controls per unit id for the frame at now, only for values
+        that changed since they were last sent. Finished transitions are
+        removed after their last value is rendered.
+        """
+        target_controls = {}
+
+        with self._lock:
+            transitions = list(self._transitions)
+
+            for transition in transitions:
+                elapsed = now - transition.started_at
+
+                if elapsed < 0:
+                    continue
+
+                unit_ids = [
+                    unit_id
+                    for unit_id in transition.unit_ids
+                    if self._owners.get((unit_id, transition.control)) is transition
+                ]
+
+                values = self._quantize(
+                    transition.control, transition.value_at(elapsed), unit_ids
+                )
+
+                for unit_id, value in values.items():
+                    key = (unit_id, transition.control)
+
+                    if self._last_sent.get(key) == value:
+                        self.unchanged += 1
+                        continue
+
+                    self._last_sent[key] = value
+                    target_controls.setdefault(unit_id, {}).update(
+                        frame_controls(transition.control, value)
+                    )
+
+                if transition.done_at(elapsed) or not unit_ids:
+                    self._release(transition)
+                    transition.finished.set()
+
+        return target_controls
+
+    def _send(self, target_controls: dict):
+        if not target_controls:
+            return
+
+        results = self.casambi.set_units_target_controls(
+            target_controls=target_controls
+        )
+
+        for unit_id, result in results.items():
+            if result is None:
+                self.sent += 1
+                continue
+
+            self.errors += 1
+            _LOGGER.debug(f"_send: unit {unit_id} failed: {result}")
+
+            # Send it again next frame
+            with self._lock:
+                for key in list(self._last_sent):
+                    if key[0] == unit_id:
+                        del self._last_sent[key]
+
+    def _backlog(self) -> int:
+        queue = self.casambi.command_queue
+
+        return queue.pending if queue else 0
+
+    def _adapt(self, *, backlog: int, previous_units: int, send_seconds: float):
+        """
+        Lower the frame rate when the previous frame is still waiting in the
+        command queue or a frame takes longer to send than a frame lasts,
+        raise it again when the queue keeps up
+        """
+        overloaded = send_seconds > 1.0 / self.frame_rate or (
+            backlog > 0 and backlog > self.max_backlog * previous_units
+        )
+
+        if overloaded:
+            frame_rate = max(self.frame_rate / FRAME_RATE_BACKOFF, self.min_frame_rate)
+
+            if frame_rate < self.frame_rate:
+                self.slowdowns += 1
+                _LOGGER.debug(
+                    f"_adapt: backlog: {backlog} send: {send_seconds:.4f} s, "
+                    f"frame rate {self.frame_rate:.1f} -> {frame_rate:.1f}"
+                )
+
+            self.frame_rate = frame_rate
+        elif backlog == 0:
+            self.frame_rate = min(
+                self.frame_rate * FRAME_RATE_RECOVERY, self.max_frame_rate
+            )
+
+    def _run(self):
+        next_frame = self._clock()
+        previous_units = 0
+
+        while not self._stop.is_set():
+            delay = next_frame - self._clock()
+
+            if delay > 0 and self._stop.wait(delay):
+                return
+
+            try:
+                # What is left of the previous frame
+                backlog = self._backlog()
+
+                target_controls = self.render(next_frame)
+
+                started = self._clock()
+                self._send(target_controls)
+                send_seconds = self._clock() - started
+
+                self.frames += 1
+                self._adapt(
+                    backlog=backlog,
+                    previous_units=previous_units,
+                    send_seconds=send_seconds,
+                )
+                previous_units = len(target_controls)
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                _LOGGER.exception("_run: failed to send frame")
+
+            next_frame += 1.0 / self.frame_rate
+
+            # Skip the frames that were missed instead of sending them late
+            now = self._clock()
+            if next_frame < now:
+                missed = int((now - next_frame) * self.frame_rate) + 1
+                self.skipped_frames += missed
+                next_frame += missed / self.frame_rate
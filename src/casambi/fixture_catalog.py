@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+Persistent cache of fixture information, fixture information is static per
+fixture id so it only needs to be fetched once.
+"""
+import json
+import logging
+import os
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FixtureCatalog:
+    """
+    Fixture information keyed on fixture id, saved as json to path (if
+    given) so it survives restarts
+    """
+
+    def __init__(self, *, path=None):
+        self.path = path
+
+        self._fixtures = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fdesc:
+                data = json.load(fdesc)
+
+            self._fixtures = {int(key): value for key, value in data.items()}
+
+            _LOGGER.debug(f"FixtureCatalog: loaded {len(self._fixtures)} fixtures")
+
+    def __contains__(self, fixture_id) -> bool:
+        return int(fixture_id) in self._fixtures
+
+    def __len__(self) -> int:
+        return len(self._fixtures)
+
+    def get(self, fixture_id):
+        """
+        Fixture information or None if not in the catalog
+        """
+        return self._fixtures.get(int(fixture_id))
+
+    def put(self, fixture_id, data: dict):
+        with self._lock:
+            self._fixtures[int(fixture_id)] = data
+
+    def missing(self, fixture_ids) -> list:
+        """
+        The unique fixture ids that are not in the catalog
+        """
+        missing = []
+        seen = set()
+
+        for fixture_id in fixture_ids:
+            fixture_id = int(fixture_id)
+
+            if fixture_id in seen:
+                continue
+
+            seen.add(fixture_id)
+
+            if fixture_id not in self._fixtures:
+                missing.append(fixture_id)
+
+        return missing
+
+    def save(self):
+        """
+        Write the catalog to path, through a temporary file so a crash never
+        leaves a half written catalog
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            data = {str(key): value for key, value in self._fixtures.items()}
+
+        tmp_path = f"{self.path}.tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as fdesc:
+            json.dump(data, fdesc)
+
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+"""
+Encoder for websocket control frames.
+
+Frames are filled into precomputed templates and constant frames (unit
+on/off, scene on/off) are cached, the output is byte identical to
+json.dumps of the message dicts the control methods used to build.
+"""
+import json
+import logging
+import math
+
+from .exceptions import CasambiApiException
+
+_LOGGER = logging.getLogger(__name__)
+
+# Dimmer and Vertical values are sent in this many steps
+LEVEL_STEPS = 255
+
+
+def encode_number(value) -> str:
+    """
+    Encode a number exactly like json.dumps
+    """
+    value_type = type(value)
+
+    if value_type is int:
+        return int.__repr__(value)
+
+    if value_type is float and math.isfinite(value):
+        return float.__repr__(value)
+
+    return json.dumps(value)
+
+
+def to_int_id(value, name: str) -> int:
+    """
+    Unit and scene ids needs to be integers
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (str, float)):
+        return int(value)
+
+    raise CasambiApiException(f"expected {name} to be an integer, got: {value}")
+
+
+def quantize_level(value) -> int:
+    """
+    The step (0-LEVEL_STEPS) a Dimmer or Vertical value (0-1) ends up at,
+    values outside 0-1 are clamped
+    """
+    return round(min(max(float(value), 0.0), 1.0) * LEVEL_STEPS)
+
+
+def target_controls(control: str, value) -> dict:
+    """
+    targetControls for a Dimmer or Vertical value (0-1), a Kelvin value
+    for CCT or (hue, sat) for RGB
+    """
+    if control == "Dimmer":
+        return {"Dimmer": {"value": value}}
+
+    if control == "Vertical":
+        return {"Vertical": {"value": value}}
+
+    if control == "CCT":
+        return {
+            "ColorTemperature": {"value": value},
+            "Colorsource": {"source": "TW"},
+        }
+
+    (hue, sat) = value
+    return {"RGB": {"hue": hue, "sat": sat}, "Colorsource": {"source": "RGB"}}
+
+
+class FrameEncoder:
+    """
+    Encodes controlUnit and controlScene frames for a wire.
+
+    With compact=True the frames are encoded without spaces and generic
+    target controls are encoded with orjson when it is installed, the
+    frames are then equivalent but not byte identical to json.dumps.
+    """
+
+    def __init__(self, *, wire_id, compact=False):
+        self.wire_id = wire_id
+        self.compact = compact
+
+        if compact:
+            item_separator, key_separator = ",", ":"
+        else:
+            item_separator, key_separator = ", ", ": "
+
+        self._separators = (item_separator, key_separator)
+
+        # orjson is optional and only used for compact frames
+        self._orjson = None
+
+        if compact:
+            try:
+                import orjson
+
+                self._orjson = orjson
+            except ImportError:
+                pass
+
+        def template(method, body):
+            # "{" and "}" are written as "(" and ")" and separators as "," and
+            # ":" in body, %s marks where values are filled in
+            frame = '("wire":%s,"method":"%s","id":%%s,%s)' % (
+                encode_number(wire_id),
+                method,
+                body,
+            )
+            frame = frame.replace(",", item_separator).replace(":", key_separator)
+            return frame.replace("(", "{").replace(")", "}")
+
+        self._control_unit = template("controlUnit", '"targetControls":%s')
+        self._dimmer = template(
+            "controlUnit", '"targetControls":("Dimmer":("value":%s))'
+        )
+        self._vertical = template(
+            "controlUnit", '"targetControls":("Vertical":("value":%s))'
+        )
+        self._color_temperature = template(
+            "controlUnit",
+            '"targetControls":("ColorTemperature":("value":%s),'
+            '"Colorsource":("source":"TW"))',
+        )
+        self._rgb_hue_sat = template(
+            "controlUnit",
+            '"targetControls":("RGB":("hue":%s,"sat":%s),'
+            '"Colorsource":("source":"RGB"))',
+        )
+        self._rgb = template(
+            "controlUnit",
+            '"targetControls":("RGB":("rgb":%s),"Colorsource":("source":"RGB"))',
+        )
+        self._rgbw = template(
+            "controlUnit",
+            '"targetControls":("RGB":("rgb":%s),"Colorsource":("source":"RGB"),'
+            '"White":("value":%s))',
+        )
+        self._scene = template("controlScene", '"level":%s')
+
+        self._on_frames = {}
+        self._off_frames = {}
+        self._scene_frames = {}
+
+    def encode_json(self, data) -> str:
+        """
+        Encode arbitrary json data with the separators of the encoder
+        """
+        if self.compact:
+            if self._orjson is not None:
+                return self._orjson.dumps(data).decode("utf-8")
+            return json.dumps(data, separators=self._separators)
+
+        return json.dumps(data)
+
+    def control_unit(self, unit_id: int, target_controls: dict) -> str:
+        """
+        controlUnit frame for any target controls
+        """
+        return self.control_unit_encoded(unit_id, self.encode_json(target_controls))
+
+    def control_unit_encoded(self, unit_id: int, target_controls: str) -> str:
+        """
+        controlUnit frame for target controls already encoded with
+        encode_json, to encode the target controls once for many units
+        """
+        return self._control_unit % (encode_number(unit_id), target_controls)
+
+    def unit_on(self, unit_id: int) -> str:
+        frame = self._on_frames.get(unit_id)
+
+        if frame is None:
+            frame = self.dimmer(unit_id, 1)
+            self._on_frames[unit_id] = frame
+
+        return frame
+
+    def unit_off(self, unit_id: int) -> str:
+        frame = self._off_frames.get(unit_id)
+
+        if frame is None:
+            frame = self.dimmer(unit_id, 0)
+            self._off_frames[unit_id] = frame
+
+        return frame
+
+    def dimmer(self, unit_id: int, value) -> str:
+        return self._dimmer % (encode_number(unit_id), encode_number(value))
+
+    def vertical(self, unit_id: int, value) -> str:
+        return self._vertical % (encode_number(unit_id), encode_number(value))
+
+    def color_temperature(self, unit_id: int, value) -> str:
+        return self._color_temperature % (
+            encode_number(unit_id),
+            encode_number(value),
+        )
+
+    def rgb_hue_sat(self, unit_id: int, hue, sat) -> str:
+        return self._rgb_hue_sat % (
+            encode_number(unit_id),
+            encode_number(hue),
+            encode_number(sat),
+        )
+
+    def rgb(self, unit_id: int, red, green, blue) -> str:
+        return self._rgb % (
+            encode_number(unit_id),
+            json.dumps(f"rgb({red}, {green}, {blue})"),
+        )
+
+    def rgbw(self, unit_id: int, red, green, blue, white_value) -> str:
+        return self._rgbw % (
+            encode_number(unit_id),
+            json.dumps(f"rgb({red}, {green}, {blue})"),
+            encode_number(white_value),
+        )
+
+    def scene(self, scene_id: int, level) -> str:
+        # Only on/off are cached, 1, 1.0 and True are equal as dict keys but
+        # are encoded differently
+        if type(level) is not int or level not in (0, 1):
+            return self._scene % (encode_number(scene_id), encode_number(level))
+
+        key = (scene_id, level)
+        frame = self._scene_frames.get(key)
+
+        if frame is None:
+            frame = self._scene % (encode_number(scene_id), encode_number(level))
+            self._scene_frames[key] = frame
+
+        return frame
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+Pooled HTTP session shared by the REST calls of the Casambi clients.
+"""
+import logging
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+# Casambi cloud, can be pointed to another server like casambi.mock_cloud
+DEFAULT_API_URL = "https://door.casambi.com/v1"
+DEFAULT_WS_URL = "wss://door.casambi.com/v1/bridge/"
+
+
+def create_http_session(
+    *,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    keep_alive: bool = True,
+    headers=None,
+    response_hook=None,
+) -> "requests.Session":
+    """
+    Create a requests session with a connection pool of pool_size
+    connections per host.
+
+    With keep_alive the TCP + TLS connections are reused between calls,
+    otherwise every response closes its connection.
+    headers are sent with every request made through the session.
+    response_hook(response) is called for every response, see
+    metrics.rest_response_hook.
+    """
+    if pool_size < 1:
+        raise ValueError(f"pool_size needs to be at least 1, got: {pool_size}")
+
+    # requests takes a while to import, only do it when a session is needed
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if headers:
+        session.headers.update(headers)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    if response_hook:
+        session.hooks["response"].append(response_hook)
+
+    _LOGGER.debug(
+        f"create_http_session: pool_size: {pool_size} keep_alive: {keep_alive}"
+    )
+
+    return session
@@ -0,0 +1,376 @@
+#!/usr/bin/python3
+"""
+Latency and throughput metrics for the Casambi clients, REST calls are
+recorded by endpoint and status, websocket sends by method and bytes and
+received events by method and decode time.
+
+Metrics go to a MetricsRegistry, hooks added to the registry see every
+observation and MetricsExporter serves the registry in the Prometheus text
+format.
+"""
+import bisect
+import logging
+import threading
+
+from urllib.parse import urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REST_REQUEST_SECONDS = "casambi_rest_request_seconds"
+WS_SEND_SECONDS = "casambi_ws_send_seconds"
+WS_SENT_BYTES = "casambi_ws_sent_bytes_total"
+WS_EVENT_DECODE_SECONDS = "casambi_ws_event_decode_seconds"
+WS_RECEIVED_BYTES = "casambi_ws_received_bytes_total"
+
+# Path segments followed by an id, the id is replaced with {id} in endpoint
+# names so every unit does not get its own label
+_ID_PARENTS = ("networks", "units", "fixtures", "scenes", "groups")
+
+
+def endpoint_name(url: str) -> str:
+    """
+    Path of url with ids replaced, for example /v1/networks/{id}/units
+    """
+    segments = urlsplit(url).path.split("/")
+
+    for index in range(1, len(segments)):
+        if (
+            segments[index - 1] in _ID_PARENTS
+            and segments[index]
+            and segments[index] != "session"
+        ):
+            segments[index] = "{id}"
+
+    return "/".join(segments)
+
+
+def frame_method(frame) -> str:
+    """
+    Method of an encoded frame, without decoding the whole frame
+    """
+    if isinstance(frame, bytes):
+        frame = frame.decode("utf-8", "replace")
+
+    index = frame.find('"method"')
+
+    if index < 0:
+        return ""
+
+    start = frame.find('"', index + 8)
+    end = frame.find('"', start + 1)
+
+    if start < 0 or end < 0:
+        return ""
+
+    return frame[start + 1 : end]
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, buckets are upper bounds and the
+    last count is for values above every bucket
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list:
+        """
+        (upper bound, count of values <= upper bound) per bucket, the last
+        upper bound is +Inf
+        """
+        result = []
+        total = 0
+
+        for (bound, count) in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+
+    if not items:
+        return ""
+
+    escaped = []
+    for (key, value) in items:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters keyed on name and labels.
+
+    Hooks are called as hook(name, value, labels) for every observation,
+    to forward metrics somewhere else without patching the clients.
+    """
+
+    def __init__(self, *, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+
+        self._histograms = {}
+        self._counters = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = [entry for entry in self._hooks if entry is not hook]
+
+    def _call_hooks(self, name: str, value, labels: dict):
+        for hook in self._hooks:
+            try:
+                hook(name, value, labels)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(f"_call_hooks: hook {hook} failed")
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Add value to the histogram name with labels
+        """
+        key = (name, _labels_key(labels))
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = Histogram(self.buckets)
+                self._histograms[key] = histogram
+
+            histogram.observe(value)
+
+        if self._hooks:
+            self._call_hooks(name, value, labels)
+
+    def inc(self, name: str, amount=1, **labels):
+        """
+        Add amount to the counter name with labels
+        """
+        key = (name, _labels_key(labels))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+        if self._hooks:
+            self._call_hooks(name, amount, labels)
+
+    def histogram(self, name: str, **labels):
+        """
+        The histogram for name and labels, None if nothing was observed
+        """
+        return self._histograms.get((name, _labels_key(labels)))
+
+    def counter(self, name: str, **labels):
+        return self._counters.get((name, _labels_key(labels)), 0)
+
+    def snapshot(self) -> dict:
+        """
+        Every metric as {name: [{labels, count, sum, buckets} or {labels,
+        value}]}
+        """
+        result = {}
+
+        with self._lock:
+            for ((name, labels), histogram) in self._histograms.items():
+                result.setdefault(name, []).append(
+                    {
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": histogram.cumulative(),
+                    }
+                )
+
+            for ((name, labels), value) in self._counters.items():
+                result.setdefault(name, []).append(
+                    {"labels": dict(labels), "value": value}
+                )
+
+        return result
+
+    def to_prometheus(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format
+        """
+        lines = []
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+            typed = set()
+
+            for ((name, labels), histogram) in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+
+                for (bound, count) in histogram.cumulative():
+                    bucket_labels = _format_labels(
+                        labels, (("le", _format_value(bound)),)
+                    )
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+
+                lines.append(
+                    f"{name}_sum{_format_labels(labels)} "
+                    f"{_format_value(histogram.sum)}"
+                )
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+            for ((name, labels), value) in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def rest_response_hook(metrics: MetricsRegistry):
+    """
+    requests response hook recording the time until the response headers
+    were received, by endpoint, method and status. Pass it as response_hook
+    to create_http_session.
+    """
+
+    def hook(response, *args, **kwargs):
+        metrics.observe(
+            REST_REQUEST_SECONDS,
+            response.elapsed.total_seconds(),
+            endpoint=endpoint_name(response.request.url),
+            method=response.request.method,
+            status=str(response.status_code),
+        )
+
+    return hook
+
+
+def observe_ws_send(metrics: MetricsRegistry, frame, seconds: float):
+    method = frame_method(frame)
+
+    metrics.observe(WS_SEND_SECONDS, seconds, method=method)
+    metrics.inc(WS_SENT_BYTES, len(frame), method=method)
+
+
+def observe_ws_event(metrics: MetricsRegistry, message, size: int, seconds: float):
+    method = message.get("method", "") if isinstance(message, dict) else ""
+
+    # Replies to open have a wireStatus instead of a method
+    if not method and isinstance(message, dict) and "wireStatus" in message:
+        method = "wireStatus"
+
+    metrics.observe(WS_EVENT_DECODE_SECONDS, seconds, method=method)
+    metrics.inc(WS_RECEIVED_BYTES, size, method=method)
+
+
+class MetricsExporter:
+    """
+    Serves a registry on http://host:port/metrics in the Prometheus text
+    format from a background thread
+    """
+
+    def __init__(self, metrics: MetricsRegistry, *, host="127.0.0.1", port=0):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.to_prometheus().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                _LOGGER.debug(f"MetricsExporter: {format % args}")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="casambi-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
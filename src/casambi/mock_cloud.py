@@ -0,0 +1,496 @@
+#!/usr/bin/python3
+"""
+Local stand-in for the Casambi cloud, implements the REST endpoints used by
+the clients and the websocket wire protocol (open, controlUnit,
+controlScene, controlNetwork and unitChanged events) for a synthetic
+network. Used for benchmarks and testing without door.casambi.com.
+
+Needs aiohttp, install with the "async" extra.
+"""
+import asyncio
+import copy
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+
+from aiohttp import WSMsgType, web
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_NETWORK_ID = "mockNetwork"
+
+# Units per scene in the synthetic network
+SCENE_SIZE = 10
+
+
+def _unit_controls(unit_id: int) -> list:
+    """
+    Controls of a synthetic unit, every third unit is tunable white, every
+    third RGBW and the rest dimmer only
+    """
+    controls = [{"name": "dimmer0", "type": "Dimmer", "value": 0.0}]
+
+    if unit_id % 3 == 0:
+        controls.append(
+            {"level": 0.5, "max": 6000, "min": 2200, "type": "CCT", "value": 4100.0}
+        )
+    elif unit_id % 3 == 1:
+        controls.append(
+            {
+                "hue": 0.0,
+                "name": "rgb",
+                "rgb": "rgb(255, 255, 255)",
+                "sat": 0.0,
+                "type": "Color",
+            }
+        )
+        controls.append({"name": "white", "type": "White", "value": 0.0})
+
+    return [controls]
+
+
+def make_unit(unit_id: int) -> dict:
+    """
+    Unit state in the format of the REST api
+    """
+    return {
+        "activeSceneId": 0,
+        "address": f"{unit_id:012x}",
+        "condition": 0,
+        "controls": _unit_controls(unit_id),
+        "dimLevel": 0.0,
+        "firmwareVersion": "26.24",
+        "fixtureId": 1000 + unit_id % 3,
+        "groupId": unit_id // SCENE_SIZE + 1,
+        "id": unit_id,
+        "name": f"Unit {unit_id}",
+        "on": False,
+        "online": True,
+        "position": unit_id,
+        "priority": 3,
+        "status": "ok",
+        "type": "Luminaire",
+    }
+
+
+def make_scenes(units: int) -> dict:
+    """
+    Scenes of SCENE_SIZE units each
+    """
+    scenes = {}
+
+    for index, first in enumerate(range(1, units + 1, SCENE_SIZE)):
+        scene_id = index + 1
+        scenes[scene_id] = {
+            "id": scene_id,
+            "name": f"Scene {scene_id}",
+            "units": list(range(first, min(first + SCENE_SIZE, units + 1))),
+        }
+
+    return scenes
+
+
+def _set_control(unit: dict, control_type: str, **values):
+    for control in unit["controls"][0]:
+        if control["type"] == control_type:
+            control.update(values)
+            return True
+
+    return False
+
+
+def apply_target_controls(unit: dict, target_controls: dict):
+    """
+    Update a unit state with the targetControls of a controlUnit message
+    """
+    for name, target in target_controls.items():
+        if name == "Dimmer":
+            value = float(target["value"])
+            _set_control(unit, "Dimmer", value=value)
+            unit["dimLevel"] = value
+            unit["on"] = value > 0
+        elif name == "Vertical":
+            if not _set_control(unit, "Vertical", value=target["value"]):
+                unit["controls"][0].append(
+                    {"type": "Vertical", "value": target["value"]}
+                )
+        elif name == "ColorTemperature":
+            _set_control(unit, "CCT", value=float(target["value"]))
+        elif name == "RGB":
+            _set_control(unit, "Color", **target)
+        elif name == "White":
+            _set_control(unit, "White", value=target["value"])
+
+
+class MockCasambiCloud:
+    """
+    Mock cloud with networks networks of units synthetic units each, runs in
+    a background thread between start() and stop() or as a context manager.
+    A session is valid for every network.
+
+    Every REST response and every websocket event is delayed by latency
+    seconds plus a random 0 - jitter seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        units=10,
+        networks=1,
+        latency=0.0,
+        jitter=0.0,
+        host="127.0.0.1",
+        port=0,
+        network_id=DEFAULT_NETWORK_ID,
+    ):
+        self.host = host
+        self.port = port
+        self.network_id = network_id
+        self.latency = latency
+        self.jitter = jitter
+
+        if networks == 1:
+            self.network_ids = [network_id]
+        else:
+            self.network_ids = [f"{network_id}{index}" for index in range(networks)]
+
+        self.network_units = {
+            network: {unit_id: make_unit(unit_id) for unit_id in range(1, units + 1)}
+            for network in self.network_ids
+        }
+        self.network_scenes = {
+            network: make_scenes(units) for network in self.network_ids
+        }
+
+        # Units and scenes of the first network
+        self.units = self.network_units[self.network_ids[0]]
+        self.scenes = self.network_scenes[self.network_ids[0]]
+
+        self.sessions = set()
+
+        self.rest_requests = 0
+        self.commands = 0
+        self.events = 0
+
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/v1/bridge/"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Start serving in a background thread, port is set when this returns
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="casambi-mock-cloud", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if not self._loop:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+        self._loop = None
+
+    def expire_sessions(self):
+        """
+        Invalidate every session, the next request gets a 401
+        """
+        self.sessions.clear()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._loop.run_until_complete(self._start_site())
+        self._started.set()
+
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _start_site(self):
+        app = web.Application()
+        app.add_routes(
+            [
+                web.post("/v1/users/session/", self._user_session),
+                web.post("/v1/networks/session/", self._network_session),
+                web.get("/v1/networks/{network_id}", self._network),
+                web.get("/v1/networks/{network_id}/units", self._unit_list),
+                web.get(
+                    "/v1/networks/{network_id}/units/{unit_id}/state",
+                    self._unit_state,
+                ),
+                web.get("/v1/networks/{network_id}/scenes", self._scenes),
+                web.get("/v1/networks/{network_id}/state", self._network_state),
+                web.get("/v1/networks/{network_id}/datapoints", self._datapoints),
+                web.get("/v1/fixtures/{fixture_id}", self._fixture),
+                web.get("/v1/bridge/", self._bridge),
+            ]
+        )
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        # Port 0 means any free port
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _delay(self) -> float:
+        return self.latency + random.uniform(0, self.jitter)
+
+    async def _respond(self, request, data):
+        self.rest_requests += 1
+
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if request.headers.get("X-Casambi-Session") not in self.sessions:
+            return web.json_response({"error": "invalid session"}, status=401)
+
+        if data is None:
+            return web.json_response({"error": "not found"}, status=404)
+
+        return web.json_response(data)
+
+    def _new_session(self) -> str:
+        session_id = uuid.uuid4().hex
+        self.sessions.add(session_id)
+
+        return session_id
+
+    async def _user_session(self, request):
+        self.rest_requests += 1
+        session_id = self._new_session()
+
+        return web.json_response(
+            {
+                "sessionId": session_id,
+                "sessionExpires": int((time.time() + 24 * 60 * 60) * 1000),
+                "networks": {
+                    network: {"id": network, "name": f"Mock network {network}"}
+                    for network in self.network_ids
+                },
+            }
+        )
+
+    async def _network_session(self, request):
+        self.rest_requests += 1
+        session_id = self._new_session()
+
+        return web.json_response(
+            {
+                network: {
+                    "id": network,
+                    "name": f"Mock network {network}",
+                    "sessionId": session_id,
+                }
+                for network in self.network_ids
+            }
+        )
+
+    def _network_info(self, network) -> dict:
+        return {
+            "id": network,
+            "name": f"Mock network {network}",
+            "type": "PROTECTED",
+            "grade": "EVOLUTION",
+        }
+
+    async def _network(self, request):
+        network = request.match_info["network_id"]
+
+        if network not in self.network_units:
+            return await self._respond(request, None)
+
+        return await self._respond(request, self._network_info(network))
+
+    async def _unit_list(self, request):
+        units = self.network_units.get(request.match_info["network_id"])
+
+        if units is not None:
+            units = {
+                str(unit_id): {
+                    key: unit[key]
+                    for key in ("address", "fixtureId", "groupId", "id", "name", "type")
+                }
+                for unit_id, unit in units.items()
+            }
+
+        return await self._respond(request, units)
+
+    async def _unit_state(self, request):
+        units = self.network_units.get(request.match_info["network_id"], {})
+        unit = units.get(int(request.match_info["unit_id"]))
+
+        return await self._respond(request, unit)
+
+    async def _scenes(self, request):
+        scenes = self.network_scenes.get(request.match_info["network_id"])
+
+        if scenes is not None:
+            scenes = {str(scene_id): scene for scene_id, scene in scenes.items()}
+
+        return await self._respond(request, scenes)
+
+    async def _network_state(self, request):
+        network = request.match_info["network_id"]
+
+        if network not in self.network_units:
+            return await self._respond(request, None)
+
+        units = self.network_units[network]
+        scenes = self.network_scenes[network]
+        state = {
+            **self._network_info(network),
+            "units": {str(unit_id): unit for unit_id, unit in units.items()},
+            "scenes": {str(scene_id): scene for scene_id, scene in scenes.items()},
+        }
+
+        return await self._respond(request, state)
+
+    async def _datapoints(self, request):
+        return await self._respond(request, [])
+
+    async def _fixture(self, request):
+        fixture_id = int(request.match_info["fixture_id"])
+
+        return await self._respond(
+            request, {"id": fixture_id, "name": f"Fixture {fixture_id}"}
+        )
+
+    async def _bridge(self, request):
+        # The api key is sent as subprotocol, it has to be echoed back
+        protocols = request.headers.get("Sec-WebSocket-Protocol", "")
+        web_sock = web.WebSocketResponse(
+            protocols=[protocol.strip() for protocol in protocols.split(",")]
+        )
+        await web_sock.prepare(request)
+
+        outgoing = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send_events(web_sock, outgoing))
+
+        # Wire id to network id of the wires opened on this connection
+        wires = {}
+
+        try:
+            async for msg in web_sock:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+
+                for event in self._handle_message(json.loads(msg.data), wires):
+                    outgoing.put_nowait((time.monotonic() + self._delay(), event))
+        finally:
+            sender.cancel()
+
+        return web_sock
+
+    async def _send_events(self, web_sock, outgoing):
+        while True:
+            (due, event) = await outgoing.get()
+
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            await web_sock.send_str(json.dumps(event))
+            self.events += 1
+
+    def _unit_changed(self, wire, unit: dict) -> dict:
+        unit_id = unit["id"]
+
+        return {
+            "wire": wire,
+            "method": "unitChanged",
+            "id": unit_id,
+            "on": unit["on"],
+            "online": unit["online"],
+            "status": unit["status"],
+            "dimLevel": unit["dimLevel"],
+            "activeSceneId": unit["activeSceneId"],
+            # Copied, the unit changes on the next command while the event
+            # is still waiting to be sent
+            "controls": copy.deepcopy(unit["controls"]),
+            "name": unit["name"],
+        }
+
+    def _handle_message(self, message: dict, wires: dict) -> list:
+        """
+        Apply a message from a client, wires maps the wire ids opened on the
+        connection to network ids. Returns the events to send back
+        """
+        method = message.get("method")
+        wire = message.get("wire")
+
+        if method == "open":
+            if message.get("session") not in self.sessions:
+                return [{"wire": wire, "wireStatus": "invalidSession"}]
+            if message.get("id") not in self.network_units:
+                return [{"wire": wire, "wireStatus": "openWireFailed"}]
+
+            wires[wire] = message["id"]
+            return [{"wire": wire, "wireStatus": "openWireSucceed"}]
+
+        if method == "close":
+            wires.pop(wire, None)
+            return []
+
+        network = wires.get(wire)
+
+        if network is None:
+            _LOGGER.debug(f"_handle_message: wire {wire} is not open: {message}")
+            return []
+
+        units = self.network_units[network]
+        self.commands += 1
+
+        if method == "controlUnit":
+            unit_ids = [int(message["id"])]
+            target_controls = message.get("targetControls", {})
+        elif method == "controlScene":
+            scenes = self.network_scenes[network]
+            scene = scenes.get(int(message["id"]), {"units": []})
+            unit_ids = scene["units"]
+            target_controls = {"Dimmer": {"value": message.get("level", 0)}}
+        elif method == "controlNetwork":
+            unit_ids = list(units)
+            target_controls = message.get("targetControls", {})
+        else:
+            _LOGGER.debug(f"_handle_message: ignoring message: {message}")
+            return []
+
+        events = []
+
+        for unit_id in unit_ids:
+            if unit_id not in units:
+                continue
+
+            apply_target_controls(units[unit_id], target_controls)
+            events.append(self._unit_changed(wire, units[unit_id]))
+
+        return events
@@ -0,0 +1,408 @@
+#!/usr/bin/python3
+"""
+Manager for every network an account can see, with one Casambi client per
+network sharing a single HTTP pool and set of credentials.
+"""
+import logging
+import time
+
+from .exceptions import CasambiApiException
+from .http_session import (
+    DEFAULT_API_URL,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_WS_URL,
+    create_http_session,
+)
+from .metrics import rest_response_hook
+from .public_casambi_api import DEFAULT_SESSION_TTL, Casambi
+from .ws_multiplexer import WebSocketMultiplexer
+from .ws_reader import DEFAULT_QUEUE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CasambiNetworkManager:
+    """
+    Opens network sessions for every network of the account and routes
+    commands on (network_id, unit_id). Each network gets its own wire, with
+    a wire id unique within the manager so the wires can share one websocket
+    connection (see ws_open).
+
+    client_options are passed on to every Casambi client, for example
+    capability_ttl or compact_frames.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key,
+        email,
+        user_password,
+        network_password,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        headers=None,
+        session_store=None,
+        session_ttl=DEFAULT_SESSION_TTL,
+        api_url=DEFAULT_API_URL,
+        ws_url=DEFAULT_WS_URL,
+        metrics=None,
+        **client_options,
+    ):
+        self.api_key = api_key
+        self.email = email
+        self.user_password = user_password
+        self.network_password = network_password
+        self.api_url = api_url.rstrip("/")
+        self.ws_url = ws_url
+        self.pool_size = pool_size
+        self.metrics = metrics
+
+        self.session_store = session_store
+        self.session_ttl = session_ttl
+
+        # Wire ids are handed out by the manager
+        client_options.pop("wire_id", None)
+        self._client_options = client_options
+        self._next_wire_id = 1
+
+        self.ws_multiplexer = None
+
+        default_headers = {
+            "X-Casambi-Key": self.api_key,
+            "Content-type": "application/json",
+        }
+
+        if headers:
+            default_headers.update(headers)
+
+        self._http = create_http_session(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            headers=default_headers,
+            response_hook=rest_response_hook(metrics) if metrics else None,
+        )
+
+        self.networks = {}
+
+        # (callback, network_id, callback registered on the client)
+        self._event_callbacks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, network_id) -> Casambi:
+        return self.get_client(network_id)
+
+    def __iter__(self):
+        return iter(self.networks)
+
+    def __len__(self) -> int:
+        return len(self.networks)
+
+    def close(self):
+        """
+        Close every client and the shared HTTP connections
+        """
+        for client in self.networks.values():
+            client.close()
+
+        self.networks = {}
+
+        if self.ws_multiplexer:
+            self.ws_multiplexer.close()
+            self.ws_multiplexer = None
+
+        self._http.close()
+
+    def get_client(self, network_id) -> Casambi:
+        client = self.networks.get(network_id)
+
+        if client is None:
+            raise CasambiApiException(f"Unknown network: {network_id}")
+
+        return client
+
+    def _session_store_key(self) -> str:
+        return f"public-networks:{self.email}"
+
+    def _create_clients(self, sessions: dict):
+        """
+        Create a client per network from {network_id: session_id}, clients
+        of networks that are still there are kept
+        """
+        networks = {}
+
+        for network_id, session_id in sessions.items():
+            client = self.networks.get(network_id)
+
+            if client is None:
+                client = Casambi(
+                    api_key=self.api_key,
+                    email=self.email,
+                    user_password=self.user_password,
+                    network_password=self.network_password,
+                    api_url=self.api_url,
+                    ws_url=self.ws_url,
+                    metrics=self.metrics,
+                    http_session=self._http,
+                    wire_id=self._next_wire_id,
+                    **self._client_options,
+                )
+                self._next_wire_id += 1
+
+            client.set_network_session(network_id=network_id, session_id=session_id)
+            networks[network_id] = client
+
+        for network_id, client in self.networks.items():
+            if network_id not in networks:
+                client.close()
+
+        self.networks = networks
+
+    def create_network_sessions(self) -> list:
+        """
+        Create a network session for every network the network password
+        gives access to, returns the network ids
+        """
+        url = f"{self.api_url}/networks/session/"
+        payload = {"email": self.email, "password": self.network_password}
+
+        response = self._http.post(url, json=payload)
+
+        if response.status_code != 200:
+            reason = "create_network_sessions: failed with"
+            reason += f"status_code: {response.status_code},"
+            reason += f"response: {response.text}"
+
+            raise CasambiApiException(reason)
+
+        data = response.json()
+        sessions = {
+            network_id: network["sessionId"] for network_id, network in data.items()
+        }
+
+        _LOGGER.debug(f"create_network_sessions: networks: {list(sessions)}")
+
+        if self.session_store:
+            self.session_store.save(
+                self._session_store_key(),
+                {"networks": sessions},
+                expires=time.time() + self.session_ttl,
+            )
+
+        self._create_clients(sessions)
+
+        return list(sessions)
+
+    def restore_sessions(self) -> bool:
+        """
+        Reuse the network sessions from the session store, returns False if
+        there are no valid sessions saved
+        """
+        if not self.session_store:
+            return False
+
+        entry = self.session_store.load(self._session_store_key())
+
+        if not entry:
+            return False
+
+        self._create_clients(entry["networks"])
+
+        return True
+
+    def login(self):
+        """
+        Reuse saved sessions if there are any, otherwise create new network
+        sessions
+        """
+        if self.restore_sessions():
+            return
+
+        self.create_network_sessions()
+
+    def _for_each_network(self, function, *, network_ids=None, max_workers=None):
+        """
+        Call function(client) for every network in a thread pool, returns
+        the result or the exception per network id
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if network_ids is None:
+            network_ids = list(self.networks)
+
+        results = {}
+
+        if not network_ids:
+            return results
+
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers or self.pool_size, len(network_ids)),
+            thread_name_prefix="casambi-networks",
+        ) as executor:
+            futures = {
+                network_id: executor.submit(function, self.get_client(network_id))
+                for network_id in network_ids
+            }
+
+            for network_id, future in futures.items():
+                try:
+                    results[network_id] = future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOGGER.debug(f"_for_each_network: {network_id} failed: {err}")
+                    results[network_id] = err
+
+        return results
+
+    def ws_open(
+        self,
+        *,
+        network_ids=None,
+        max_workers=None,
+        multiplex=False,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ) -> dict:
+        """
+        Open the wire of every network (or network_ids), returns the result
+        of ws_open or the exception per network id.
+
+        With multiplex every wire is opened on one shared websocket
+        connection, its frames are routed to the event callbacks of the
+        network without starting a reader per network. The shared
+        connection is not supervised, ws_start_supervisor is only available
+        without multiplex.
+        """
+        if not multiplex:
+            return self._for_each_network(
+                lambda client: client.ws_open(),
+                network_ids=network_ids,
+                max_workers=max_workers,
+            )
+
+        if not self.ws_multiplexer:
+            self.ws_multiplexer = WebSocketMultiplexer(
+                api_key=self.api_key,
+                ws_url=self.ws_url,
+                queue_size=queue_size,
+                metrics=self.metrics,
+            )
+            self.ws_multiplexer.connect()
+
+        multiplexer = self.ws_multiplexer
+
+        return self._for_each_network(
+            lambda client: client.ws_open(multiplexer=multiplexer),
+            network_ids=network_ids,
+            max_workers=max_workers,
+        )
+
+    def ws_start_readers(self, *, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Start the reader of every network, multiplexed wires are already
+        read by the multiplexer
+        """
+        for client in self.networks.values():
+            if not client.ws_multiplexer:
+                client.ws_start_reader(queue_size=queue_size)
+
+    def ws_close(self):
+        for client in self.networks.values():
+            if client.web_sock:
+                client.ws_close()
+
+    def add_event_callback(
+        self, callback, *, network_id=None, method=None, unit_id=None
+    ):
+        """
+        Register callback(network_id, message) for events of one or every
+        network, filtered on method and unit id
+        """
+        if network_id is None:
+            network_ids = list(self.networks)
+        else:
+            network_ids = [network_id]
+
+        for event_network_id in network_ids:
+
+            def network_callback(message, event_network_id=event_network_id):
+                callback(event_network_id, message)
+
+            self.get_client(event_network_id).add_event_callback(
+                network_callback, method=method, unit_id=unit_id
+            )
+            self._event_callbacks.append(
+                (callback, event_network_id, network_callback)
+            )
+
+    def remove_event_callback(self, callback):
+        """
+        Unregister callback from every network
+        """
+        remaining = []
+
+        for entry in self._event_callbacks:
+            (registered, network_id, network_callback) = entry
+
+            if registered is not callback:
+                remaining.append(entry)
+                continue
+
+            client = self.networks.get(network_id)
+            if client:
+                client.remove_event_callback(network_callback)
+
+        self._event_callbacks = remaining
+
+    def set_unit_target_controls(self, *, network_id, unit_id, target_controls):
+        self.get_client(network_id).set_unit_target_controls(
+            unit_id=unit_id, target_controls=target_controls
+        )
+
+    def turn_unit_on(self, *, network_id, unit_id):
+        self.get_client(network_id).turn_unit_on(unit_id=unit_id)
+
+    def turn_unit_off(self, *, network_id, unit_id):
+        self.get_client(network_id).turn_unit_off(unit_id=unit_id)
+
+    def set_unit_value(self, *, network_id, unit_id, value):
+        self.get_client(network_id).set_unit_value(unit_id=unit_id, value=value)
+
+    def turn_scene_on(self, *, network_id, scene_id):
+        self.get_client(network_id).turn_scene_on(scene_id=scene_id)
+
+    def turn_scene_off(self, *, network_id, scene_id):
+        self.get_client(network_id).turn_scene_off(scene_id=scene_id)
+
+    def set_units_target_controls(self, *, target_controls: dict) -> dict:
+        """
+        Send target controls keyed on (network_id, unit_id), returns None or
+        the exception per key
+        """
+        by_network = {}
+
+        for (network_id, unit_id), controls in target_controls.items():
+            by_network.setdefault(network_id, {})[unit_id] = controls
+
+        results = {}
+
+        for network_id, unit_target_controls in by_network.items():
+            client = self.networks.get(network_id)
+
+            if client is None:
+                err = CasambiApiException(f"Unknown network: {network_id}")
+                for unit_id in unit_target_controls:
+                    results[(network_id, unit_id)] = err
+                continue
+
+            unit_results = client.set_units_target_controls(
+                target_controls=unit_target_controls
+            )
+
+            for unit_id, result in unit_results.items():
+                results[(network_id, unit_id)] = result
+
+        return results
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+In memory mirror of the network state, seeded from the REST api and kept up
+to date from websocket events.
+"""
+import logging
+import threading
+import time
+
+from .unit_state import UnitState
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_STALENESS = 300.0
+
+# Keys in websocket events that are not part of the unit state
+_EVENT_ONLY_KEYS = ("method", "wire")
+
+
+def by_id(data) -> dict:
+    """
+    The api returns collections either as a dict keyed on the id as a string
+    or as a list, return them as a dict keyed on integer ids
+    """
+    if not data:
+        return {}
+
+    if isinstance(data, dict):
+        items = data.values()
+    else:
+        items = data
+
+    return {int(item["id"]): dict(item) for item in items if "id" in item}
+
+
+def _merge_event(unit: dict, message: dict):
+    for key, value in message.items():
+        if key not in _EVENT_ONLY_KEYS:
+            unit[key] = value
+
+
+class NetworkStateMirror:
+    """
+    Units and scenes of a network, the mirror is considered fresh for
+    max_staleness seconds after it was seeded.
+
+    Besides the unit state dicts every unit is kept parsed as a UnitState,
+    parsed once when seeded and then only for the units an event changes.
+    The UnitState objects are replaced, never changed, so they are returned
+    without copying.
+    """
+
+    def __init__(self, *, max_staleness=DEFAULT_MAX_STALENESS):
+        self.max_staleness = max_staleness
+
+        self.units = {}
+        self.states = {}
+        self.scenes = {}
+        self.network = {}
+
+        self.seeded_at = None
+        self.last_event_at = None
+        self.events = 0
+
+        # Events received since begin_seed, None when not seeding
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def begin_seed(self):
+        """
+        Keep the events received from now on, seed applies them again on
+        top of the seed data since that may have been read before them
+        """
+        with self._lock:
+            self._pending = []
+
+    def abort_seed(self):
+        with self._lock:
+            self._pending = None
+
+    def seed(self, *, network_state=None, unit_list=None, scenes_list=None):
+        """
+        Replace the mirror content with data from get_network_state,
+        get_unit_list and get_scenes_list, events received since
+        begin_seed are applied again on top
+        """
+        units = {}
+        scenes = {}
+        network = {}
+
+        if network_state:
+            network = {
+                key: value
+                for key, value in network_state.items()
+                if key not in ("units", "scenes")
+            }
+            units.update(by_id(network_state.get("units")))
+            scenes.update(by_id(network_state.get("scenes")))
+
+        # The unit list only has the static attributes, the state from the
+        # network state takes precedence
+        for unit_id, unit in by_id(unit_list).items():
+            units[unit_id] = {**unit, **units.get(unit_id, {})}
+
+        for scene_id, scene in by_id(scenes_list).items():
+            scenes[scene_id] = {**scene, **scenes.get(scene_id, {})}
+
+        with self._lock:
+            for message in self._pending or ():
+                _merge_event(units.setdefault(int(message["id"]), {}), message)
+
+            self.network = network
+            self.units = units
+            self.states = {
+                unit_id: UnitState.from_dict(unit, unit_id=unit_id)
+                for unit_id, unit in units.items()
+            }
+            self.scenes = scenes
+            self.seeded_at = time.monotonic()
+            self._pending = None
+
+        _LOGGER.debug(f"seed: units: {len(units)} scenes: {len(scenes)}")
+
+    def apply_event(self, message: dict):
+        """
+        Update the mirror from a websocket message, returns the updated
+        UnitState or None if the message did not change any unit
+        """
+        if message.get("method") != "unitChanged" or "id" not in message:
+            return None
+
+        unit_id = int(message["id"])
+
+        with self._lock:
+            unit = self.units.setdefault(unit_id, {})
+            _merge_event(unit, message)
+
+            state = self.states.get(unit_id)
+
+            if state is None:
+                state = UnitState.from_dict(unit, unit_id=unit_id)
+            else:
+                state = state.updated(message)
+
+            self.states[unit_id] = state
+
+            if self._pending is not None:
+                self._pending.append(message)
+
+            self.events += 1
+            self.last_event_at = time.monotonic()
+
+            return state
+
+    def age(self):
+        """
+        Seconds since the mirror was seeded, None if never seeded
+        """
+        if self.seeded_at is None:
+            return None
+
+        return time.monotonic() - self.seeded_at
+
+    def fresh(self) -> bool:
+        age = self.age()
+
+        return age is not None and age <= self.max_staleness
+
+    def get_unit_state(self, unit_id: int):
+        """
+        Return a copy of the unit state, None if the unit is unknown
+        """
+        with self._lock:
+            unit = self.units.get(int(unit_id))
+
+            if unit is None:
+                return None
+
+            return dict(unit)
+
+    def get_unit_state_model(self, unit_id: int):
+        """
+        Return the UnitState of a unit, None if the unit is unknown
+        """
+        with self._lock:
+            return self.states.get(int(unit_id))
+
+    def get_unit_states(self) -> dict:
+        """
+        UnitState per unit id, the states are shared and not copied
+        """
+        with self._lock:
+            return dict(self.states)
+
+    def get_units(self) -> dict:
+        with self._lock:
+            return {unit_id: dict(unit) for unit_id, unit in self.units.items()}
+
+    def get_scenes(self) -> dict:
+        with self._lock:
+            return {
+                scene_id: dict(scene) for scene_id, scene in self.scenes.items()
+            }
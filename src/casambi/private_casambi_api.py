@@ -5,16 +5,24 @@ Inofficial api
 import logging
 import re
 
-from dataclasses import dataclass
-from datetime import datetime
-
-import requests
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
 
 from exceptions import CasambiApiException
 from consts import DEVICE_NAME
+from http_session import DEFAULT_POOL_SIZE, create_http_session
+from metrics import rest_response_hook
 
 _LOGGER = logging.getLogger(__name__)
 
+# Log in again this long before the session expires
+DEFAULT_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Status codes meaning the session is not valid (anymore)
+AUTH_FAILURE_STATUS_CODES = (401, 403)
+
+_EPOCH = datetime(1970, 1, 1)
+
 
 @dataclass()
 class Session:
@@ -29,29 +37,65 @@ class Session:
     def expired(self) -> bool:
         return datetime.utcnow() > self.expires
 
+    def expires_soon(self, margin: timedelta) -> bool:
+        return datetime.utcnow() + margin > self.expires
+
 
 class Casambi:
     """
     Casambi api object
     """
 
-    def __init__(self, *, network_password):
+    def __init__(
+        self,
+        *,
+        network_password,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        headers=None,
+        session_store=None,
+        refresh_margin=DEFAULT_REFRESH_MARGIN,
+        metrics=None,
+    ):
         self.network_password = network_password
         self.url = "https://api.casambi.com"
 
         self.session = None
+        self.session_store = session_store
+        self.refresh_margin = refresh_margin
+
+        default_headers = {"Content-type": "application/json"}
+
+        if headers:
+            default_headers.update(headers)
+
+        self.metrics = metrics
+        self._http = create_http_session(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            headers=default_headers,
+            response_hook=rest_response_hook(metrics) if metrics else None,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled HTTP connections
+        """
+        self._http.close()
 
     def login(self, *, password: str, network_id: str) -> bool:
         """ """
         url = f"https://api.casambi.com/network/{network_id}/session"
 
-        headers = {
-            "Content-type": "application/json",
-        }
-
         payload = {"password": password, "deviceName": DEVICE_NAME}
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = self._http.post(url, json=payload)
 
         if response.status_code != 200:
             reason = "login: failed with "
@@ -66,8 +110,57 @@ class Casambi:
         data["expires"] = datetime.utcfromtimestamp(data["expires"] / 1000)
         self.session = Session(**data)
 
+        if self.session_store:
+            session_data = asdict(self.session)
+            del session_data["expires"]
+
+            self.session_store.save(
+                f"private:{network_id}",
+                session_data,
+                expires=(self.session.expires - _EPOCH).total_seconds(),
+            )
+
         return data
 
+    def restore_session(self, *, network_id: str) -> bool:
+        """
+        Reuse a session from the session store, returns False if there is
+        no session saved that is valid for longer than refresh_margin
+        """
+        if not self.session_store:
+            return False
+
+        entry = self.session_store.load(f"private:{network_id}")
+
+        if not entry:
+            return False
+
+        entry = dict(entry)
+        entry["expires"] = datetime.utcfromtimestamp(entry["expires"])
+        session = Session(**entry)
+
+        if session.expires_soon(self.refresh_margin):
+            return False
+
+        self.session = session
+
+        return True
+
+    def ensure_session(self, *, network_id: str):
+        """
+        Make sure there is a session that is valid for longer than
+        refresh_margin, reusing a saved session or logging in
+        """
+        if self.session and not self.session.expires_soon(self.refresh_margin):
+            return
+
+        if self.restore_session(network_id=network_id):
+            return
+
+        _LOGGER.debug(f"ensure_session: logging in to network {network_id}")
+
+        self.login(password=self.network_password, network_id=network_id)
+
     def authenticated(self) -> bool:
         if not self.session:
             return False
@@ -88,15 +181,25 @@ class Casambi:
         Get network information
         """
 
-        if not self.authenticated:
-            raise CasambiApiException("Need to be authenticated!")
+        # Reuses, restores or refreshes the session before it expires
+        self.ensure_session(network_id=network_id)
 
         url = f"{self.url}/network/{network_id}/"
 
         payload = {"formatVersion": 1, "deviceName": DEVICE_NAME}
         headers = {"X-Casambi-Session": self.session.session}
 
-        response = requests.get(url, headers=headers, json=payload)
+        response = self._http.get(url, headers=headers, json=payload)
+
+        if response.status_code in AUTH_FAILURE_STATUS_CODES:
+            _LOGGER.debug(
+                f"get_network_information: got status_code: "
+                f"{response.status_code}, logging in again"
+            )
+            self.login(password=self.network_password, network_id=network_id)
+
+            headers = {"X-Casambi-Session": self.session.session}
+            response = self._http.get(url, headers=headers, json=payload)
 
         if response.status_code != 200:
             reason = "get_network_information_from_uuid: failed with"
@@ -130,11 +233,7 @@ class Casambi:
 
         url = f"{self.url}/network/uuid/{clean_name}"
 
-        headers = {
-            "Content-type": "application/json",
-        }
-
-        response = requests.get(url, headers=headers)
+        response = self._http.get(url)
 
         if response.status_code != 200:
             reason = "get_network_information_from_uuid: failed with"
@@ -3,28 +3,114 @@
 Library for Casambi Cloud api.
 Request api_key at: https://developer.casambi.com/
 """
-import uuid
 import json
 import logging
 import datetime
-import socket
-from pprint import pformat
+import threading
+import time
+import collections
 from typing import Tuple
-from colorsys import rgb_to_hsv
-
-import requests
-import websocket
 
+from .capabilities import (
+    DEFAULT_CAPABILITY_TTL,
+    CapabilityCache,
+    UnitCapabilities,
+)
+from .color import (
+    check_mired,
+    color_temperature,
+    color_temperatures,
+    rgb_to_hue_sat,
+)
+from .command_queue import (
+    DEFAULT_GLOBAL_RATE,
+    DEFAULT_UNIT_RATE,
+    QUEUED_METHODS,
+    CommandQueue,
+    command_key,
+)
+from .datapoint_columns import (
+    DEFAULT_TIME_KEY,
+    DEFAULT_UNIT_KEY,
+    DEFAULT_VALUE_KEY,
+    datapoints_to_columns,
+    to_epoch_ms,
+)
+from .datapoint_store import DEFAULT_BUCKET, DEFAULT_SETTLE_TIME, split_buckets
+from .datapoints import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_WINDOW,
+    datapoint_time,
+    format_time,
+    parse_time,
+    split_windows,
+)
+from .effects import DEFAULT_FRAME_RATE, DEFAULT_MIN_FRAME_RATE, EffectsEngine
 from .exceptions import CasambiApiException
+from .fixture_catalog import FixtureCatalog
+from .frames import FrameEncoder, to_int_id
+from .http_session import (
+    DEFAULT_API_URL,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_WS_URL,
+    create_http_session,
+)
+from .metrics import (
+    MetricsRegistry,
+    observe_ws_event,
+    observe_ws_send,
+    rest_response_hook,
+)
+from .network_state import DEFAULT_MAX_STALENESS, NetworkStateMirror, by_id
+from .reconcile import ReconcileReport, desires_off, plan
+from .session_store import SessionStore, select_network_id
+from .unit_index import UnitIndex
+from .unit_state import UnitState
+from .ws_reader import DEFAULT_QUEUE_SIZE, EventCallbacks, WebSocketReader
+from .ws_supervisor import (
+    DEFAULT_BACKOFF_BASE,
+    DEFAULT_BACKOFF_MAX,
+    DEFAULT_MAX_QUEUED,
+    DEFAULT_PING_INTERVAL,
+    DEFAULT_STALL_TIMEOUT,
+    WebSocketSupervisor,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# The public api does not tell when a session expires
+DEFAULT_SESSION_TTL = 24 * 60 * 60
+
+# Status codes meaning the session is not valid (anymore)
+AUTH_FAILURE_STATUS_CODES = (401, 403)
+
+
 class Casambi:
     """
     Casambi api object
     """
 
-    def __init__(self, *, api_key, email, user_password, network_password, wire_id=1):
+    def __init__(
+        self,
+        *,
+        api_key,
+        email,
+        user_password,
+        network_password,
+        wire_id=1,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        headers=None,
+        capability_ttl=DEFAULT_CAPABILITY_TTL,
+        session_store: SessionStore = None,
+        session_ttl=DEFAULT_SESSION_TTL,
+        relogin_on_auth_failure=True,
+        compact_frames=False,
+        api_url=DEFAULT_API_URL,
+        ws_url=DEFAULT_WS_URL,
+        metrics: MetricsRegistry = None,
+        http_session=None,
+    ):
         self.sock = None
         self.web_sock = None
 
@@ -37,21 +123,102 @@ class Casambi:
         self.email = email
         self.user_password = user_password
         self.network_password = network_password
+        self.api_url = api_url.rstrip("/")
+        self.ws_url = ws_url
+
+        default_headers = {
+            "X-Casambi-Key": self.api_key,
+            "Content-type": "application/json",
+        }
+
+        if headers:
+            default_headers.update(headers)
+
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.metrics = metrics
+
+        # Created on first use, so requests is only imported when needed.
+        # A session given as http_session is shared with other clients and
+        # not closed by close()
+        self._http_headers = default_headers
+        self._http_session = http_session
+        self._owns_http_session = http_session is None
+        self._http_lock = threading.Lock()
+
+        self._capabilities = CapabilityCache(ttl=capability_ttl)
+
+        self._event_callbacks = EventCallbacks()
+        self.ws_reader = None
+        self.ws_supervisor = None
+        self.ws_multiplexer = None
+        self.wire_status = None
+
+        self.command_queue = None
+        self._frames = FrameEncoder(wire_id=wire_id, compact=compact_frames)
+
+        self.state_mirror = None
+        self.unit_index = None
+        self.effects = None
+
+        self.session_store = session_store
+        self.session_ttl = session_ttl
+        self.relogin_on_auth_failure = relogin_on_auth_failure
+        self._relogin_lock = threading.Lock()
+
+    @property
+    def _http(self):
+        if self._http_session is None:
+            with self._http_lock:
+                if self._http_session is None:
+                    self._http_session = create_http_session(
+                        pool_size=self.pool_size,
+                        keep_alive=self.keep_alive,
+                        headers=self._http_headers,
+                        response_hook=(
+                            rest_response_hook(self.metrics) if self.metrics else None
+                        ),
+                    )
+
+        return self._http_session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the websocket (if open) and the pooled HTTP connections
+        """
+        self.stop_effects()
+        self.disable_command_queue()
+        self.ws_stop_supervisor()
+        self.stop_state_mirror()
+        self.drop_unit_index()
+        self.ws_stop_reader()
+
+        if self.web_sock:
+            self.web_sock.close()
+            self.web_sock = None
+            self.ws_multiplexer = None
+
+        if self._http_session and self._owns_http_session:
+            self._http_session.close()
+            self._http_session = None
 
     def create_user_session(self):
         """
         Function for creating a user session in Casambis cloud api
         """
-        url = "https://door.casambi.com/v1/users/session/"
-        headers = {"Content-type": "application/json", "X-Casambi-Key": self.api_key}
-
+        url = f"{self.api_url}/users/session/"
         payload = {"email": self.email, "password": self.user_password}
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = self._http.post(url, json=payload)
 
         if response.status_code != 200:
-            reason = "create_user_session: headers: {},".format(headers)
-            reason += " payload: {},".format(payload)
+            reason = "create_user_session: payload: {},".format(payload)
             reason += 'message: "Got a invalid status_code",'
             reason += "status_code: {},".format(response.status_code)
             reason += "#response: {}".format(response.text)
@@ -60,9 +227,16 @@ class Casambi:
         data = response.json()
 
         self._session_id = data["sessionId"]
-        self.network_id = data["networks"][list(data["networks"].keys())[0]]["id"]
 
-        _LOGGER.debug(f"data from create_user_session: {pformat(data)}")
+        self.network_id = select_network_id(
+            self.network_id,
+            [network["id"] for network in data["networks"].values()],
+        )
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            from pprint import pformat
+
+            _LOGGER.debug(f"data from create_user_session: {pformat(data)}")
 
         return data["sessionId"]
 
@@ -70,15 +244,10 @@ class Casambi:
         """
         Function for creating a network session in Casambis cloud api
         """
-        url = "https://door.casambi.com/v1/networks/session/"
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "Content-type": "application/json",
-        }
-
+        url = f"{self.api_url}/networks/session/"
         payload = {"email": self.email, "password": self.network_password}
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = self._http.post(url, json=payload)
 
         if response.status_code != 200:
             reason = "create_network_session: failed with"
@@ -89,29 +258,112 @@ class Casambi:
 
         data = response.json()
 
-        self.network_id = list(data.keys())[0]
+        self.network_id = select_network_id(self.network_id, data.keys())
         self._session_id = data[self.network_id]["sessionId"]
 
+        if self.session_store:
+            self.session_store.save(
+                self._session_store_key(),
+                {"session_id": self._session_id, "network_id": self.network_id},
+                expires=time.time() + self.session_ttl,
+            )
+
         return data.keys()
 
+    def set_network_session(self, *, network_id, session_id):
+        """
+        Use a network session created elsewhere, for example by
+        CasambiNetworkManager
+        """
+        self.network_id = network_id
+        self._session_id = session_id
+
+    def _session_store_key(self) -> str:
+        return f"public:{self.email}"
+
+    def restore_session(self) -> bool:
+        """
+        Reuse a session from the session store, returns False if there is
+        no valid session saved
+        """
+        if not self.session_store:
+            return False
+
+        entry = self.session_store.load(self._session_store_key())
+
+        if not entry:
+            return False
+
+        self._session_id = entry["session_id"]
+        self.network_id = entry["network_id"]
+
+        _LOGGER.debug(f"restore_session: reusing session for {self.network_id}")
+
+        return True
+
+    def login(self):
+        """
+        Reuse a saved session if there is one, otherwise create new user and
+        network sessions
+        """
+        if self.restore_session():
+            return
+
+        self.create_user_session()
+        self.create_network_session()
+
+    def relogin(self):
+        """
+        Drop the current (and saved) session and log in again
+        """
+        if self.session_store:
+            self.session_store.delete(self._session_store_key())
+
+        self.create_user_session()
+        self.create_network_session()
+
+    def _session_get(self, url):
+        """
+        GET url with the session, logs in again and retries once if the
+        session is rejected
+        """
+        session_id = self._session_id
+        response = self._http.get(url, headers={"X-Casambi-Session": session_id})
+
+        if (
+            response.status_code in AUTH_FAILURE_STATUS_CODES
+            and self.relogin_on_auth_failure
+        ):
+            # Concurrent fetches all get rejected, only the first one logs
+            # in again and the others retry with its session
+            with self._relogin_lock:
+                if self._session_id == session_id:
+                    _LOGGER.debug(
+                        f"_session_get: got status_code: {response.status_code}, "
+                        "logging in again"
+                    )
+                    self.relogin()
+
+            response = self._http.get(
+                url, headers={"X-Casambi-Session": self._session_id}
+            )
+
+        return response
+
     def get_network_information(self):
         """
         Function for getting the network information from Casambis cloud api
         """
         # GET https://door.casambi.com/v1/networks/{id}
 
-        url = f"https://door.casambi.com/v1/networks/{self.network_id}"
+        url = f"{self.api_url}/networks/{self.network_id}"
 
         if not self._session_id:
             raise CasambiApiException("No session id is set. Need to login!")
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = "get_network_information: url: {}".format(url)
@@ -131,22 +383,40 @@ class Casambi:
     def get_unit_state(self, *, unit_id):
         """
         Getter for getting the unit state from Casambis cloud api
+
+        Answered from the state mirror when it is started, see
+        start_state_mirror
+        """
+        return self._fetch_unit_state(unit_id=unit_id)
+
+    def _fetch_unit_state(self, *, unit_id):
         """
+        The unit state, states from the REST api are parsed into the
+        capability cache. States from the state mirror are not, since
+        _on_mirror_event keeps the cache current.
+        """
+        data = self._get_mirrored_unit_state(unit_id=unit_id)
+
+        if data is not None:
+            return data
+
+        data = self._get_unit_state_rest(unit_id=unit_id)
+        self._capabilities.update(unit_id=int(unit_id), data=data)
+
+        return data
+
+    def _get_unit_state_rest(self, *, unit_id):
         # GET https://door.casambi.com/v1/networks/{id}
 
-        url = "https://door.casambi.com/v1/networks/"
+        url = f"{self.api_url}/networks/"
         url += f"{self.network_id}/units/{unit_id}/state"
 
         if not self._session_id:
             raise CasambiApiException("No session id is set. Need to login!")
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = "get_unit_state: url: {}".format(url)
@@ -162,7 +432,310 @@ class Casambi:
 
         return data
 
-    def ws_open(self) -> bool:
+    def get_unit_state_model(self, *, unit_id) -> UnitState:
+        """
+        The unit state parsed into a UnitState, see get_unit_state
+        """
+        mirror = self._fresh_state_mirror()
+
+        if mirror:
+            state = mirror.get_unit_state_model(unit_id)
+
+            if state is not None:
+                return state
+
+        data = self._get_unit_state_rest(unit_id=unit_id)
+        state = UnitState.from_dict(data, unit_id=unit_id)
+        self._capabilities.update_from_state(state)
+
+        return state
+
+    def get_unit_state_models(self, *, unit_ids=None, max_workers=None) -> dict:
+        """
+        Like get_unit_states with the states parsed into UnitState, units
+        that could not be fetched keep their exception
+        """
+        if unit_ids is not None:
+            return self._fetch_concurrently(
+                self.get_unit_state_model,
+                "unit_id",
+                [to_int_id(unit_id, "unit_id") for unit_id in unit_ids],
+                max_workers=max_workers,
+            )
+
+        network_state = self.get_network_state()
+        units = network_state.get("units", {})
+        units = units.values() if isinstance(units, dict) else units
+
+        results = {}
+
+        for unit in units:
+            state = UnitState.from_dict(unit)
+            self._capabilities.update_from_state(state)
+            results[state.unit_id] = state
+
+        return results
+
+    def get_unit_states(self, *, unit_ids=None, max_workers=None) -> dict:
+        """
+        Unit states for many units, fetched concurrently by max_workers
+        threads (defaults to pool_size) over the shared connection pool.
+
+        Returns a dict keyed on unit id with the unit state, or the
+        exception if the state of that unit could not be fetched. Without
+        unit_ids every unit is returned from one get_network_state call.
+        """
+        if unit_ids is None:
+            network_state = self.get_network_state()
+            units = network_state.get("units", {})
+            units = units.values() if isinstance(units, dict) else units
+
+            results = {int(unit["id"]): unit for unit in units}
+
+            for unit_id, data in results.items():
+                self._capabilities.update(unit_id=unit_id, data=data)
+
+            return results
+
+        return self._fetch_concurrently(
+            self.get_unit_state,
+            "unit_id",
+            [to_int_id(unit_id, "unit_id") for unit_id in unit_ids],
+            max_workers=max_workers,
+        )
+
+    def _fetch_concurrently(self, function, keyword: str, ids, *, max_workers):
+        """
+        Call function(keyword=id) for every unique id in a thread pool,
+        returns the result or the exception per id
+        """
+        ids = list(dict.fromkeys(ids))
+        results = {}
+
+        if not ids:
+            return results
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers or self.pool_size, len(ids)),
+            thread_name_prefix="casambi-fetch",
+        ) as executor:
+            futures = {
+                item_id: executor.submit(function, **{keyword: item_id})
+                for item_id in ids
+            }
+
+            for item_id, future in futures.items():
+                try:
+                    results[item_id] = future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    results[item_id] = err
+
+        return results
+
+    def start_state_mirror(
+        self, *, max_staleness=DEFAULT_MAX_STALENESS, queue_size=DEFAULT_QUEUE_SIZE
+    ):
+        """
+        Keep an in memory copy of the network state, seeded from
+        get_network_state, get_unit_list and get_scenes_list and updated
+        from unitChanged events on the websocket.
+
+        While the websocket reader is running get_unit_state, unit_supports_*
+        and get_supported_color_temperature are answered from memory. The
+        mirror is seeded again when it is older than max_staleness seconds.
+        """
+        if self.state_mirror:
+            raise CasambiApiException("State mirror is already started!")
+
+        if not self._events_running():
+            self.ws_start_reader(queue_size=queue_size)
+
+        self.state_mirror = NetworkStateMirror(max_staleness=max_staleness)
+
+        # Listen before seeding, refresh_state_mirror replays the events
+        # received while the REST api is read
+        self.add_event_callback(self._on_mirror_event, method="unitChanged")
+
+        self.refresh_state_mirror()
+
+    def refresh_state_mirror(self):
+        """
+        Seed the state mirror again from the REST api
+        """
+        if not self.state_mirror:
+            raise CasambiApiException("State mirror is not started!")
+
+        mirror = self.state_mirror
+        mirror.begin_seed()
+
+        try:
+            network_state = self.get_network_state()
+            unit_list = self.get_unit_list()
+            scenes_list = self.get_scenes_list()
+        except Exception:
+            mirror.abort_seed()
+            raise
+
+        mirror.seed(
+            network_state=network_state,
+            unit_list=unit_list,
+            scenes_list=scenes_list,
+        )
+
+    def stop_state_mirror(self):
+        """
+        Stop updating the state mirror, reads go to the REST api again
+        """
+        if self.state_mirror:
+            self.remove_event_callback(self._on_mirror_event)
+            self.state_mirror = None
+
+    def _on_mirror_event(self, message: dict):
+        mirror = self.state_mirror
+
+        if not mirror:
+            return
+
+        state = mirror.apply_event(message)
+
+        if state is not None and "controls" in message:
+            self._capabilities.update_from_state(state)
+
+    def build_unit_index(self) -> UnitIndex:
+        """
+        Build the unit index from get_network_state, get_unit_list and
+        get_scenes_list, see UnitIndex for the lookups.
+
+        The index is updated per unit from unitChanged events while the
+        websocket reader (or multiplexer) runs and is built again after the
+        supervisor reconnects, call build_unit_index again to pick up added
+        or removed units and scenes.
+        """
+        if not self.unit_index:
+            self.unit_index = UnitIndex()
+
+            # Events received while the REST api is read are replayed by
+            # build
+            self.add_event_callback(self._on_index_event, method="unitChanged")
+
+        index = self.unit_index
+        index.begin_build()
+
+        try:
+            network_state = self.get_network_state()
+            unit_list = self.get_unit_list()
+            scenes_list = self.get_scenes_list()
+        except Exception:
+            index.abort_build()
+            raise
+
+        index.build(
+            unit_list=unit_list,
+            scenes_list=scenes_list,
+            unit_states=network_state.get("units"),
+            groups=network_state.get("groups"),
+        )
+
+        for unit_id, data in index.get_units().items():
+            if "controls" in data:
+                self._capabilities.update(unit_id=unit_id, data=data)
+
+        return self.unit_index
+
+    def drop_unit_index(self):
+        """
+        Stop updating the unit index and drop it
+        """
+        if self.unit_index:
+            self.remove_event_callback(self._on_index_event)
+            self.unit_index = None
+
+    def _on_index_event(self, message: dict):
+        index = self.unit_index
+
+        if index:
+            index.apply_event(message)
+
+    def select_units(self, **selector) -> list:
+        """
+        Sorted unit ids matching the selector, for example
+        select_units(group_name="Office 2", capability="CCT"). See
+        UnitIndex.select for the selectors, build_unit_index needs to be
+        called first.
+        """
+        if not self.unit_index:
+            raise CasambiApiException("Unit index is not built!")
+
+        return sorted(self.unit_index.select(**selector))
+
+    def set_selected_units_target_controls(
+        self, *, target_controls, **selector
+    ) -> dict:
+        """
+        Send the same target controls to every unit matching the selector,
+        see select_units and set_units_target_controls
+        """
+        return self._set_units_same_target_controls(
+            unit_ids=self.select_units(**selector), target_controls=target_controls
+        )
+
+    def _get_mirrored_unit_state(self, *, unit_id):
+        """
+        Return the unit state from the state mirror, None when the mirror
+        can not answer and the REST api needs to be used
+        """
+        mirror = self._fresh_state_mirror()
+
+        if not mirror:
+            return None
+
+        return mirror.get_unit_state(unit_id)
+
+    def _fresh_state_mirror(self):
+        """
+        The state mirror, seeded again if it is too old, or None when the
+        mirror can not answer and the REST api needs to be used
+        """
+        if not self.state_mirror:
+            return None
+
+        # Without a reader the mirror does not see any changes
+        if not self._events_running():
+            return None
+
+        if not self.state_mirror.fresh():
+            self.refresh_state_mirror()
+
+        return self.state_mirror
+
+    def get_unit_capabilities(self, *, unit_id: int) -> UnitCapabilities:
+        """
+        Return the capabilities of a unit, only fetches the unit state when
+        the unit is missing in the capability cache or the entry has expired
+        """
+        capabilities = self._capabilities.get(int(unit_id))
+
+        if capabilities is None:
+            # Not read back from the cache, with ttl 0 it is expired already.
+            # The state comes parsed from the state mirror or the REST api
+            state = self.get_unit_state_model(unit_id=unit_id)
+            capabilities = self._capabilities.update_from_state(state)
+
+        return capabilities
+
+    def invalidate_unit_capabilities(self, *, unit_id=None):
+        """
+        Drop cached capabilities for a unit, or for all units if no unit_id
+        is given
+        """
+        if unit_id is not None:
+            unit_id = int(unit_id)
+
+        self._capabilities.invalidate(unit_id)
+
+    def ws_open(self, *, multiplexer=None) -> bool:
         """
         openWireSucceed         API key authentication failed. Either given key
         was invalid or WebSocket functionality is not enabled for it.
@@ -181,8 +754,19 @@ class Casambi:
 
         invalidData	            Received data is invalid and cannot be
         processed, for example expected list of items is in wrong data format.
+
+        With a multiplexer (see WebSocketMultiplexer) the wire is opened on
+        its shared connection and messages of the wire go straight to the
+        event callbacks, no reader needs to be started.
         """
-        url = "wss://door.casambi.com/v1/bridge/"
+        if multiplexer is not None:
+            return self._ws_open_multiplexed(multiplexer)
+
+        url = self.ws_url
+
+        import uuid
+
+        import websocket
 
         reference = "{}".format(uuid.uuid1())
 
@@ -206,10 +790,34 @@ class Casambi:
 
         result = self.web_sock.recv()
 
-        data = json.loads(result)
+        data = self._decode_message(result)
+
+        return self._ws_open_result(data)
+
+    def _ws_open_multiplexed(self, multiplexer) -> bool:
+        if not self._session_id:
+            raise CasambiApiException("No session id is set. Need to login!")
+
+        if not self.network_id:
+            raise CasambiApiException("Network id needs to be set!")
+
+        data = multiplexer.open_wire(
+            wire_id=self.wire_id,
+            network_id=self.network_id,
+            session_id=self._session_id,
+            handler=self._event_callbacks.dispatch,
+        )
 
+        self.web_sock = multiplexer.wire(self.wire_id)
+        self.ws_multiplexer = multiplexer
+
+        return self._ws_open_result(data)
+
+    def _ws_open_result(self, data: dict) -> bool:
         _LOGGER.debug(f"ws_open response: {data}")
 
+        self.wire_status = data.get("wireStatus")
+
         # Can get what ever like:
         #  {'wire': 1, 'method': 'peerChanged', 'online': True}
         #
@@ -230,66 +838,130 @@ class Casambi:
             return True
         return False
 
-    def turn_unit_off(self, *, unit_id: int):
+    def enable_command_queue(
+        self, *, unit_rate=DEFAULT_UNIT_RATE, global_rate=DEFAULT_GLOBAL_RATE
+    ):
         """
-        Function for turning a unit of using the websocket
+        Send controlUnit and controlScene messages through a queue that only
+        keeps the latest target per unit and control type, and sends at
+        most unit_rate frames/s per unit and global_rate frames/s in total.
+
+        Useful for slider style input where only the last value matters.
         """
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
+        if self.command_queue:
+            raise CasambiApiException("Command queue is already enabled!")
+
+        self.command_queue = CommandQueue(
+            send=self._ws_send_encoded, unit_rate=unit_rate, global_rate=global_rate
+        )
+
+    def start_effects(
+        self, *, frame_rate=DEFAULT_FRAME_RATE, min_frame_rate=DEFAULT_MIN_FRAME_RATE
+    ) -> EffectsEngine:
+        """
+        Start an effects engine for fades, color loops and color temperature
+        ramps, see EffectsEngine. Works best together with
+        enable_command_queue, the engine slows down when the queue backs up.
+        """
+        if self.effects:
+            raise CasambiApiException("Effects engine is already started!")
+
+        self.effects = EffectsEngine(
+            casambi=self, frame_rate=frame_rate, min_frame_rate=min_frame_rate
+        )
+        self.effects.start()
+
+        return self.effects
+
+    def stop_effects(self):
+        """
+        Stop the effects engine, units keep their last sent values
+        """
+        if self.effects:
+            self.effects.stop()
+            self.effects = None
+
+    def disable_command_queue(self, *, flush=True):
+        """
+        Send messages directly again, pending messages are sent first unless
+        flush is False
+        """
+        if self.command_queue:
+            self.command_queue.stop(flush=flush)
+            self.command_queue = None
+
+    def _ws_send(self, message: dict):
+        """
+        Send a message on the websocket, through the command queue if enabled
+        """
+        if self.command_queue and message["method"] in QUEUED_METHODS:
+            self.command_queue.put_frame(
+                command_key(message), self._frame_encoder().encode_json(message)
+            )
         else:
-            raise CasambiApiException(
-                "expected unit_id to be an integer, got: {}".format(unit_id)
+            self._ws_send_now(message)
+
+    def _ws_send_now(self, message: dict):
+        """
+        Send a message on the websocket, through the supervisor if started
+        """
+        self._ws_send_encoded(self._frame_encoder().encode_json(message))
+
+    def _ws_send_frame(self, key: tuple, frame: str):
+        """
+        Send an encoded control frame, key is the command_key of the frame
+        used by the command queue
+        """
+        if self.command_queue and key[0] in QUEUED_METHODS:
+            self.command_queue.put_frame(key, frame)
+        else:
+            self._ws_send_encoded(frame)
+
+    def _frame_encoder(self) -> FrameEncoder:
+        if self._frames.wire_id != self.wire_id:
+            self._frames = FrameEncoder(
+                wire_id=self.wire_id, compact=self._frames.compact
             )
 
+        return self._frames
+
+    def _ws_send_encoded(self, data: str):
+        start = time.perf_counter()
+
+        if self.ws_supervisor:
+            self.ws_supervisor.send(data)
+        else:
+            self.web_sock.send(data)
+
+        if self.metrics:
+            observe_ws_send(self.metrics, data, time.perf_counter() - start)
+
+    def turn_unit_off(self, *, unit_id: int):
+        """
+        Function for turning a unit of using the websocket
+        """
+        unit_id = to_int_id(unit_id, "unit_id")
+
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
-        target_controls = {"Dimmer": {"value": 0}}
+        frame = self._frame_encoder().unit_off(unit_id)
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
-
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlUnit", unit_id, ("Dimmer",)), frame)
 
     def turn_unit_on(self, *, unit_id):
         """
         Response on ok:
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            reason = "expected unit_id to be an integer,"
-            reason += "got: {}".format(unit_id)
-            raise CasambiApiException(reason)
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
-        target_controls = {"Dimmer": {"value": 1}}
+        frame = self._frame_encoder().unit_on(unit_id)
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
-
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlUnit", unit_id, ("Dimmer",)), frame)
 
     def set_unit_vertical(self, *, unit_id: int, value: float):
         """
@@ -297,17 +969,7 @@ class Casambi:
         """
         target_value = value
 
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                f"expected unit_id to be an integer, got: {unit_id}"
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         # Unit_id needs to be an integer
         if isinstance(value, float):
@@ -322,62 +984,32 @@ class Casambi:
         if target_value > 1.0:
             raise CasambiApiException("Value needs to be between 0 and 1")
 
-        target_controls = {"Vertical": {"value": target_value}}
-
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
+        frame = self._frame_encoder().vertical(unit_id, target_value)
 
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlUnit", unit_id, ("Vertical",)), frame)
 
     def set_unit_target_controls(self, *, unit_id, target_controls):
         """
         Response on ok:
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                f"expected unit_id to be an integer, got: {unit_id}"
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
+        frame = self._frame_encoder().control_unit(unit_id, target_controls)
 
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(
+            ("controlUnit", unit_id, tuple(sorted(target_controls.keys()))), frame
+        )
 
     def set_unit_value(self, *, unit_id: int, value):
         """
         Response on ok:
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                f"expected unit_id to be an integer, got: {unit_id}"
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not (value >= 0 and value <= 1):
             raise CasambiApiException("value needs to be between 0 and 1")
@@ -385,16 +1017,9 @@ class Casambi:
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
-        target_controls = {"Dimmer": {"value": value}}
+        frame = self._frame_encoder().dimmer(unit_id, value)
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
-
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlUnit", unit_id, ("Dimmer",)), frame)
 
     def set_unit_rgbw_color(
         self, *, unit_id: int, color_value: Tuple[int, int, int, int]
@@ -402,39 +1027,20 @@ class Casambi:
         """
         Setter for RGB color
         """
-        target_controls = None
         (red, green, blue, white) = color_value
 
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                "expected unit_id to be an integer, got: {}".format(unit_id)
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
         white_value = white / 255.0
         # 'name': 'white', 'type': 'White', 'value': 0.0
-        target_controls = {
-            "RGB": {"rgb": f"rgb({red}, {green}, {blue})"},
-            "Colorsource": {"source": "RGB"},
-            "White": {"value": white_value},
-        }
+        frame = self._frame_encoder().rgbw(unit_id, red, green, blue, white_value)
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
-
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(
+            ("controlUnit", unit_id, ("Colorsource", "RGB", "White")), frame
+        )
 
     def set_unit_rgb_color(
         self, *, unit_id: int, color_value: Tuple[int, int, int], send_rgb_format=False
@@ -442,111 +1048,54 @@ class Casambi:
         """
         Setter for RGB color
         """
-        target_controls = None
         (red, green, blue) = color_value
-        (hue, sat, value) = rgb_to_hsv(red, green, blue)
 
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                "expected unit_id to be an integer, got: {}".format(unit_id)
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
         if not send_rgb_format:
-            target_controls = {
-                "RGB": {"hue": round(hue, 1), "sat": round(sat, 1)},
-                "Colorsource": {"source": "RGB"},
-            }
+            # Same conversion as set_units_rgb_color
+            (hue, sat) = rgb_to_hue_sat([color_value], use_numpy=False)[0]
+            frame = self._frame_encoder().rgb_hue_sat(unit_id, hue, sat)
         else:
-            target_controls = {
-                "RGB": {"rgb": f"rgb({red}, {green}, {blue})"},
-                "Colorsource": {"source": "RGB"},
-            }
+            frame = self._frame_encoder().rgb(unit_id, red, green, blue)
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
-
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlUnit", unit_id, ("Colorsource", "RGB")), frame)
 
     def set_unit_color_temperature(self, *, unit_id: int, value: int, source="TW"):
         """
         Setter for unit color temperature (kelvin)
         """
-        target_value = value
-        if source == "mired":
-            # Convert to Kelvin
-            target_value = round(1000000 / value)
-
-        # Convert to nerest 50 in kelvin, like the gui is doing
-        if target_value % 50 != 0:
-            target_value = int(target_value / 50) * 50 + 50
-
-            dbg_msg = "set_unit_color_temperature "
-            dbg_msg += f"converting target value to {target_value}"
-            dbg_msg += " (nearest 50 kelvin like GUI)"
-            _LOGGER.debug(dbg_msg)
-
-        # Get min and max temperature color in kelvin
-        (cct_min, cct_max, _) = self.get_supported_color_temperature(unit_id=unit_id)
-        if target_value < cct_min:
-            dbg_msg = "set_unit_color_temperature "
-            dbg_msg += f"target_value: {target_value}"
-            dbg_msg += " smaller than min supported temperature,"
-            dbg_msg += " setting to min supported color temperature:"
-            dbg_msg += f" {cct_min}"
-            _LOGGER.debug(dbg_msg)
-
-            target_value = cct_min
-        elif target_value > cct_max:
-            dbg_msg = "set_unit_color_temperature "
-            dbg_msg += f"target_value: {target_value}"
-            dbg_msg += " larger than max supported temperature,"
-            dbg_msg += " setting to max supported color temperature:"
-            dbg_msg += f" {cct_max}"
-            _LOGGER.debug(dbg_msg)
-
-            target_value = cct_max
-
-        # Unit_id needs to be an integer
-        if isinstance(unit_id, int):
-            pass
-        elif isinstance(unit_id, str):
-            unit_id = int(unit_id)
-        elif isinstance(unit_id, float):
-            unit_id = int(unit_id)
-        else:
-            raise CasambiApiException(
-                f"expected unit_id to be an integer, got: {unit_id}"
-            )
+        unit_id = to_int_id(unit_id, "unit_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
-        target_controls = {
-            "ColorTemperature": {"value": target_value},
-            "Colorsource": {"source": "TW"},
-        }
+        # Get min and max temperature color in kelvin, from the capability
+        # cache so only the first command for a unit costs a GET
+        capabilities = self.get_unit_capabilities(unit_id=unit_id)
+
+        # Snapped up to the nearest 50 kelvin like the GUI and clamped to
+        # the supported range
+        target_value = color_temperature(
+            value,
+            cct_min=capabilities.cct_min,
+            cct_max=capabilities.cct_max,
+            source=source,
+        )
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlUnit",
-            "id": unit_id,
-            "targetControls": target_controls,
-        }
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                f"set_unit_color_temperature: {value} ({source}) -> {target_value}"
+            )
 
-        self.web_sock.send(json.dumps(message))
+        frame = self._frame_encoder().color_temperature(unit_id, target_value)
+
+        self._ws_send_frame(
+            ("controlUnit", unit_id, ("ColorTemperature", "Colorsource")), frame
+        )
 
     def get_supported_color_temperature(
         self, *, unit_id: int
@@ -556,30 +1105,46 @@ class Casambi:
 
         Returns (0, 0, 0) if nothing is supported
         """
-        cct_min = 0
-        cct_max = 0
-        current = 0
+        state = self.get_unit_state_model(unit_id=unit_id)
 
-        data = self.get_unit_state(unit_id=unit_id)
+        if not state.supports_color_temperature:
+            return (0, 0, 0)
 
-        if "controls" not in data:
-            return (cct_min, cct_max, current)
+        return (state.cct_min, state.cct_max, state.cct)
 
-        for control in data["controls"]:
-            if isinstance(control, list):
-                for inner_control in control:
-                    if "type" in inner_control and inner_control["type"] == "CCT":
-                        cct_min = inner_control["min"]
-                        cct_max = inner_control["max"]
-                        current = inner_control["value"]
-            if "type" in control and control["type"] == "CCT":
-                cct_min = control["min"]
-                cct_max = control["max"]
-                current = control["value"]
+    def unit_supports_rgbw(self, *, unit_id: int) -> bool:
+        """
+        Returns true if unit supports color temperature
 
-        return (cct_min, cct_max, current)
+        {
+            'activeSceneId': 0,
+            'address': 'ffffff',
+            'condition': 0,
+            'controls': [[{'name': 'dimmer0', 'type': 'Dimmer', 'value': 0.0},
+                        {'hue': 0.9882697947214076,
+                            'name': 'rgb',
+                            'rgb': 'rgb(255, 21, 40)',
+                            'sat': 0.9176470588235294,
+                            'type': 'Color'},
+                        {'name': 'white', 'type': 'White', 'value': 0.0}]],
+            'dimLevel': 0.0,
+            'firmwareVersion': '26.24',
+            'fixtureId': 4027,
+            'groupId': 0,
+            'id': 14,
+            'name': 'Test RGB',
+            'on': True,
+            'online': True,
+            'position': 10,
+            'priority': 3,
+            'status': 'ok',
+            'type': 'Luminaire'}
 
-    def unit_supports_rgbw(self, *, unit_id: int) -> bool:
+        """
+
+        return self.get_unit_capabilities(unit_id=unit_id).rgbw
+
+    def unit_supports_rgb(self, *, unit_id: int) -> bool:
         """
         Returns true if unit supports color temperature
 
@@ -609,179 +1174,395 @@ class Casambi:
 
         """
 
-        data = self.get_unit_state(unit_id=unit_id)
-        color = False
-        white = False
+        return self.get_unit_capabilities(unit_id=unit_id).rgb
+
+    def unit_supports_color_temperature(self, *, unit_id: int) -> bool:
+        """
+        Returns true if unit supports color temperature
+
+        {
+            'activeSceneId': 0,
+            'address': '26925689c64c',
+            'condition': 0,
+            'controls': [[{'type': 'Dimmer', 'value': 0.0},
+                        {'level': 0.49736842105263157,
+                            'max': 6000,
+                            'min': 2200,
+                            'type': 'CCT',
+                            'value': 4090.0}]],
+            'dimLevel': 0.0,
+            'firmwareVersion': '26.24',
+            'fixtureId': 14235,
+            'groupId': 0,
+            'id': 13,
+            'image': 'mbUdKbLz5g3VsVNJIgTYboHa8ce9YfSK',
+            'name': 'Arbetslampa',
+            'on': True,
+            'online': True,
+            'position': 9,
+            'priority': 3,
+            'status': 'ok',
+            'type': 'Luminaire'
+        }
+
+        """
+
+        return self.get_unit_capabilities(unit_id=unit_id).color_temperature
+
+    def set_units_target_controls(self, *, target_controls: dict) -> dict:
+        """
+        Send target controls to many units, target_controls maps unit id to
+        the target controls for that unit.
+
+        All frames are encoded first and then sent back to back, target
+        controls shared by many units (the same dict) are encoded once.
+        Returns a dict with unit id as key and None if the frame was
+        accepted, or the exception if it could not be encoded or sent.
+        Accepted means sent, or queued when the command queue is enabled
+        where a later target for the unit may still replace it.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        results = {}
+        frames = []
+        encoder = self._frame_encoder()
+
+        # id of a target controls dict -> (encoded, control types), the
+        # dicts are alive for the whole call so ids are not reused
+        encoded = {}
+
+        for unit_id, unit_target_controls in target_controls.items():
+            try:
+                unit_id = to_int_id(unit_id, "unit_id")
+
+                entry = encoded.get(id(unit_target_controls))
+
+                if entry is None:
+                    entry = (
+                        encoder.encode_json(unit_target_controls),
+                        tuple(sorted(unit_target_controls)),
+                    )
+                    encoded[id(unit_target_controls)] = entry
+
+                frame = encoder.control_unit_encoded(unit_id, entry[0])
+                key = ("controlUnit", unit_id, entry[1])
+
+                frames.append((unit_id, key, frame))
+            except (CasambiApiException, ValueError, TypeError) as err:
+                results[unit_id] = err
+
+        return self._send_unit_frames(frames, results)
+
+    def _send_unit_frames(self, frames, results) -> dict:
+        """
+        Send (unit_id, key, frame) back to back, see
+        set_units_target_controls for the results
+        """
+        for (unit_id, key, frame) in frames:
+            try:
+                self._ws_send_frame(key, frame)
+
+                results[unit_id] = None
+            except Exception as err:  # pylint: disable=broad-except
+                results[unit_id] = err
+
+        return results
+
+    def set_units_rgb_color(self, *, colors: dict, send_rgb_format=False) -> dict:
+        """
+        Set the RGB color of many units, colors maps unit id to a (red,
+        green, blue) tuple. The colors are converted to hue and saturation
+        in one batch, see casambi.color. See set_units_target_controls for
+        the result.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        results = {}
+        unit_ids = []
+        rgb_colors = []
+
+        for unit_id, color_value in colors.items():
+            try:
+                unit_id = to_int_id(unit_id, "unit_id")
+
+                if len(color_value) != 3:
+                    raise CasambiApiException(
+                        f"expected color to be (red, green, blue), got: {color_value}"
+                    )
+            except Exception as err:  # pylint: disable=broad-except
+                results[unit_id] = err
+                continue
+
+            unit_ids.append(unit_id)
+            rgb_colors.append(tuple(color_value))
+
+        encoder = self._frame_encoder()
+
+        if send_rgb_format:
+            frames = [
+                (unit_id, encoder.rgb(unit_id, red, green, blue))
+                for (unit_id, (red, green, blue)) in zip(unit_ids, rgb_colors)
+            ]
+        else:
+            hue_sat = rgb_to_hue_sat(rgb_colors)
+            frames = [
+                (unit_id, encoder.rgb_hue_sat(unit_id, float(hue), float(sat)))
+                for (unit_id, (hue, sat)) in zip(unit_ids, hue_sat)
+            ]
+
+        return self._send_unit_frames(
+            [
+                (unit_id, ("controlUnit", unit_id, ("Colorsource", "RGB")), frame)
+                for (unit_id, frame) in frames
+            ],
+            results,
+        )
+
+    def set_units_color_temperature(self, *, values: dict, source="TW") -> dict:
+        """
+        Set the color temperature (Kelvin, or mired with source="mired") of
+        many units, values maps unit id to the value. The values are
+        snapped and clamped to the range of each unit in one batch, see
+        casambi.color. See set_units_target_controls for the result.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        results = {}
+        unit_values = []
+        cct_min = []
+        cct_max = []
+
+        for unit_id, value in values.items():
+            try:
+                unit_id = to_int_id(unit_id, "unit_id")
+
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise CasambiApiException(
+                        f"expected value to be a number, got: {value}"
+                    )
+
+                if source == "mired":
+                    check_mired(value)
+
+                capabilities = self.get_unit_capabilities(unit_id=unit_id)
+            except Exception as err:  # pylint: disable=broad-except
+                results[unit_id] = err
+                continue
+
+            unit_values.append((unit_id, value))
+            cct_min.append(capabilities.cct_min)
+            cct_max.append(capabilities.cct_max)
+
+        kelvin = color_temperatures(
+            [value for (_, value) in unit_values],
+            cct_min=cct_min,
+            cct_max=cct_max,
+            source=source,
+        )
+
+        encoder = self._frame_encoder()
+        frames = [
+            (
+                unit_id,
+                ("controlUnit", unit_id, ("ColorTemperature", "Colorsource")),
+                encoder.color_temperature(unit_id, int(target_value)),
+            )
+            for ((unit_id, _), target_value) in zip(unit_values, kelvin)
+        ]
+
+        return self._send_unit_frames(frames, results)
+
+    def _set_units_same_target_controls(self, *, unit_ids, target_controls):
+        # Every unit gets the same dict, so it is encoded once
+        return self.set_units_target_controls(
+            target_controls={unit_id: target_controls for unit_id in unit_ids}
+        )
+
+    def turn_units_on(self, *, unit_ids) -> dict:
+        """
+        Turn many units on, see set_units_target_controls for the result
+        """
+        return self._set_units_same_target_controls(
+            unit_ids=unit_ids, target_controls={"Dimmer": {"value": 1}}
+        )
+
+    def turn_units_off(self, *, unit_ids) -> dict:
+        """
+        Turn many units off, see set_units_target_controls for the result
+        """
+        return self._set_units_same_target_controls(
+            unit_ids=unit_ids, target_controls={"Dimmer": {"value": 0}}
+        )
 
-        if "controls" not in data:
-            return False
+    def set_units_value(self, *, unit_ids, value) -> dict:
+        """
+        Set the dimmer value (0-1) of many units, see
+        set_units_target_controls for the result
+        """
+        if not (value >= 0 and value <= 1):
+            raise CasambiApiException("value needs to be between 0 and 1")
 
-        for control in data["controls"]:
-            if isinstance(control, list):
-                for inner_control in control:
-                    if "type" in inner_control and inner_control["type"] == "Color":
-                        color = True
-                    elif "type" in inner_control and inner_control["type"] == "White":
-                        white = True
-            if "type" in control and control["type"] == "Color":
-                color = True
-            elif "type" in control and control["type"] == "White":
-                white = True
-
-        if color and white:
-            return True
-        return False
+        return self._set_units_same_target_controls(
+            unit_ids=unit_ids, target_controls={"Dimmer": {"value": value}}
+        )
 
-    def unit_supports_rgb(self, *, unit_id: int) -> bool:
+    def _current_unit_states(self) -> dict:
         """
-        Returns true if unit supports color temperature
+        UnitState per unit id from the state mirror when it is running,
+        otherwise from one get_network_state call
+        """
+        mirror = self._fresh_state_mirror()
 
-        {
-            'activeSceneId': 0,
-            'address': 'ffffff',
-            'condition': 0,
-            'controls': [[{'name': 'dimmer0', 'type': 'Dimmer', 'value': 0.0},
-                        {'hue': 0.9882697947214076,
-                            'name': 'rgb',
-                            'rgb': 'rgb(255, 21, 40)',
-                            'sat': 0.9176470588235294,
-                            'type': 'Color'},
-                        {'name': 'white', 'type': 'White', 'value': 0.0}]],
-            'dimLevel': 0.0,
-            'firmwareVersion': '26.24',
-            'fixtureId': 4027,
-            'groupId': 0,
-            'id': 14,
-            'name': 'Test RGB',
-            'on': True,
-            'online': True,
-            'position': 10,
-            'priority': 3,
-            'status': 'ok',
-            'type': 'Luminaire'}
+        if mirror:
+            return mirror.get_unit_states()
+
+        return self.get_unit_state_models()
+
+    def _current_scenes(self) -> dict:
+        if self.state_mirror:
+            return self.state_mirror.get_scenes()
 
+        if self.unit_index:
+            return self.unit_index.scenes
+
+        return by_id(self.get_scenes_list())
+
+    def apply_state(
+        self, desired: dict, *, shortcuts=True, dry_run=False
+    ) -> ReconcileReport:
         """
+        Bring units to a desired state with as few frames as possible.
+
+        desired maps unit id to {control: value}, values are 0-1 for
+        Dimmer and Vertical, Kelvin for CCT and (red, green, blue) or (hue,
+        sat) for RGB. The current state comes from the state mirror when it
+        is running, otherwise from get_network_state. Only controls that
+        differ from the current state are sent, one controlUnit per unit.
+
+        With shortcuts one controlNetwork is sent when every unit of the
+        network is desired at the same Dimmer level, and one controlScene
+        per scene whose units are all desired off. With dry_run nothing is
+        sent, the report has the frames that would be sent.
+        """
+        current = self._current_unit_states()
 
-        data = self.get_unit_state(unit_id=unit_id)
+        scenes = None
+        if shortcuts and desires_off(desired):
+            scenes = self._current_scenes()
 
-        if "controls" not in data:
-            return False
+        (frames, report) = plan(desired, current, scenes=scenes, shortcuts=shortcuts)
 
-        for control in data["controls"]:
-            if isinstance(control, list):
-                for inner_control in control:
-                    if "type" in inner_control and inner_control["type"] == "Color":
-                        return True
-            if "type" in control and control["type"] == "Color":
-                return True
-        return False
+        if dry_run:
+            report.sent = frames
+            report.dry_run = True
+            return report
 
-    def unit_supports_color_temperature(self, *, unit_id: int) -> bool:
+        if frames and not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        unit_frames = {}
+
+        for frame in frames:
+            (method, frame_id, controls) = frame
+
+            if method == "controlUnit":
+                unit_frames[frame_id] = frame
+                continue
+
+            try:
+                if method == "controlNetwork":
+                    self.set_network_target_controls(target_controls=controls)
+                else:
+                    self.turn_scene_off(scene_id=frame_id)
+
+                report.sent.append(frame)
+            except Exception as err:  # pylint: disable=broad-except
+                report.errors[(method, frame_id)] = err
+
+        if not unit_frames:
+            return report
+
+        results = self.set_units_target_controls(
+            target_controls={
+                unit_id: controls for (_, unit_id, controls) in unit_frames.values()
+            }
+        )
+
+        for unit_id, result in results.items():
+            if result is None:
+                report.sent.append(unit_frames[unit_id])
+            else:
+                report.errors[unit_id] = result
+
+        return report
+
+    def set_network_target_controls(self, *, target_controls):
         """
-        Returns true if unit supports color temperature
+        Send the same target controls to every unit in the network with one
+        controlNetwork message
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
 
-        {
-            'activeSceneId': 0,
-            'address': '26925689c64c',
-            'condition': 0,
-            'controls': [[{'type': 'Dimmer', 'value': 0.0},
-                        {'level': 0.49736842105263157,
-                            'max': 6000,
-                            'min': 2200,
-                            'type': 'CCT',
-                            'value': 4090.0}]],
-            'dimLevel': 0.0,
-            'firmwareVersion': '26.24',
-            'fixtureId': 14235,
-            'groupId': 0,
-            'id': 13,
-            'image': 'mbUdKbLz5g3VsVNJIgTYboHa8ce9YfSK',
-            'name': 'Arbetslampa',
-            'on': True,
-            'online': True,
-            'position': 9,
-            'priority': 3,
-            'status': 'ok',
-            'type': 'Luminaire'
+        message = {
+            "wire": self.wire_id,
+            "method": "controlNetwork",
+            "targetControls": target_controls,
         }
 
-        """
+        # Queued unit frames would be sent after this one and undo it, drop
+        # the ones it replaces and send the ones that set more first
+        if self.command_queue and self.command_queue.supersede(target_controls):
+            self.command_queue.flush()
 
-        data = self.get_unit_state(unit_id=unit_id)
+        self._ws_send(message)
 
-        if "controls" not in data:
-            return False
+    def turn_network_on(self):
+        """
+        Turn every unit in the network on with one message
+        """
+        self.set_network_target_controls(target_controls={"Dimmer": {"value": 1}})
 
-        for control in data["controls"]:
-            if isinstance(control, list):
-                for inner_control in control:
-                    if "type" in inner_control and inner_control["type"] == "CCT":
-                        return True
-            if "type" in control and control["type"] == "CCT":
-                return True
-        return False
+    def turn_network_off(self):
+        """
+        Turn every unit in the network off with one message
+        """
+        self.set_network_target_controls(target_controls={"Dimmer": {"value": 0}})
 
     def turn_scene_off(self, *, scene_id: int):
         """
         Response on ok:
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
-        # Unit_id needs to be an integer
-        if isinstance(scene_id, int):
-            pass
-        elif isinstance(scene_id, str):
-            scene_id = int(scene_id)
-        elif isinstance(scene_id, float):
-            scene_id = int(scene_id)
-        else:
-            raise CasambiApiException(
-                f"expected scene_id to be an integer, got: {scene_id}"
-            )
+        scene_id = to_int_id(scene_id, "scene_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
         value = 0
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlScene",
-            "id": scene_id,
-            "level": value,
-        }
+        frame = self._frame_encoder().scene(scene_id, value)
 
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlScene", scene_id), frame)
 
     def turn_scene_on(self, *, scene_id):
         """
         Response on ok:
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
-        # Unit_id needs to be an integer
-        if isinstance(scene_id, int):
-            pass
-        elif isinstance(scene_id, str):
-            scene_id = int(scene_id)
-        elif isinstance(scene_id, float):
-            scene_id = int(scene_id)
-        else:
-            raise CasambiApiException(
-                f"expected scene_id to be an integer, got: {scene_id}"
-            )
+        scene_id = to_int_id(scene_id, "scene_id")
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
         value = 1
 
-        message = {
-            "wire": self.wire_id,
-            "method": "controlScene",
-            "id": scene_id,
-            "level": value,
-        }
+        frame = self._frame_encoder().scene(scene_id, value)
 
-        self.web_sock.send(json.dumps(message))
+        self._ws_send_frame(("controlScene", scene_id), frame)
 
     def get_unit_list(self):
         """
@@ -790,16 +1571,12 @@ class Casambi:
         if not self.network_id:
             raise CasambiApiException("network_id is not set!")
 
-        url = "https://door.casambi.com/v1/networks/"
+        url = f"{self.api_url}/networks/"
         url += f"{self.network_id}/units"
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = f"get_network_unit_list: headers: {headers},"
@@ -822,19 +1599,15 @@ class Casambi:
         """
         Getter for Scenes list
         """
-        url = "https://door.casambi.com/v1/networks/"
+        url = f"{self.api_url}/networks/"
         url += f"{self.network_id}/scenes"
 
         if not self._session_id:
             raise CasambiApiException("No session id is set. Need to login!")
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = f"get_network_unit_list: headers: {headers},"
@@ -852,23 +1625,27 @@ class Casambi:
 
         return data
 
-    def get_fixture_information(self, *, unit_id: int):
+    def get_fixture_information(self, *, unit_id: int = None, fixture_id: int = None):
         """
         GET https://door.casambi.com/v1/fixtures/{id}
+
+        The id is the fixtureId of a unit, it can be given as fixture_id
+        (unit_id is kept for backwards compatibility)
         """
+        if fixture_id is None:
+            fixture_id = unit_id
 
-        url = f"https://door.casambi.com/v1/fixtures/{unit_id}"
+        if fixture_id is None:
+            raise CasambiApiException("expected fixture_id (or unit_id), got none")
+
+        url = f"{self.api_url}/fixtures/{fixture_id}"
 
         if not self._session_id:
             raise CasambiApiException("No session id is set. Need to login!")
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = f"get_fixture_information: headers: {headers},"
@@ -886,22 +1663,94 @@ class Casambi:
 
         return data
 
+    def get_fixtures_information(self, *, fixture_ids, max_workers=None) -> dict:
+        """
+        Fixture information for many fixtures, fetched concurrently once per
+        unique fixture id.
+
+        Returns a dict keyed on fixture id with the fixture information, or
+        the exception if it could not be fetched.
+        """
+        return self._fetch_concurrently(
+            self.get_fixture_information,
+            "fixture_id",
+            [int(fixture_id) for fixture_id in fixture_ids],
+            max_workers=max_workers,
+        )
+
+    def get_fixture_catalog(
+        self,
+        *,
+        catalog: FixtureCatalog,
+        fixture_ids=None,
+        max_workers=None,
+        fetch_units=False,
+    ) -> dict:
+        """
+        Fixture information for fixture_ids through catalog.
+
+        fixture_ids defaults to the fixtures of every unit in the unit index
+        or the state mirror, whichever is available. Without either the unit
+        list is only fetched from the REST api with fetch_units=True.
+
+        Only fixtures missing in the catalog are fetched, concurrently and
+        once per fixture id, and the catalog is saved afterwards. Returns a
+        dict keyed on fixture id.
+        """
+        if fixture_ids is None:
+            if self.unit_index:
+                fixture_ids = sorted(self.unit_index.fixture_ids())
+            else:
+                if self.state_mirror:
+                    units = self.state_mirror.get_units().values()
+                elif fetch_units:
+                    units = self.get_unit_list()
+                    units = units.values() if isinstance(units, dict) else units
+                else:
+                    reason = "get_fixture_catalog: no unit index or state mirror, "
+                    reason += "give fixture_ids or fetch_units=True"
+                    raise CasambiApiException(reason)
+
+                fixture_ids = [
+                    unit["fixtureId"] for unit in units if "fixtureId" in unit
+                ]
+
+        fixture_ids = [int(fixture_id) for fixture_id in fixture_ids]
+        missing = catalog.missing(fixture_ids)
+        failed = {}
+
+        if missing:
+            fetched = self.get_fixtures_information(
+                fixture_ids=missing, max_workers=max_workers
+            )
+
+            for fixture_id, data in fetched.items():
+                if isinstance(data, Exception):
+                    failed[fixture_id] = data
+                else:
+                    catalog.put(fixture_id, data)
+
+            catalog.save()
+
+        if failed:
+            reason = "get_fixture_catalog: failed to get fixtures: "
+            reason += f"{failed}"
+            raise CasambiApiException(reason)
+
+        return {fixture_id: catalog.get(fixture_id) for fixture_id in fixture_ids}
+
     def get_network_state(self):
         """
         Getter for network state
         """
-        url = f"https://door.casambi.com/v1/networks/{self.network_id}/state"
+        url = f"{self.api_url}/networks/{self.network_id}/state"
 
         if not self._session_id:
             raise CasambiApiException("No session id is set. Need to login!")
 
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
+        headers = {"X-Casambi-Session": self._session_id}
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = f"get_network_state: headers: {headers},"
@@ -926,15 +1775,6 @@ class Casambi:
         to: yyyyMMdd[hh[mm[ss]]]
         """
 
-        if not self._session_id:
-            raise CasambiApiException("No session id is set. Need to login!")
-
-        headers = {
-            "X-Casambi-Key": self.api_key,
-            "X-Casambi-Session": self._session_id,
-            "Content-type": "application/json",
-        }
-
         if sensor_type not in [0, 1]:
             raise CasambiApiException("invalid sentor_type")
 
@@ -946,8 +1786,218 @@ class Casambi:
         if not from_time:
             from_time = (now - datetime.timedelta(days=7)).strftime("%Y%m%d%H%M")
 
+        return self._fetch_network_datapoints(
+            from_time=from_time, to_time=to_time, sensor_type=sensor_type
+        )
+
+    def iter_network_datapoints(
+        self,
+        *,
+        from_time=None,
+        to_time=None,
+        sensor_types=(0,),
+        window=DEFAULT_WINDOW,
+        max_workers=DEFAULT_MAX_WORKERS,
+        time_key=datapoint_time,
+    ):
+        """
+        Generator for datapoints between from_time and to_time (as
+        yyyyMMdd[hh[mm[ss]]] or datetime, defaults to the last 7 days).
+
+        The range is split in windows that are fetched concurrently by
+        max_workers threads, records are yielded in time order (using
+        time_key) with every sensor type in sensor_types merged into one
+        stream. At most 2 * max_workers windows are held in memory.
+        """
+        for sensor_type in sensor_types:
+            if sensor_type not in [0, 1]:
+                raise CasambiApiException("invalid sentor_type")
+
+        now = datetime.datetime.now()
+
+        if not to_time:
+            to_time = now
+        if not from_time:
+            from_time = now - datetime.timedelta(days=7)
+
+        windows = collections.deque(
+            split_windows(from_time=from_time, to_time=to_time, window=window)
+        )
+
+        def fetch(window_from, window_to, sensor_type):
+            data = self._fetch_network_datapoints(
+                from_time=format_time(window_from),
+                to_time=format_time(window_to),
+                sensor_type=sensor_type,
+            )
+            return sorted(data or [], key=time_key)
+
+        import heapq
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="casambi-datapoints"
+        ) as executor:
+            in_flight = collections.deque()
+
+            while windows or in_flight:
+                while windows and len(in_flight) < 2 * max_workers:
+                    (window_from, window_to) = windows.popleft()
+                    in_flight.append(
+                        [
+                            executor.submit(fetch, window_from, window_to, sensor)
+                            for sensor in sensor_types
+                        ]
+                    )
+
+                futures = in_flight.popleft()
+                results = [future.result() for future in futures]
+
+                if len(results) == 1:
+                    yield from results[0]
+                else:
+                    yield from heapq.merge(*results, key=time_key)
+
+    def get_network_datapoint_columns(
+        self,
+        *,
+        from_time=None,
+        to_time=None,
+        sensor_types=(0,),
+        window=DEFAULT_WINDOW,
+        max_workers=DEFAULT_MAX_WORKERS,
+        time_key=DEFAULT_TIME_KEY,
+        unit_key=DEFAULT_UNIT_KEY,
+        value_key=DEFAULT_VALUE_KEY,
+    ) -> dict:
+        """
+        Datapoints as NumPy column arrays: time (int64 epoch ms), unit_id
+        (int32) and value (float32), see datapoint_columns.
+
+        The records are streamed from iter_network_datapoints into the
+        columns, so the decoded dicts are never all in memory at once.
+        Needs numpy: pip install casambi[numpy]
+        """
+        records = self.iter_network_datapoints(
+            from_time=from_time,
+            to_time=to_time,
+            sensor_types=sensor_types,
+            window=window,
+            max_workers=max_workers,
+            time_key=lambda record: to_epoch_ms(record[time_key]),
+        )
+
+        return datapoints_to_columns(
+            records, time_key=time_key, unit_key=unit_key, value_key=value_key
+        )
+
+    def get_stored_network_datapoints(
+        self,
+        *,
+        store,
+        from_time=None,
+        to_time=None,
+        sensor_type=0,
+        bucket=DEFAULT_BUCKET,
+        settle_time=DEFAULT_SETTLE_TIME,
+        max_workers=DEFAULT_MAX_WORKERS,
+        time_key=DEFAULT_TIME_KEY,
+    ) -> list:
+        """
+        Datapoints through a local DatapointStore.
+
+        The range is split in buckets aligned to bucket, buckets the store
+        has as complete are read from disk and only the missing buckets and
+        the still open tail are fetched (concurrently) from the cloud. A
+        bucket is complete when it ended more than settle_time ago.
+
+        Returns the records between from_time and to_time (both inclusive,
+        compared on the time_key of the records like to_epoch_ms does), in
+        bucket order. Naive times, of the range and of the records, are
+        local time.
+        """
+        if sensor_type not in [0, 1]:
+            raise CasambiApiException("invalid sentor_type")
+
+        now = datetime.datetime.now()
+
+        if not to_time:
+            to_time = now
+        if not from_time:
+            from_time = now - datetime.timedelta(days=7)
+
+        buckets = split_buckets(from_time=from_time, to_time=to_time, bucket=bucket)
+        complete = store.complete_buckets(
+            network_id=self.network_id, sensor_type=sensor_type
+        )
+        missing = [
+            (bucket_start, bucket_end)
+            for (bucket_start, bucket_end) in buckets
+            if bucket_start not in complete and bucket_start <= now
+        ]
+
+        _LOGGER.debug(
+            f"get_stored_network_datapoints: buckets: {len(buckets)} "
+            f"to fetch: {len(missing)}"
+        )
+
+        def fetch(bucket_start, bucket_end):
+            return self._fetch_network_datapoints(
+                from_time=format_time(bucket_start),
+                to_time=format_time(min(bucket_end, now)),
+                sensor_type=sensor_type,
+            )
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="casambi-datapoints"
+        ) as executor:
+            fetched = {
+                bucket_start: executor.submit(fetch, bucket_start, bucket_end)
+                for (bucket_start, bucket_end) in missing
+            }
+
+            for (bucket_start, bucket_end) in missing:
+                store.put_bucket(
+                    network_id=self.network_id,
+                    sensor_type=sensor_type,
+                    bucket_start=bucket_start,
+                    records=fetched[bucket_start].result() or [],
+                    complete=bucket_end + settle_time < now,
+                )
+
+        # Buckets are whole, only keep the records within the range
+        range_start = to_epoch_ms(parse_time(from_time))
+        range_end = to_epoch_ms(parse_time(to_time)) + 999
+        records = []
+
+        for (bucket_start, _) in buckets:
+            for record in store.get_bucket(
+                network_id=self.network_id,
+                sensor_type=sensor_type,
+                bucket_start=bucket_start,
+            ):
+                if time_key in record and not (
+                    range_start <= to_epoch_ms(record[time_key]) <= range_end
+                ):
+                    continue
+
+                records.append(record)
+
+        return records
+
+    def _fetch_network_datapoints(self, *, from_time: str, to_time: str, sensor_type):
+        """
+        GET the datapoints for one sensor type between from_time and to_time
+        """
+        if not self._session_id:
+            raise CasambiApiException("No session id is set. Need to login!")
+
+        headers = {"X-Casambi-Session": self._session_id}
+
         url = (
-            "https://door.casambi.com/v1/networks/"
+            f"{self.api_url}/networks/"
             + str(self.network_id)
             + "/datapoints?sensorType="
             + str(sensor_type)
@@ -957,7 +2007,7 @@ class Casambi:
             + to_time
         )
 
-        response = requests.get(url, headers=headers)
+        response = self._session_get(url)
 
         if response.status_code != 200:
             reason = f"get_network_datapoints: headers: {headers},"
@@ -969,13 +2019,141 @@ class Casambi:
 
         data = response.json()
 
-        dbg_msg = f"get_network_datapoints headers: {headers}"
-        dbg_msg += f" response: {data}"
+        # The response can be large, only format it when it is logged
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            dbg_msg = f"get_network_datapoints headers: {headers}"
+            dbg_msg += f" response: {data}"
 
-        _LOGGER.debug(dbg_msg)
+            _LOGGER.debug(dbg_msg)
 
         return data
 
+    def add_event_callback(self, callback, *, method=None, unit_id=None):
+        """
+        Register callback(message) for websocket messages, optionally
+        filtered on method (for example "unitChanged") and unit id.
+
+        Callbacks are called from the reader started with ws_start_reader.
+        """
+        self._event_callbacks.add(callback, method=method, unit_id=unit_id)
+
+    def remove_event_callback(self, callback):
+        """
+        Unregister a callback added with add_event_callback
+        """
+        self._event_callbacks.remove(callback)
+
+    def ws_start_reader(self, *, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Start a background reader that dispatches websocket messages to the
+        registered event callbacks as they arrive.
+
+        Messages are passed through a queue of queue_size messages, when
+        callbacks can not keep up the oldest messages are dropped and
+        counted in ws_reader.dropped.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        if self.ws_multiplexer:
+            raise CasambiApiException("Wire is read by its websocket multiplexer!")
+
+        if self.ws_reader and self.ws_reader.running:
+            raise CasambiApiException("Websocket reader is already running!")
+
+        self.ws_reader = WebSocketReader(
+            web_sock=self.web_sock,
+            dispatch=self._event_callbacks.dispatch,
+            queue_size=queue_size,
+            on_disconnect=self._on_ws_disconnect,
+            metrics=self.metrics,
+        )
+        self.ws_reader.start()
+
+    def _on_ws_disconnect(self, reason):
+        if self.ws_supervisor:
+            self.ws_supervisor.notify_disconnect(reason)
+
+    def ws_start_supervisor(
+        self,
+        *,
+        ping_interval=DEFAULT_PING_INTERVAL,
+        stall_timeout=DEFAULT_STALL_TIMEOUT,
+        backoff_base=DEFAULT_BACKOFF_BASE,
+        backoff_max=DEFAULT_BACKOFF_MAX,
+        max_queued=DEFAULT_MAX_QUEUED,
+        replay_queued=True,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        """
+        Supervise the websocket: ping it when idle, detect stalls and
+        reconnect with jittered exponential backoff when it drops. The user
+        and network sessions are only created again if the wire reports
+        the session as invalid.
+
+        Commands sent while reconnecting are queued and replayed after the
+        reconnect (or dropped if replay_queued is False). Reconnect counts
+        and downtime are available from ws_supervisor.metrics().
+
+        Starts the websocket reader if it is not running.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        if self.ws_multiplexer:
+            reason = "ws_start_supervisor: can not supervise a multiplexed wire, "
+            reason += "the connection is shared"
+            raise CasambiApiException(reason)
+
+        if self.ws_supervisor:
+            raise CasambiApiException("Websocket supervisor is already running!")
+
+        if not self.ws_reader or not self.ws_reader.running:
+            self.ws_start_reader(queue_size=queue_size)
+
+        self.ws_supervisor = WebSocketSupervisor(
+            casambi=self,
+            ping_interval=ping_interval,
+            stall_timeout=stall_timeout,
+            backoff_base=backoff_base,
+            backoff_max=backoff_max,
+            max_queued=max_queued,
+            replay_queued=replay_queued,
+        )
+        self.ws_supervisor.start()
+
+    def ws_stop_supervisor(self):
+        """
+        Stop supervising the websocket, if started
+        """
+        if self.ws_supervisor:
+            self.ws_supervisor.stop()
+            self.ws_supervisor = None
+
+    def ws_stop_reader(self):
+        """
+        Stop the background reader, if running
+        """
+        if self.ws_reader:
+            self.ws_reader.stop()
+            self.ws_reader = None
+
+    def _events_running(self) -> bool:
+        """
+        True when messages reach the event callbacks, from the reader or
+        from a multiplexer
+        """
+        if self.ws_multiplexer:
+            return True
+
+        return self.ws_reader is not None and self.ws_reader.running
+
+    def _check_no_reader(self):
+        if self._events_running():
+            reason = "Websocket reader is running, "
+            reason += "use add_event_callback to get messages"
+            raise CasambiApiException(reason)
+
     def ws_recieve_message(self):
         """
         Response on success?
@@ -984,9 +2162,22 @@ class Casambi:
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
+        self._check_no_reader()
+
         result = self.web_sock.recv()
 
-        data = json.loads(result)
+        data = self._decode_message(result)
+
+        return data
+
+    def _decode_message(self, frame):
+        start = time.perf_counter()
+        data = json.loads(frame)
+
+        if self.metrics:
+            observe_ws_event(
+                self.metrics, data, len(frame), time.perf_counter() - start
+            )
 
         return data
 
@@ -995,17 +2186,23 @@ class Casambi:
         Response on success?
         {'wire': 1, 'method': 'peerChanged', 'online': True}
         """
+        import socket
+
+        import websocket
+
         messages = []
 
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
+        self._check_no_reader()
+
         self.web_sock.settimeout(0.1)
 
         while True:
             try:
                 casambi_msg = self.web_sock.recv()
-                data = json.loads(casambi_msg)
+                data = self._decode_message(casambi_msg)
 
                 messages.append(data)
             except websocket.WebSocketConnectionClosedException:
@@ -1025,6 +2222,9 @@ class Casambi:
         if not self.web_sock:
             raise CasambiApiException("No websocket connection!")
 
+        # Closing on purpose, do not reconnect
+        self.ws_stop_supervisor()
+
         message = {"method": "close", "wire": self.wire_id}
 
         self.web_sock.send(json.dumps(message))
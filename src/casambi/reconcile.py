@@ -0,0 +1,297 @@
+#!/usr/bin/python3
+"""
+Plan the minimal set of frames that brings units from their current state
+to a desired state, see Casambi.apply_state.
+"""
+import logging
+
+from dataclasses import dataclass, field
+
+from .color import color_temperature, rgb_to_hue_sat
+from .frames import quantize_level, target_controls
+from .unit_state import CAP_CCT, CAP_DIMMER, CAP_RGB, CAP_VERTICAL, UnitState
+
+_LOGGER = logging.getLogger(__name__)
+
+# Hue and saturation are compared with the precision set_unit_rgb_color
+# sends them with
+HUE_SAT_DIGITS = 1
+
+# Desired control name -> capability bit needed
+CONTROL_CAPABILITIES = {
+    "Dimmer": CAP_DIMMER,
+    "Vertical": CAP_VERTICAL,
+    "CCT": CAP_CCT,
+    "RGB": CAP_RGB,
+}
+
+# A shortcut is only used when it replaces at least this many frames
+MIN_SHORTCUT_UNITS = 2
+
+
+@dataclass()
+class ReconcileReport:
+    """
+    What apply_state sent and skipped.
+
+    sent is a list of (method, id, target controls) per frame, id is None
+    for controlNetwork and the target controls of a controlScene are
+    {"level": level}. skipped maps unit id to the reason nothing (or not
+    everything) was sent for it, errors maps unit id (or (method, id) for a
+    controlNetwork or controlScene) to the exception of a frame that could
+    not be sent.
+    """
+
+    sent: list = field(default_factory=list)
+    skipped: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    dry_run: bool = False
+
+    @property
+    def frames(self) -> int:
+        return len(self.sent)
+
+    @property
+    def converged(self) -> bool:
+        return not self.errors
+
+
+def _level_value(value):
+    """
+    A Dimmer or Vertical value as sent, only clamped to 0-1
+    """
+    return min(max(value, 0), 1)
+
+
+def _target(control: str, value, state: UnitState):
+    """
+    The value to send for a desired value, and the desired and current
+    value quantized for the comparison (current is None if the unit does
+    not report it). Only the comparison is quantized, the frame gets the
+    value that was asked for.
+    """
+    if control in ("Dimmer", "Vertical"):
+        current = state.dimmer if control == "Dimmer" else state.vertical
+
+        return (
+            _level_value(value),
+            quantize_level(value),
+            None if current is None else quantize_level(current),
+        )
+
+    if control == "CCT":
+        target = color_temperature(
+            value, cct_min=state.cct_min, cct_max=state.cct_max
+        )
+        current = None if state.cct is None else round(state.cct)
+
+        return (target, target, current)
+
+    if len(value) == 3:
+        target = rgb_to_hue_sat([value], ndigits=HUE_SAT_DIGITS, use_numpy=False)[0]
+    else:
+        target = tuple(value)
+
+    current = None
+    if state.hue is not None and state.sat is not None:
+        current = tuple(
+            round(part, HUE_SAT_DIGITS) for part in (state.hue, state.sat)
+        )
+
+    return (
+        target,
+        tuple(round(part, HUE_SAT_DIGITS) for part in target),
+        current,
+    )
+
+
+def unit_changes(desired: dict, current: dict, report: ReconcileReport) -> dict:
+    """
+    {unit id: {control: target}} of the controls that differ from the
+    current state, everything else is recorded in report.skipped
+    """
+    changes = {}
+
+    for unit_id, controls in desired.items():
+        unit_id = int(unit_id)
+        state = current.get(unit_id)
+
+        if state is None:
+            report.skipped[unit_id] = "unknown unit"
+            continue
+
+        needed = {}
+        reasons = []
+
+        for control, value in controls.items():
+            bits = CONTROL_CAPABILITIES.get(control)
+
+            if bits is None:
+                raise ValueError(
+                    f"Unknown control: {control}, "
+                    f"expected one of {', '.join(CONTROL_CAPABILITIES)}"
+                )
+
+            if not state.supports(bits):
+                reasons.append(f"{control} not supported")
+                continue
+
+            (target, desired_value, current_value) = _target(control, value, state)
+
+            if desired_value == current_value:
+                reasons.append(f"{control} unchanged")
+                continue
+
+            needed[control] = target
+
+        if needed:
+            changes[unit_id] = needed
+
+        if reasons:
+            report.skipped[unit_id] = ", ".join(reasons)
+
+    return changes
+
+
+def desires_off(desired: dict) -> bool:
+    """
+    True if any unit is desired at Dimmer level 0, only then scene shortcuts
+    are possible
+    """
+    return any(
+        "Dimmer" in controls and quantize_level(controls["Dimmer"]) == 0
+        for controls in desired.values()
+    )
+
+
+def _dimmable(unit_ids, current: dict) -> bool:
+    return all(
+        unit_id in current and current[unit_id].supports(CAP_DIMMER)
+        for unit_id in unit_ids
+    )
+
+
+def network_shortcut(desired: dict, changes: dict, current: dict):
+    """
+    The Dimmer value to send with one controlNetwork, when every unit of
+    the network has a Dimmer, is desired at the same level and more than
+    one needs it
+    """
+    if set(int(unit_id) for unit_id in desired) != set(current):
+        return None
+
+    if not _dimmable(current, current):
+        return None
+
+    levels = set()
+    value = None
+
+    for controls in desired.values():
+        if "Dimmer" not in controls:
+            return None
+
+        value = controls["Dimmer"]
+        levels.add(quantize_level(value))
+
+    if len(levels) != 1:
+        return None
+
+    needed = sum(1 for unit in changes.values() if "Dimmer" in unit)
+
+    if needed < MIN_SHORTCUT_UNITS:
+        return None
+
+    return _level_value(value)
+
+
+def scene_shortcuts(desired: dict, changes: dict, scenes: dict, current: dict) -> list:
+    """
+    Scenes to turn off with one controlScene each, for scenes whose units
+    all have a Dimmer, are all desired off and where more than one unit
+    still needs it.
+
+    Only level 0 is used, a scene turned on restores the levels stored in
+    the scene which are not known here.
+    """
+    desired_off = {
+        int(unit_id)
+        for unit_id, controls in desired.items()
+        if "Dimmer" in controls and quantize_level(controls["Dimmer"]) == 0
+    }
+
+    shortcuts = []
+    covered = set()
+
+    # Largest scenes first, they replace the most frames
+    for scene_id, scene in sorted(
+        scenes.items(), key=lambda item: -len(item[1].get("units", ()))
+    ):
+        unit_ids = {int(unit_id) for unit_id in scene.get("units", ())}
+
+        if not unit_ids or not unit_ids <= desired_off:
+            continue
+
+        if not _dimmable(unit_ids, current):
+            continue
+
+        needed = [
+            unit_id
+            for unit_id in unit_ids - covered
+            if "Dimmer" in changes.get(unit_id, {})
+        ]
+
+        if len(needed) < MIN_SHORTCUT_UNITS:
+            continue
+
+        shortcuts.append((int(scene_id), unit_ids))
+        covered |= unit_ids
+
+    return shortcuts
+
+
+def plan(desired: dict, current: dict, *, scenes=None, shortcuts=True):
+    """
+    Frames as (method, id, target controls) that bring the units in
+    desired ({unit id: {control: value}}) from current ({unit id:
+    UnitState}) to the desired state, and the report with what is skipped.
+
+    With shortcuts a controlNetwork or controlScene replaces the Dimmer
+    frames of many units where it reaches the same state.
+    """
+    report = ReconcileReport()
+    changes = unit_changes(desired, current, report)
+    frames = []
+
+    if shortcuts:
+        value = network_shortcut(desired, changes, current)
+
+        if value is not None:
+            frames.append(("controlNetwork", None, target_controls("Dimmer", value)))
+            covered = set(current)
+        else:
+            covered = set()
+
+            for (scene_id, unit_ids) in scene_shortcuts(
+                desired, changes, scenes or {}, current
+            ):
+                frames.append(("controlScene", scene_id, {"level": 0}))
+                covered |= unit_ids
+
+        for unit_id in covered:
+            needed = changes.get(unit_id)
+
+            if needed and "Dimmer" in needed:
+                del needed["Dimmer"]
+
+                if not needed:
+                    del changes[unit_id]
+
+    for unit_id, needed in changes.items():
+        unit_controls = {}
+
+        for control, target in needed.items():
+            unit_controls.update(target_controls(control, target))
+
+        frames.append(("controlUnit", unit_id, unit_controls))
+
+    return (frames, report)
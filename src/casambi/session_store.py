@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""
+Credential store that persists session ids and their expiry to disk, so a
+new process can reuse a valid session instead of logging in again.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def select_network_id(current, network_ids):
+    """
+    The network to use after a login returned network_ids, the current
+    network is kept when logging in again, otherwise the first one is used.
+    Shared by Casambi and AsyncCasambi so both pick the same network.
+    """
+    network_ids = list(network_ids)
+
+    if not network_ids:
+        raise ValueError("The login did not return any network")
+
+    if current in network_ids:
+        return current
+
+    return network_ids[0]
+
+
+class SessionStore:
+    """
+    Sessions saved as json in path, keyed on a name like
+    "public:<email>". The file is only readable by the owner since it
+    contains session ids.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as fdesc:
+                return json.load(fdesc)
+        except ValueError:
+            _LOGGER.debug(f"SessionStore: ignoring corrupt file: {self.path}")
+            return {}
+
+    def _write(self, sessions: dict):
+        tmp_path = f"{self.path}.tmp"
+
+        fdesc = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fdesc, "w", encoding="utf-8") as tmp_file:
+            json.dump(sessions, tmp_file)
+
+        os.replace(tmp_path, self.path)
+
+    def load(self, key: str):
+        """
+        Return the session data saved for key, None if there is none or it
+        has expired
+        """
+        with self._lock:
+            entry = self._read().get(key)
+
+        if not entry:
+            return None
+
+        if entry["expires"] <= time.time():
+            _LOGGER.debug(f"SessionStore: session for {key} has expired")
+            return None
+
+        return entry
+
+    def save(self, key: str, data: dict, *, expires: float):
+        """
+        Save session data for key, expires is a unix timestamp
+        """
+        with self._lock:
+            sessions = self._read()
+            sessions[key] = {**data, "expires": expires}
+            self._write(sessions)
+
+    def delete(self, key: str):
+        with self._lock:
+            sessions = self._read()
+
+            if sessions.pop(key, None) is not None:
+                self._write(sessions)
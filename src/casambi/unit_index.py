@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+"""
+Index of the units, scenes and groups of a network for lookups by name,
+group, fixture, address and capability without walking every unit.
+"""
+import logging
+import threading
+
+from .network_state import by_id
+from .unit_state import CAPABILITY_BITS, UnitState
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPABILITIES = tuple(CAPABILITY_BITS)
+
+# Unit attributes that are indexed, the attribute -> index name
+_INDEXED_KEYS = {
+    "name": "name",
+    "groupId": "group",
+    "fixtureId": "fixture",
+    "address": "address",
+}
+
+
+def _normalize_name(name) -> str:
+    return str(name).strip().casefold()
+
+
+def _merge_event(unit: dict, data: dict) -> dict:
+    unit = {**unit, **data}
+    unit.pop("method", None)
+    unit.pop("wire", None)
+
+    return unit
+
+
+class UnitIndex:
+    """
+    Units keyed on name, groupId, fixtureId, address and capability, built
+    from get_unit_list, get_scenes_list and the unit states (for example
+    from get_network_state) and updated per unit from unitChanged events.
+
+    Names are matched case insensitive, every lookup returns a set of ids
+    since names do not need to be unique.
+    """
+
+    def __init__(self):
+        self.units = {}
+        self.scenes = {}
+        self.groups = {}
+
+        self._units_by = {index: {} for index in _INDEXED_KEYS.values()}
+        self._units_by_capability = {name: set() for name in CAPABILITIES}
+        # Unit id -> the keys the unit is indexed on, to remove it again
+        self._unit_keys = {}
+
+        self._scenes_by_name = {}
+        self._groups_by_name = {}
+
+        # Events received since begin_build, None when not building
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def begin_build(self):
+        """
+        Keep the events received from now on, build applies them again on
+        top of the build data since that may have been read before them
+        """
+        with self._lock:
+            self._pending = []
+
+    def abort_build(self):
+        with self._lock:
+            self._pending = None
+
+    def build(self, *, unit_list=None, scenes_list=None, unit_states=None, groups=None):
+        """
+        Replace the index content. unit_states maps unit id to the unit
+        state, or is the units of get_network_state, groups are the groups
+        of get_network_state if the network has any. Events received since
+        begin_build are applied again on top.
+        """
+        units = {}
+
+        for unit_id, unit in by_id(unit_states).items():
+            units[unit_id] = unit
+
+        # The unit list only has the static attributes, the state takes
+        # precedence
+        for unit_id, unit in by_id(unit_list).items():
+            units[unit_id] = {**unit, **units.get(unit_id, {})}
+
+        scenes = by_id(scenes_list)
+        groups = by_id(groups)
+
+        with self._lock:
+            for message in self._pending or ():
+                unit_id = int(message["id"])
+                units[unit_id] = _merge_event(units.get(unit_id, {}), message)
+
+            self._pending = None
+
+            self.units = {}
+            self._units_by = {index: {} for index in _INDEXED_KEYS.values()}
+            self._units_by_capability = {name: set() for name in CAPABILITIES}
+            self._unit_keys = {}
+
+            for unit_id, unit in units.items():
+                self._add_unit(unit_id, unit)
+
+            self.scenes = scenes
+            self._scenes_by_name = {}
+            for scene_id, scene in scenes.items():
+                self._scenes_by_name.setdefault(
+                    _normalize_name(scene.get("name", "")), set()
+                ).add(scene_id)
+
+            self.groups = groups
+            self._groups_by_name = {}
+            for group_id, group in groups.items():
+                self._groups_by_name.setdefault(
+                    _normalize_name(group.get("name", "")), set()
+                ).add(group_id)
+
+        _LOGGER.debug(
+            f"build: units: {len(units)} scenes: {len(scenes)} groups: {len(groups)}"
+        )
+
+    def _add_unit(self, unit_id: int, unit: dict):
+        keys = []
+
+        for key, index in _INDEXED_KEYS.items():
+            if unit.get(key) is None:
+                continue
+
+            value = unit[key]
+            if index == "name":
+                value = _normalize_name(value)
+
+            self._units_by[index].setdefault(value, set()).add(unit_id)
+            keys.append((index, value))
+
+        if "controls" in unit:
+            state = UnitState.from_dict(unit, unit_id=unit_id)
+
+            for name, bits in CAPABILITY_BITS.items():
+                if state.supports(bits):
+                    self._units_by_capability[name].add(unit_id)
+                    keys.append((None, name))
+
+        self.units[unit_id] = unit
+        self._unit_keys[unit_id] = keys
+
+    def _remove_unit(self, unit_id: int):
+        for (index, value) in self._unit_keys.pop(unit_id, ()):
+            if index is None:
+                self._units_by_capability[value].discard(unit_id)
+                continue
+
+            unit_ids = self._units_by[index].get(value)
+            if unit_ids is None:
+                continue
+
+            unit_ids.discard(unit_id)
+            if not unit_ids:
+                del self._units_by[index][value]
+
+        self.units.pop(unit_id, None)
+
+    def update_unit(self, *, unit_id: int, data: dict):
+        """
+        Merge data into the unit and index it again, only the entries of
+        this unit are touched
+        """
+        unit_id = int(unit_id)
+
+        with self._lock:
+            self._update_unit(unit_id, data)
+
+    def _update_unit(self, unit_id: int, data: dict):
+        unit = _merge_event(self.units.get(unit_id, {}), data)
+
+        self._remove_unit(unit_id)
+        self._add_unit(unit_id, unit)
+
+    def remove_unit(self, *, unit_id: int):
+        with self._lock:
+            self._remove_unit(int(unit_id))
+
+    def apply_event(self, message: dict) -> bool:
+        """
+        Update the index from a websocket message, returns True if a unit
+        was updated
+        """
+        if message.get("method") != "unitChanged" or "id" not in message:
+            return False
+
+        with self._lock:
+            self._update_unit(int(message["id"]), message)
+
+            if self._pending is not None:
+                self._pending.append(message)
+
+        return True
+
+    def get_units(self) -> dict:
+        with self._lock:
+            return {unit_id: dict(unit) for unit_id, unit in self.units.items()}
+
+    def units_by_name(self, name) -> set:
+        return set(self._units_by["name"].get(_normalize_name(name), ()))
+
+    def units_by_group(self, group_id) -> set:
+        return set(self._units_by["group"].get(group_id, ()))
+
+    def units_by_fixture(self, fixture_id) -> set:
+        return set(self._units_by["fixture"].get(fixture_id, ()))
+
+    def fixture_ids(self) -> set:
+        """
+        The fixture ids of the units in the index
+        """
+        with self._lock:
+            return set(self._units_by["fixture"])
+
+    def unit_by_address(self, address):
+        """
+        Unit id with address, None if there is no such unit
+        """
+        unit_ids = self._units_by["address"].get(address)
+
+        return next(iter(unit_ids)) if unit_ids else None
+
+    def units_with_capability(self, capability: str) -> set:
+        if capability not in CAPABILITIES:
+            raise ValueError(
+                f"Unknown capability: {capability}, "
+                f"expected one of {', '.join(CAPABILITIES)}"
+            )
+
+        return set(self._units_by_capability[capability])
+
+    def scenes_by_name(self, name) -> set:
+        return set(self._scenes_by_name.get(_normalize_name(name), ()))
+
+    def groups_by_name(self, name) -> set:
+        return set(self._groups_by_name.get(_normalize_name(name), ()))
+
+    def select(
+        self,
+        *,
+        name=None,
+        group_id=None,
+        group_name=None,
+        fixture_id=None,
+        address=None,
+        capability=None,
+        scene_id=None,
+    ) -> set:
+        """
+        Unit ids matching every given selector, for example every CCT unit
+        in group "Office 2" with select(group_name="Office 2",
+        capability="CCT"). Without selectors every unit is returned.
+        """
+        with self._lock:
+            candidates = []
+
+            if name is not None:
+                candidates.append(self._units_by["name"].get(_normalize_name(name)))
+
+            if group_id is not None:
+                candidates.append(self._units_by["group"].get(group_id))
+
+            if group_name is not None:
+                group_ids = self._groups_by_name.get(_normalize_name(group_name), ())
+                candidates.append(
+                    set().union(
+                        *(self._units_by["group"].get(gid, ()) for gid in group_ids)
+                    )
+                )
+
+            if fixture_id is not None:
+                candidates.append(self._units_by["fixture"].get(fixture_id))
+
+            if address is not None:
+                candidates.append(self._units_by["address"].get(address))
+
+            if capability is not None:
+                if capability not in CAPABILITIES:
+                    raise ValueError(f"Unknown capability: {capability}")
+
+                candidates.append(self._units_by_capability[capability])
+
+            if scene_id is not None:
+                scene = self.scenes.get(int(scene_id), {})
+                candidates.append(
+                    {int(unit_id) for unit_id in scene.get("units", ())}
+                    & self.units.keys()
+                )
+
+            if not candidates:
+                return set(self.units)
+
+            if any(not unit_ids for unit_ids in candidates):
+                return set()
+
+            # Intersect starting from the smallest set
+            candidates.sort(key=len)
+
+            return set(candidates[0]).intersection(*candidates[1:])
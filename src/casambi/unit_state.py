@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+"""
+Compact typed unit state, the controls of a unit state are parsed once into
+typed fields and a capability bitmask.
+"""
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Capability bits
+CAP_DIMMER = 1
+CAP_VERTICAL = 2
+CAP_RGB = 4
+CAP_WHITE = 8
+CAP_CCT = 16
+
+# An RGBW unit has both a Color and a White control
+CAP_RGBW = CAP_RGB | CAP_WHITE
+
+# Capability names as used in selectors -> bits that all need to be set
+CAPABILITY_BITS = {
+    "Dimmer": CAP_DIMMER,
+    "CCT": CAP_CCT,
+    "RGB": CAP_RGB,
+    "RGBW": CAP_RGBW,
+    "Vertical": CAP_VERTICAL,
+}
+
+
+class UnitState:
+    """
+    State of a unit. Values of controls the unit does not have are None,
+    capabilities is a bitmask of the CAP_* bits.
+    """
+
+    __slots__ = (
+        "unit_id",
+        "name",
+        "on",
+        "online",
+        "dimmer",
+        "vertical",
+        "hue",
+        "sat",
+        "white",
+        "cct",
+        "cct_min",
+        "cct_max",
+        "capabilities",
+    )
+
+    def __init__(
+        self,
+        *,
+        unit_id: int,
+        name=None,
+        on=None,
+        online=None,
+        dimmer=None,
+        vertical=None,
+        hue=None,
+        sat=None,
+        white=None,
+        cct=None,
+        cct_min=0,
+        cct_max=0,
+        capabilities=0,
+    ):
+        self.unit_id = unit_id
+        self.name = name
+        self.on = on
+        self.online = online
+        self.dimmer = dimmer
+        self.vertical = vertical
+        self.hue = hue
+        self.sat = sat
+        self.white = white
+        self.cct = cct
+        self.cct_min = cct_min
+        self.cct_max = cct_max
+        self.capabilities = capabilities
+
+    @classmethod
+    def from_dict(cls, data: dict, *, unit_id=None):
+        """
+        Parse a unit state from the REST api or a unitChanged event, the
+        controls list is walked once whether it is flat or a list of lists
+        """
+        if unit_id is None:
+            unit_id = data.get("id")
+
+        state = cls(
+            unit_id=int(unit_id) if unit_id is not None else None,
+            name=data.get("name"),
+            on=data.get("on"),
+            online=data.get("online"),
+        )
+        state._parse_controls(data.get("controls", ()))
+
+        return state
+
+    def updated(self, data: dict):
+        """
+        A new UnitState with the keys in data (for example a unitChanged
+        event) applied, the same as from_dict of the merged unit state.
+        Only the controls in data are parsed, the state itself is not
+        changed so it can be shared between threads.
+        """
+        state = UnitState.__new__(UnitState)
+
+        for name in self.__slots__:
+            setattr(state, name, getattr(self, name))
+
+        for name in ("name", "on", "online"):
+            if name in data:
+                setattr(state, name, data[name])
+
+        if "controls" in data:
+            for name in ("dimmer", "vertical", "hue", "sat", "white", "cct"):
+                setattr(state, name, None)
+
+            state.cct_min = 0
+            state.cct_max = 0
+            state._parse_controls(data["controls"])
+
+        return state
+
+    def _parse_controls(self, control_list):
+        capabilities = 0
+
+        for control in control_list:
+            controls = control if isinstance(control, list) else (control,)
+
+            for inner_control in controls:
+                control_type = inner_control.get("type")
+
+                if control_type == "Dimmer":
+                    capabilities |= CAP_DIMMER
+                    self.dimmer = inner_control.get("value")
+                elif control_type == "Vertical":
+                    capabilities |= CAP_VERTICAL
+                    self.vertical = inner_control.get("value")
+                elif control_type == "Color":
+                    capabilities |= CAP_RGB
+                    self.hue = inner_control.get("hue")
+                    self.sat = inner_control.get("sat")
+                elif control_type == "White":
+                    capabilities |= CAP_WHITE
+                    self.white = inner_control.get("value")
+                elif control_type == "CCT":
+                    capabilities |= CAP_CCT
+                    self.cct = inner_control.get("value")
+                    self.cct_min = inner_control["min"]
+                    self.cct_max = inner_control["max"]
+
+        self.capabilities = capabilities
+
+    def supports(self, bits: int) -> bool:
+        """
+        True if the unit has every capability in bits
+        """
+        return self.capabilities & bits == bits
+
+    @property
+    def supports_dimmer(self) -> bool:
+        return self.supports(CAP_DIMMER)
+
+    @property
+    def supports_vertical(self) -> bool:
+        return self.supports(CAP_VERTICAL)
+
+    @property
+    def supports_rgb(self) -> bool:
+        return self.supports(CAP_RGB)
+
+    @property
+    def supports_rgbw(self) -> bool:
+        return self.supports(CAP_RGBW)
+
+    @property
+    def supports_color_temperature(self) -> bool:
+        return self.supports(CAP_CCT)
+
+    def __eq__(self, other):
+        if not isinstance(other, UnitState):
+            return NotImplemented
+
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__
+            if getattr(self, name) is not None
+        )
+
+        return f"UnitState({fields})"
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+"""
+Several wires over one websocket connection, incoming frames are
+demultiplexed on their wire id to a handler per wire.
+"""
+import json
+import logging
+import threading
+
+from .exceptions import CasambiApiException
+from .http_session import DEFAULT_WS_URL
+from .ws_reader import DEFAULT_QUEUE_SIZE, WebSocketReader
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for the reply to an open message
+DEFAULT_OPEN_TIMEOUT = 10.0
+
+
+class MultiplexedWire:
+    """
+    Stands in for the websocket of a Casambi client whose wire is carried
+    by a WebSocketMultiplexer, closing it only closes the wire
+    """
+
+    def __init__(self, *, multiplexer, wire_id):
+        self.multiplexer = multiplexer
+        self.wire_id = wire_id
+
+    def send(self, data):
+        self.multiplexer.send(data)
+
+    def close(self):
+        self.multiplexer.remove_wire(self.wire_id)
+
+
+class WebSocketMultiplexer:
+    """
+    One websocket connection carrying the wires of several clients.
+
+    A single reader decodes the frames and calls the handler registered for
+    the wire of each frame, frames for unknown wires are counted in
+    unrouted. Wire ids need to be unique per connection.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key,
+        ws_url=DEFAULT_WS_URL,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        open_timeout=DEFAULT_OPEN_TIMEOUT,
+        metrics=None,
+    ):
+        self.api_key = api_key
+        self.ws_url = ws_url
+        self.queue_size = queue_size
+        self.open_timeout = open_timeout
+        self.metrics = metrics
+
+        self.web_sock = None
+        self.ws_reader = None
+
+        self.unrouted = 0
+
+        self._handlers = {}
+        # Wire id -> [event, reply, handler] of opens waiting for their reply
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.ws_reader is not None and self.ws_reader.running
+
+    @property
+    def wires(self) -> list:
+        return list(self._handlers)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        """
+        Open the websocket connection and start reading from it
+        """
+        import websocket
+
+        if self.web_sock:
+            raise CasambiApiException("Multiplexer is already connected!")
+
+        self.web_sock = websocket.create_connection(
+            self.ws_url, subprotocols=[self.api_key]
+        )
+
+        self.ws_reader = WebSocketReader(
+            web_sock=self.web_sock,
+            dispatch=self._dispatch,
+            queue_size=self.queue_size,
+            metrics=self.metrics,
+        )
+        self.ws_reader.start()
+
+    def close(self):
+        """
+        Stop reading and close the connection, every wire on it is gone
+        """
+        if self.ws_reader:
+            self.ws_reader.stop()
+            self.ws_reader = None
+
+        if self.web_sock:
+            self.web_sock.close()
+            self.web_sock = None
+
+        with self._lock:
+            self._handlers = {}
+
+    def send(self, data):
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        self.web_sock.send(data)
+
+    def open_wire(self, *, wire_id, network_id, session_id, handler, reference=None):
+        """
+        Open a wire to network_id and route its frames to handler(message).
+
+        Returns the first message received on the wire (normally the one
+        with the wireStatus), the handler gets the messages after it. The
+        handler stays registered until remove_wire, also when the open
+        failed.
+        """
+        if not self.web_sock:
+            raise CasambiApiException("No websocket connection!")
+
+        if reference is None:
+            import uuid
+
+            reference = "{}".format(uuid.uuid1())
+
+        waiter = [threading.Event(), None, handler]
+
+        with self._lock:
+            if wire_id in self._handlers or wire_id in self._pending:
+                raise CasambiApiException(f"Wire {wire_id} is already open!")
+
+            self._pending[wire_id] = waiter
+
+        message = {
+            "method": "open",
+            "id": network_id,
+            "session": session_id,
+            "ref": reference,
+            "wire": wire_id,
+            "type": 1,  # Client type, use value 1 (FRONTEND)
+        }
+
+        try:
+            self.send(json.dumps(message))
+
+            if not waiter[0].wait(self.open_timeout):
+                raise CasambiApiException(
+                    f"open_wire: no reply for wire {wire_id} within "
+                    f"{self.open_timeout} s"
+                )
+        finally:
+            with self._lock:
+                self._pending.pop(wire_id, None)
+
+        _LOGGER.debug(f"open_wire: wire {wire_id} response: {waiter[1]}")
+
+        return waiter[1]
+
+    def wire(self, wire_id) -> MultiplexedWire:
+        return MultiplexedWire(multiplexer=self, wire_id=wire_id)
+
+    def remove_wire(self, wire_id):
+        """
+        Stop routing frames of wire_id, the wire is closed with a close
+        message (see Casambi.ws_close)
+        """
+        with self._lock:
+            self._handlers.pop(wire_id, None)
+
+    def _dispatch(self, message: dict):
+        wire_id = message.get("wire")
+
+        waiter = self._pending.get(wire_id)
+
+        if waiter is not None and waiter[1] is None:
+            # Registered here so no message after the reply is missed
+            with self._lock:
+                self._handlers[wire_id] = waiter[2]
+
+            waiter[1] = message
+            waiter[0].set()
+            return
+
+        handler = self._handlers.get(wire_id)
+
+        if handler is None:
+            self.unrouted += 1
+            _LOGGER.debug(f"_dispatch: no handler for wire {wire_id}: {message}")
+            return
+
+        handler(message)
@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+"""
+Background reader for the Casambi websocket, decodes frames as they arrive
+and dispatches them to registered callbacks.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from .metrics import observe_ws_event
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1000
+
+# How often the reader wakes up from recv to check if it should stop
+READ_TIMEOUT = 1.0
+
+
+class EventCallbacks:
+    """
+    Registry of event callbacks, filtered by method and unit id
+    """
+
+    def __init__(self):
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+        self.errors = 0
+
+    def add(self, callback, *, method=None, unit_id=None):
+        """
+        Register callback(message), None for method or unit_id matches
+        everything
+        """
+        if unit_id is not None:
+            unit_id = int(unit_id)
+
+        with self._lock:
+            self._callbacks = self._callbacks + [(callback, method, unit_id)]
+
+    def remove(self, callback):
+        """
+        Unregister every registration of callback
+        """
+        with self._lock:
+            self._callbacks = [
+                entry for entry in self._callbacks if entry[0] is not callback
+            ]
+
+    def dispatch(self, message: dict):
+        """
+        Call every callback matching the message
+        """
+        method = message.get("method")
+        unit_id = message.get("id")
+
+        # The list is replaced on change, so no lock is needed while iterating
+        for (callback, wanted_method, wanted_unit_id) in self._callbacks:
+            if wanted_method is not None and wanted_method != method:
+                continue
+            if wanted_unit_id is not None and wanted_unit_id != unit_id:
+                continue
+
+            try:
+                callback(message)
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                _LOGGER.exception(f"dispatch: callback {callback} failed")
+
+
+class WebSocketReader:
+    """
+    Reads frames from web_sock in one thread and dispatches them from a
+    second thread through a bounded queue.
+
+    When the queue is full the oldest message is dropped and counted in
+    dropped, so a slow callback never stops the socket from being read.
+    """
+
+    def __init__(
+        self,
+        *,
+        web_sock,
+        dispatch,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        on_disconnect=None,
+        metrics=None,
+    ):
+        self.web_sock = web_sock
+        self.metrics = metrics
+        self._dispatch = dispatch
+        self._on_disconnect = on_disconnect
+        self.queue_size = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+
+        self.received = 0
+        self.dropped = 0
+        self.decode_errors = 0
+
+        # Monotonic time of the last frame of any kind (including pongs),
+        # used to detect stalled connections
+        self.last_frame_at = time.monotonic()
+
+        self._reader_thread = threading.Thread(
+            target=self._read_loop, name="casambi-ws-reader", daemon=True
+        )
+        self._dispatch_thread = threading.Thread(
+            target=self._dispatch_loop, name="casambi-ws-dispatch", daemon=True
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._reader_thread.is_alive()
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        self.web_sock.settimeout(READ_TIMEOUT)
+
+        self._reader_thread.start()
+        self._dispatch_thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop both threads, messages still in the queue are discarded
+        """
+        self._stop.set()
+
+        # Wake up the dispatcher
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+        for thread in (self._reader_thread, self._dispatch_thread):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _enqueue(self, message):
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _disconnected(self, reason):
+        if self._stop.is_set():
+            return
+
+        _LOGGER.debug(f"_read_loop: websocket closed: {reason}")
+
+        if self._on_disconnect:
+            self._on_disconnect(reason)
+
+    def _read_loop(self):
+        import socket
+
+        import websocket
+        from websocket import ABNF
+
+        while not self._stop.is_set():
+            try:
+                opcode, frame = self.web_sock.recv_data(control_frame=True)
+            except (socket.timeout, websocket.WebSocketTimeoutException):
+                continue
+            except (
+                websocket.WebSocketConnectionClosedException,
+                websocket.WebSocketProtocolException,
+                OSError,
+            ) as err:
+                self._disconnected(err)
+                break
+
+            self.last_frame_at = time.monotonic()
+
+            if opcode == ABNF.OPCODE_CLOSE:
+                self._disconnected("close frame received")
+                break
+
+            if opcode not in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY) or not frame:
+                continue
+
+            start = time.perf_counter()
+
+            try:
+                message = json.loads(frame)
+            except ValueError:
+                self.decode_errors += 1
+                _LOGGER.debug(f"_read_loop: failed to decode: {frame}")
+                continue
+
+            if self.metrics:
+                observe_ws_event(
+                    self.metrics, message, len(frame), time.perf_counter() - start
+                )
+
+            self.received += 1
+            self._enqueue(message)
+
+        # Wake up the dispatcher so it can exit
+        self._stop.set()
+        self._enqueue(None)
+
+    def _dispatch_loop(self):
+        while True:
+            message = self._queue.get()
+
+            if message is None:
+                if self._stop.is_set():
+                    break
+                continue
+
+            self._dispatch(message)
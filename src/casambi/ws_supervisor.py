@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+"""
+Supervisor for the Casambi websocket, keeps the connection alive with pings
+and reconnects with jittered exponential backoff when it drops or stalls.
+"""
+import collections
+import logging
+import random
+import threading
+import time
+
+from .exceptions import CasambiApiException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PING_INTERVAL = 30.0
+DEFAULT_STALL_TIMEOUT = 90.0
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+DEFAULT_MAX_QUEUED = 1000
+
+
+def send_errors() -> tuple:
+    """
+    Exceptions raised when sending on a broken websocket, websocket-client
+    is imported on first use
+    """
+    import websocket
+
+    return (
+        websocket.WebSocketConnectionClosedException,
+        websocket.WebSocketTimeoutException,
+        OSError,
+    )
+
+
+def _close_web_sock(casambi):
+    try:
+        casambi.web_sock.close()
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+
+def backoff_delay(attempt: int, *, base: float, maximum: float) -> float:
+    """
+    Exponential backoff with full jitter, attempt starts at 0
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class WebSocketSupervisor:
+    """
+    Watches the websocket of a Casambi client.
+
+    A ping is sent when nothing has been received for ping_interval seconds
+    and the connection is considered stalled after stall_timeout seconds
+    without any frame. Commands sent while disconnected are queued (at most
+    max_queued, oldest are dropped) and replayed after the reconnect, or
+    flushed when replay_queued is False.
+    """
+
+    def __init__(
+        self,
+        *,
+        casambi,
+        ping_interval=DEFAULT_PING_INTERVAL,
+        stall_timeout=DEFAULT_STALL_TIMEOUT,
+        backoff_base=DEFAULT_BACKOFF_BASE,
+        backoff_max=DEFAULT_BACKOFF_MAX,
+        max_queued=DEFAULT_MAX_QUEUED,
+        replay_queued=True,
+    ):
+        self.casambi = casambi
+        self.ping_interval = ping_interval
+        self.stall_timeout = stall_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.replay_queued = replay_queued
+
+        self.connected = True
+
+        self.reconnects = 0
+        self.reconnect_failures = 0
+        self.reauthentications = 0
+        self.pings_sent = 0
+        self.replayed_commands = 0
+        self.dropped_commands = 0
+        self.total_downtime = 0.0
+        self.disconnected_at = None
+        self.last_disconnect_reason = None
+
+        self._queued = collections.deque(maxlen=max_queued)
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._last_ping_at = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run, name="casambi-ws-supervisor", daemon=True
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def metrics(self) -> dict:
+        """
+        Counters for the connection, downtime includes the current outage
+        """
+        downtime = self.total_downtime
+
+        if self.disconnected_at is not None:
+            downtime += time.monotonic() - self.disconnected_at
+
+        return {
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnect_failures,
+            "reauthentications": self.reauthentications,
+            "pings_sent": self.pings_sent,
+            "queued_commands": len(self._queued),
+            "replayed_commands": self.replayed_commands,
+            "dropped_commands": self.dropped_commands,
+            "downtime": downtime,
+            "last_disconnect_reason": self.last_disconnect_reason,
+        }
+
+    def send(self, message: str):
+        """
+        Send an encoded message, queue it if the websocket is down
+        """
+        with self._lock:
+            if not self.connected:
+                self._queue(message)
+                return
+
+            try:
+                self.casambi.web_sock.send(message)
+            except send_errors() as err:
+                self._queue(message)
+                self.notify_disconnect(err)
+
+    def _queue(self, message: str):
+        if len(self._queued) == self._queued.maxlen:
+            self.dropped_commands += 1
+
+        self._queued.append(message)
+
+    def notify_disconnect(self, reason):
+        """
+        Called by the reader or a failing send when the websocket is gone
+        """
+        with self._lock:
+            if not self.connected:
+                return
+
+            _LOGGER.debug(f"notify_disconnect: {reason}")
+
+            self.connected = False
+            self.disconnected_at = time.monotonic()
+            self.last_disconnect_reason = str(reason)
+
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.connected:
+                    self._reconnect()
+                    continue
+
+                self._keepalive()
+            except Exception:  # pylint: disable=broad-except
+                # The supervisor has to keep running, otherwise commands
+                # are queued forever
+                _LOGGER.exception("_run: supervisor step failed")
+
+            self._wakeup.wait(min(1.0, self.ping_interval))
+            self._wakeup.clear()
+
+    def _keepalive(self):
+        reader = self.casambi.ws_reader
+
+        if not reader:
+            return
+
+        now = time.monotonic()
+        idle = now - reader.last_frame_at
+
+        if idle > self.stall_timeout:
+            self.notify_disconnect(f"stalled, no frame for {idle:.1f}s")
+            return
+
+        if idle > self.ping_interval and now - self._last_ping_at > self.ping_interval:
+            self._last_ping_at = now
+
+            try:
+                with self._lock:
+                    self.casambi.web_sock.ping()
+                self.pings_sent += 1
+            except send_errors() as err:
+                self.notify_disconnect(err)
+
+    def _reconnect(self):
+        casambi = self.casambi
+        queue_size = casambi.ws_reader.queue_size if casambi.ws_reader else None
+
+        casambi.ws_stop_reader()
+        _close_web_sock(casambi)
+
+        attempt = 0
+
+        while not self._stop.is_set():
+            delay = backoff_delay(
+                attempt, base=self.backoff_base, maximum=self.backoff_max
+            )
+
+            if self._stop.wait(delay):
+                return
+
+            try:
+                if casambi.ws_open():
+                    break
+
+                # The wire was refused on a socket that is open
+                _close_web_sock(casambi)
+
+                if casambi.wire_status != "invalidSession":
+                    raise CasambiApiException(
+                        f"ws_open failed, wire status: {casambi.wire_status}"
+                    )
+
+                # Only log in again when the session is not valid anymore
+                _LOGGER.debug("_reconnect: session is invalid, logging in again")
+                self.reauthentications += 1
+                casambi.create_user_session()
+                casambi.create_network_session()
+            except Exception as err:  # pylint: disable=broad-except
+                self.reconnect_failures += 1
+                attempt += 1
+                _LOGGER.debug(f"_reconnect: attempt {attempt} failed: {err}")
+
+        if self._stop.is_set():
+            return
+
+        if queue_size is not None:
+            casambi.ws_start_reader(queue_size=queue_size)
+
+        self._reseed()
+
+        with self._lock:
+            self.connected = True
+            self.reconnects += 1
+            self.total_downtime += time.monotonic() - self.disconnected_at
+            self.disconnected_at = None
+
+            queued = list(self._queued)
+            self._queued.clear()
+
+            if not self.replay_queued:
+                self.dropped_commands += len(queued)
+                queued = []
+
+            for message in queued:
+                try:
+                    casambi.web_sock.send(message)
+                    self.replayed_commands += 1
+                except send_errors() as err:
+                    self._queue(message)
+                    self.notify_disconnect(err)
+
+        _LOGGER.debug(f"_reconnect: reconnected, metrics: {self.metrics()}")
+
+    def _reseed(self):
+        """
+        Seed the state mirror and the unit index again, the unitChanged
+        events during the outage were missed
+        """
+        casambi = self.casambi
+
+        # The REST api can fail in any way (connection errors too), the
+        # reconnect itself succeeded and needs to finish
+        if casambi.state_mirror:
+            try:
+                casambi.refresh_state_mirror()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("_reseed: failed to refresh state mirror")
+
+        if casambi.unit_index:
+            try:
+                casambi.build_unit_index()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("_reseed: failed to rebuild unit index")
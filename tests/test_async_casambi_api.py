@@ -0,0 +1,224 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from casambi.async_casambi_api import AsyncCasambi  # noqa: E402
+from casambi.exceptions import CasambiApiException  # noqa: E402
+
+API_URL = "https://door.casambi.com/v1"
+
+RGB_STATE = {
+    "id": 5,
+    "controls": [[{"type": "Dimmer", "value": 1}, {"type": "Color", "hue": 0}]],
+}
+
+
+class FakeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        # Let concurrent requests run up to here before any of them returns
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def text(self):
+        return str(self.data)
+
+    async def json(self, content_type=None):
+        return self.data
+
+
+class FakeHttp:
+    """
+    Answers the login calls with a new session each time, other calls with
+    the data in routes or 401 when the session is in rejected
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.rejected = set()
+        self.logins = 0
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        path = url[len(API_URL) :]
+
+        if path == "/users/session/":
+            self.logins += 1
+            return FakeResponse(
+                200,
+                {
+                    "sessionId": f"user-{self.logins}",
+                    "networks": {"home": {"id": "net"}},
+                },
+            )
+
+        if path == "/networks/session/":
+            return FakeResponse(200, {"net": {"sessionId": f"net-{self.logins}"}})
+
+        if kwargs["headers"]["X-Casambi-Session"] in self.rejected:
+            return FakeResponse(401, "session expired")
+
+        return FakeResponse(200, self.routes[path])
+
+    async def close(self):
+        self.closed = True
+
+
+def make_casambi(routes=None, **kwargs):
+    casambi = AsyncCasambi(
+        api_key="key",
+        email="email",
+        user_password="user",
+        network_password="net",
+        **kwargs,
+    )
+    http = FakeHttp(routes or {})
+    casambi._get_http = lambda: http
+
+    return (casambi, http)
+
+
+def test_login_creates_user_and_network_sessions():
+    (casambi, http) = make_casambi()
+
+    asyncio.run(casambi.login())
+
+    assert casambi.network_id == "net"
+    assert casambi._session_id == "net-1"
+    assert [(method, url) for (method, url, _) in http.requests] == [
+        ("POST", f"{API_URL}/users/session/"),
+        ("POST", f"{API_URL}/networks/session/"),
+    ]
+    assert http.requests[0][2]["json"] == {"email": "email", "password": "user"}
+    assert http.requests[1][2]["json"] == {"email": "email", "password": "net"}
+
+
+def test_rejected_session_logs_in_again_and_retries_once():
+    (casambi, http) = make_casambi({"/networks/net/units": {"1": {"id": 1}}})
+
+    async def run():
+        await casambi.login()
+        http.rejected.add("net-1")
+
+        return await casambi.get_unit_list()
+
+    assert asyncio.run(run()) == {"1": {"id": 1}}
+    assert http.logins == 2
+    assert casambi._session_id == "net-2"
+
+    sessions = [
+        kwargs["headers"]["X-Casambi-Session"]
+        for (_, url, kwargs) in http.requests
+        if url.endswith("/units")
+    ]
+    assert sessions == ["net-1", "net-2"]
+
+
+def test_rejected_retry_raises_after_one_login():
+    (casambi, http) = make_casambi({"/networks/net/units": {}})
+
+    async def run():
+        await casambi.login()
+        http.rejected.update({"net-1", "net-2"})
+
+        await casambi.get_unit_list()
+
+    with pytest.raises(CasambiApiException):
+        asyncio.run(run())
+
+    assert http.logins == 2
+
+
+def test_concurrent_rejected_calls_log_in_again_once():
+    (casambi, http) = make_casambi(
+        {"/networks/net/units": {}, "/networks/net/scenes": {}}
+    )
+
+    async def run():
+        await casambi.login()
+        http.rejected.add("net-1")
+
+        return await asyncio.gather(casambi.get_unit_list(), casambi.get_scenes_list())
+
+    assert asyncio.run(run()) == [{}, {}]
+    assert http.logins == 2
+
+    sessions = [
+        kwargs["headers"]["X-Casambi-Session"]
+        for (method, _, kwargs) in http.requests
+        if method == "GET"
+    ]
+    assert sessions == ["net-1", "net-1", "net-2", "net-2"]
+
+
+def test_without_relogin_the_rejection_is_raised():
+    (casambi, http) = make_casambi(
+        {"/networks/net/units": {}}, relogin_on_auth_failure=False
+    )
+
+    async def run():
+        await casambi.login()
+        http.rejected.add("net-1")
+
+        await casambi.get_unit_list()
+
+    with pytest.raises(CasambiApiException):
+        asyncio.run(run())
+
+    assert http.logins == 1
+
+
+def test_rest_calls_need_a_session():
+    (casambi, http) = make_casambi()
+    casambi.network_id = "net"
+
+    with pytest.raises(CasambiApiException):
+        asyncio.run(casambi.get_scenes_list())
+
+    assert http.requests == []
+
+
+def test_capabilities_are_fetched_once():
+    (casambi, http) = make_casambi({"/networks/net/units/5/state": RGB_STATE})
+
+    async def run():
+        await casambi.login()
+
+        return [
+            await casambi.unit_supports_rgb(unit_id=5),
+            await casambi.unit_supports_rgbw(unit_id=5),
+            await casambi.unit_supports_color_temperature(unit_id=5),
+        ]
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert [url for (method, url, _) in http.requests if method == "GET"] == [
+        f"{API_URL}/networks/net/units/5/state"
+    ]
+
+
+def test_datapoints_are_requested_with_the_range():
+    (casambi, http) = make_casambi({"/networks/net/datapoints": [{"value": 1}]})
+
+    async def run():
+        await casambi.login()
+
+        return await casambi.get_network_datapoints(
+            from_time="20240101", to_time="20240102", sensor_type=1
+        )
+
+    assert asyncio.run(run()) == [{"value": 1}]
+    assert http.requests[-1][2]["params"] == {
+        "sensorType": 1,
+        "from": "20240101",
+        "to": "20240102",
+    }
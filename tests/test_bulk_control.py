@@ -0,0 +1,54 @@
+import json
+
+from casambi.public_casambi_api import Casambi
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+
+def client():
+    casambi = Casambi(
+        api_key="key", email="email", user_password="user", network_password="net"
+    )
+    casambi.web_sock = FakeWebSocket()
+
+    return casambi
+
+
+def test_shared_target_controls_are_encoded_once(monkeypatch):
+    casambi = client()
+    encoder = casambi._frame_encoder()
+    encoded = []
+    encode_json = encoder.encode_json
+
+    def counting_encode_json(data):
+        encoded.append(data)
+        return encode_json(data)
+
+    monkeypatch.setattr(encoder, "encode_json", counting_encode_json)
+
+    results = casambi.set_units_value(unit_ids=[1, "2", 3], value=0.5)
+
+    assert results == {1: None, 2: None, 3: None}
+    assert len(encoded) == 1
+    assert [message["id"] for message in casambi.web_sock.sent] == [1, 2, 3]
+    assert all(
+        message["targetControls"] == {"Dimmer": {"value": 0.5}}
+        for message in casambi.web_sock.sent
+    )
+
+
+def test_invalid_unit_ids_are_reported_per_unit():
+    casambi = client()
+
+    results = casambi.turn_units_on(unit_ids=[1, None])
+
+    assert results[1] is None
+    assert isinstance(results[None], Exception)
+    assert len(casambi.web_sock.sent) == 1
+
@@ -0,0 +1,95 @@
+import threading
+
+from casambi import Casambi
+from casambi.exceptions import CasambiApiException
+
+
+def make_casambi(**kwargs):
+    return Casambi(
+        api_key="key",
+        email="email",
+        user_password="user",
+        network_password="net",
+        **kwargs,
+    )
+
+
+def dimmer_state(unit_id):
+    return {"id": unit_id, "controls": [{"type": "Dimmer", "value": 1}]}
+
+
+def test_unit_states_are_fetched_concurrently(monkeypatch):
+    casambi = make_casambi()
+    # Only passed when all three fetches run at the same time
+    barrier = threading.Barrier(3, timeout=5)
+    fetched = []
+
+    def get_unit_state_rest(*, unit_id):
+        fetched.append(unit_id)
+        barrier.wait()
+
+        return dimmer_state(unit_id)
+
+    monkeypatch.setattr(casambi, "_get_unit_state_rest", get_unit_state_rest)
+
+    states = casambi.get_unit_states(unit_ids=[1, "2", 3, 1], max_workers=3)
+
+    assert states == {unit_id: dimmer_state(unit_id) for unit_id in (1, 2, 3)}
+    assert sorted(fetched) == [1, 2, 3]
+
+    # The capabilities were cached from the fetched states
+    assert casambi.get_unit_capabilities(unit_id=2).dimmer
+    assert sorted(fetched) == [1, 2, 3]
+
+
+def test_failed_unit_is_reported_with_its_exception(monkeypatch):
+    casambi = make_casambi()
+
+    def get_unit_state_rest(*, unit_id):
+        if unit_id == 2:
+            raise CasambiApiException("unit 2 failed")
+
+        return dimmer_state(unit_id)
+
+    monkeypatch.setattr(casambi, "_get_unit_state_rest", get_unit_state_rest)
+
+    states = casambi.get_unit_states(unit_ids=[1, 2])
+
+    assert states[1] == dimmer_state(1)
+    assert isinstance(states[2], CasambiApiException)
+
+
+def test_all_units_come_from_one_network_state(monkeypatch):
+    casambi = make_casambi()
+    monkeypatch.setattr(
+        casambi,
+        "get_network_state",
+        lambda: {"units": {"1": dimmer_state(1), "2": dimmer_state(2)}},
+    )
+
+    def get_unit_state_rest(*, unit_id):
+        raise AssertionError("units are not fetched one by one")
+
+    monkeypatch.setattr(casambi, "_get_unit_state_rest", get_unit_state_rest)
+
+    assert casambi.get_unit_states() == {1: dimmer_state(1), 2: dimmer_state(2)}
+    assert casambi.get_unit_capabilities(unit_id=1).dimmer
+
+
+def test_fixtures_are_fetched_once_per_fixture(monkeypatch):
+    casambi = make_casambi(pool_size=2)
+    fetched = []
+    lock = threading.Lock()
+
+    def get_fixture_information(*, fixture_id):
+        with lock:
+            fetched.append(fixture_id)
+
+        return {"id": fixture_id}
+
+    monkeypatch.setattr(casambi, "get_fixture_information", get_fixture_information)
+
+    fixtures = casambi.get_fixtures_information(fixture_ids=[10, "20", 10, 20])
+
+    assert fixtures == {10: {"id": 10}, 20: {"id": 20}}
+    assert sorted(fetched) == [10, 20]
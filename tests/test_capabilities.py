@@ -0,0 +1,84 @@
+from casambi.capabilities import CapabilityCache, UnitCapabilities
+from casambi.unit_state import CAP_CCT, CAP_DIMMER, CAP_RGB, CAP_WHITE
+
+RGBW_STATE = {
+    "id": 3,
+    "controls": [
+        [
+            {"type": "Dimmer", "value": 0.5},
+            {"type": "Color", "hue": 0.1, "sat": 1.0},
+            {"type": "White", "value": 0.2},
+        ]
+    ],
+}
+
+CCT_STATE = {
+    "id": 4,
+    "controls": [
+        {"type": "Dimmer", "value": 1.0},
+        {"type": "CCT", "value": 3000, "min": 2200, "max": 6500},
+    ],
+}
+
+
+def test_flags_are_read_from_the_bitmask():
+    capabilities = UnitCapabilities(unit_id=1, capabilities=CAP_DIMMER | CAP_RGB)
+
+    assert capabilities.dimmer
+    assert capabilities.rgb
+    assert not capabilities.rgbw
+    assert not capabilities.vertical
+    assert not capabilities.color_temperature
+
+    capabilities = UnitCapabilities(unit_id=1, capabilities=CAP_RGB | CAP_WHITE)
+    assert capabilities.rgbw
+
+
+def test_update_parses_the_unit_state():
+    cache = CapabilityCache()
+
+    rgbw = cache.update(unit_id=3, data=RGBW_STATE)
+    cct = cache.update(unit_id=4, data=CCT_STATE)
+
+    assert rgbw.dimmer and rgbw.rgb and rgbw.rgbw
+    assert not rgbw.color_temperature
+
+    assert cct.capabilities == CAP_DIMMER | CAP_CCT
+    assert (cct.cct_min, cct.cct_max) == (2200, 6500)
+
+    assert cache.get(3) is rgbw
+    assert cache.get(4) is cct
+    assert cache.get(5) is None
+
+
+def test_expired_entry_is_dropped():
+    cache = CapabilityCache(ttl=10.0)
+    capabilities = cache.update(unit_id=3, data=RGBW_STATE)
+
+    assert cache.get(3) is capabilities
+
+    capabilities.fetched_at -= 11.0
+
+    assert cache.get(3) is None
+    assert 3 not in cache._entries
+
+
+def test_entry_without_ttl_does_not_expire():
+    cache = CapabilityCache(ttl=None)
+    capabilities = cache.update(unit_id=3, data=RGBW_STATE)
+    capabilities.fetched_at -= 1e6
+
+    assert cache.get(3) is capabilities
+
+
+def test_invalidate_one_unit_or_all():
+    cache = CapabilityCache()
+    cache.update(unit_id=3, data=RGBW_STATE)
+    cache.update(unit_id=4, data=CCT_STATE)
+
+    cache.invalidate(3)
+    assert cache.get(3) is None
+    assert cache.get(4) is not None
+
+    cache.invalidate()
+    assert cache.get(4) is None
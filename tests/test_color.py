@@ -0,0 +1,116 @@
+import pytest
+
+from casambi.color import (
+    CctTable,
+    color_temperature,
+    color_temperatures,
+    rgb_to_hue_sat,
+)
+
+
+def has_numpy() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+# The NumPy path is reported as skipped when numpy is not installed
+USE_NUMPY = [
+    False,
+    pytest.param(
+        True,
+        marks=pytest.mark.skipif(not has_numpy(), reason="numpy is not installed"),
+        id="numpy",
+    ),
+]
+
+
+def test_color_temperature_is_snapped_up_and_clamped():
+    assert color_temperature(3010, cct_min=2200, cct_max=6000) == 3050
+    assert color_temperature(3000.0, cct_min=2200, cct_max=6000) == 3000
+    assert color_temperature(1000, cct_min=2200, cct_max=6000) == 2200
+    assert color_temperature(250, cct_min=2200, cct_max=6000, source="mired") == 4000
+
+
+@pytest.mark.parametrize("use_numpy", USE_NUMPY)
+def test_batch_matches_scalar(use_numpy):
+    values = [0, 1999, 2200, 3010, 4444.4, 7000]
+
+    result = color_temperatures(
+        values, cct_min=2200, cct_max=6000, use_numpy=use_numpy
+    )
+
+    assert [int(value) for value in result] == [
+        color_temperature(value, cct_min=2200, cct_max=6000) for value in values
+    ]
+
+
+@pytest.mark.parametrize("use_numpy", USE_NUMPY)
+@pytest.mark.parametrize("value", [0, -10])
+def test_non_positive_mired_is_rejected_on_every_path(use_numpy, value):
+    with pytest.raises(ValueError):
+        color_temperatures(
+            [value], cct_min=2200, cct_max=6000, source="mired", use_numpy=use_numpy
+        )
+
+    with pytest.raises(ValueError):
+        color_temperature(value, cct_min=2200, cct_max=6000, source="mired")
+
+    with pytest.raises(ValueError):
+        CctTable(cct_min=2200, cct_max=6000).lookup(value, source="mired")
+
+
+def test_float_ranges():
+    table = CctTable(cct_min=2200.0, cct_max=6000.5)
+
+    assert table.lookup(3001) == 3050
+    assert table.lookup(9000) == 6000
+    result = color_temperatures([1000, 3001], cct_min=2200.0, cct_max=6000.5)
+
+    assert [int(value) for value in result] == [2200, 3050]
+
+
+def test_rgb_to_hue_sat():
+    assert rgb_to_hue_sat([(255, 0, 0), (0, 0, 255)], use_numpy=False) == [
+        (0.0, 1.0),
+        (0.7, 1.0),
+    ]
+
+
+@pytest.mark.skipif(not has_numpy(), reason="numpy is not installed")
+def test_numpy_and_scalar_paths_match():
+    values = [0, 1, 1999, 2200, 3000, 3010, 3025.5, 4444.4, 6000, 9999]
+    cct_min = [2200, 2700.0, 1800, 2200, 2200, 2200, 2200, 3000, 2200, 2000]
+    cct_max = [6000, 6500.0, 4000, 6000, 6000, 6000, 6000, 4000, 6000, 8000]
+
+    for source in ("TW", "mired"):
+        source_values = [value + 1 for value in values]
+
+        scalar = color_temperatures(
+            source_values,
+            cct_min=cct_min,
+            cct_max=cct_max,
+            source=source,
+            use_numpy=False,
+        )
+        vectorised = color_temperatures(
+            source_values,
+            cct_min=cct_min,
+            cct_max=cct_max,
+            source=source,
+            use_numpy=True,
+        )
+
+        assert [int(value) for value in vectorised] == scalar
+
+    colors = [(255, 0, 0), (0, 255, 0), (10, 20, 30), (0, 0, 0), (128, 128, 128)]
+    colors += [(red, 255 - red, red // 2) for red in range(0, 256, 5)]
+
+    vectorised = rgb_to_hue_sat(colors, use_numpy=True)
+
+    assert [
+        (float(hue), float(sat)) for (hue, sat) in vectorised
+    ] == rgb_to_hue_sat(colors, use_numpy=False)
@@ -0,0 +1,185 @@
+import threading
+
+from casambi.command_queue import CommandQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def stopped_queue(**kwargs):
+    """
+    A queue without its sender thread, frames are taken with _next_message
+    so the test decides when time passes
+    """
+    clock = FakeClock()
+    queue = CommandQueue(send=lambda frame: None, clock=clock, **kwargs)
+    queue.stop(flush=False)
+
+    return (queue, clock)
+
+
+def take(queue):
+    with queue._condition:
+        return queue._next_message()
+
+
+def dimmer(unit_id):
+    return ("controlUnit", unit_id, ("Dimmer",))
+
+
+def test_latest_frame_wins_and_keeps_its_place():
+    (queue, _) = stopped_queue(unit_rate=1000, global_rate=1000)
+
+    queue.put_frame(dimmer(1), "1:a")
+    queue.put_frame(dimmer(2), "2:a")
+    queue.put_frame(dimmer(1), "1:b")
+
+    assert queue.pending == 2
+    assert queue.coalesced == 1
+    assert take(queue) == ("1:b", None)
+
+
+def test_last_command_to_a_unit_is_sent_last():
+    (queue, clock) = stopped_queue(unit_rate=10, global_rate=1000)
+    rgb = ("controlUnit", 1, ("Colorsource", "RGB"))
+    cct = ("controlUnit", 1, ("ColorTemperature", "Colorsource"))
+
+    queue.put_frame(rgb, "rgbA")
+    assert take(queue) == ("rgbA", None)
+
+    queue.put_frame(rgb, "rgbB")
+    queue.put_frame(cct, "cct")
+    queue.put_frame(rgb, "rgbC")
+
+    sent = []
+    for _ in range(2):
+        clock.now += 0.1
+        sent.append(take(queue)[0])
+
+    assert sent == ["cct", "rgbC"]
+
+
+def test_different_control_types_are_not_coalesced():
+    (queue, clock) = stopped_queue(unit_rate=10, global_rate=1000)
+
+    queue.put_frame(dimmer(1), "dimmer")
+    queue.put_frame(("controlUnit", 1, ("Vertical",)), "vertical")
+
+    assert queue.coalesced == 0
+    assert take(queue) == ("dimmer", None)
+
+    clock.now = 0.1
+    assert take(queue) == ("vertical", None)
+
+
+def test_unit_rate_limit():
+    (queue, clock) = stopped_queue(unit_rate=10, global_rate=1000)
+
+    queue.put_frame(dimmer(1), "first")
+    assert take(queue) == ("first", None)
+
+    queue.put_frame(dimmer(1), "second")
+    clock.now = 0.04
+
+    (frame, wait) = take(queue)
+    assert frame is None
+    assert abs(wait - 0.06) < 1e-9
+
+    clock.now = 0.1
+    assert take(queue) == ("second", None)
+
+
+def test_other_units_are_not_held_back_by_a_limited_unit():
+    (queue, clock) = stopped_queue(unit_rate=10, global_rate=1000)
+
+    queue.put_frame(dimmer(1), "1:a")
+    assert take(queue) == ("1:a", None)
+
+    queue.put_frame(dimmer(1), "1:b")
+    queue.put_frame(dimmer(2), "2:a")
+    clock.now = 0.01
+
+    assert take(queue) == ("2:a", None)
+
+
+def test_global_rate_limit():
+    (queue, clock) = stopped_queue(unit_rate=1000, global_rate=10)
+
+    queue.put_frame(dimmer(1), "1")
+    queue.put_frame(dimmer(2), "2")
+
+    assert take(queue) == ("1", None)
+
+    (frame, wait) = take(queue)
+    assert frame is None
+    assert abs(wait - 0.1) < 1e-9
+
+    clock.now = 0.1
+    assert take(queue) == ("2", None)
+
+
+def test_unit_send_times_are_dropped_once_passed():
+    (queue, clock) = stopped_queue(unit_rate=10, global_rate=1000)
+
+    for unit_id in range(100):
+        queue.put_frame(dimmer(unit_id), str(unit_id))
+
+    for _ in range(100):
+        clock.now += 0.001
+        (frame, _) = take(queue)
+        assert frame is not None
+
+    assert len(queue._unit_next) == 100
+
+    clock.now += 1.0
+    assert take(queue) == (None, None)
+    assert queue._unit_next == {}
+
+
+def test_supersede_drops_covered_frames():
+    (queue, clock) = stopped_queue(unit_rate=1000, global_rate=1000)
+
+    queue.put_frame(dimmer(1), "dimmer")
+    queue.put_frame(("controlUnit", 2, ("Colorsource", "RGB")), "rgb")
+    queue.put_frame(("controlUnit", 3, ("Dimmer", "Vertical")), "both")
+
+    assert queue.supersede({"Dimmer": {"value": 0}}) == 1
+    assert queue.pending == 2
+    assert take(queue) == ("rgb", None)
+
+    clock.now = 0.001
+    assert take(queue) == ("both", None)
+
+    clock.now = 0.002
+    assert take(queue) == (None, None)
+
+
+def test_sender_thread_sends_latest_frames():
+    sent = []
+    ready = threading.Event()
+
+    def send(frame):
+        ready.wait(5)
+        sent.append(frame)
+
+    queue = CommandQueue(send=send, unit_rate=1000, global_rate=1000)
+
+    try:
+        for value in range(5):
+            for unit_id in range(3):
+                queue.put_frame(dimmer(unit_id), f"{unit_id}:{value}")
+
+        ready.set()
+        assert queue.flush(5)
+    finally:
+        queue.stop(timeout=5)
+
+    # The first frame may have been taken before it was replaced
+    assert sent[-3:] == ["0:4", "1:4", "2:4"]
+    assert queue.sent == len(sent)
+    assert queue.pending == 0
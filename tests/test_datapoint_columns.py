@@ -0,0 +1,70 @@
+import datetime
+import math
+import sys
+
+import pytest
+
+from casambi.datapoint_columns import (
+    datapoints_to_columns,
+    load_columns,
+    save_columns,
+    to_epoch_ms,
+)
+
+EPOCH_MS = 1704189600000  # 2024-01-02T10:00:00Z
+
+RECORDS = [
+    {"time": EPOCH_MS, "unitId": 3, "value": 0.5},
+    {"time": "2024-01-02T10:00:01Z", "unitId": "4", "value": 21},
+    {"time": str(EPOCH_MS + 2000), "value": None},
+]
+
+
+def test_to_epoch_ms():
+    aware = datetime.datetime(2024, 1, 2, 10, tzinfo=datetime.timezone.utc)
+
+    assert to_epoch_ms(EPOCH_MS) == EPOCH_MS
+    assert to_epoch_ms(float(EPOCH_MS)) == EPOCH_MS
+    assert to_epoch_ms(str(EPOCH_MS)) == EPOCH_MS
+    assert to_epoch_ms("2024-01-02T10:00:00Z") == EPOCH_MS
+    assert to_epoch_ms("2024-01-02T12:00:00+02:00") == EPOCH_MS
+    assert to_epoch_ms(aware) == EPOCH_MS
+
+    with pytest.raises(ValueError):
+        to_epoch_ms(None)
+
+
+def test_records_are_converted_to_typed_columns():
+    numpy = pytest.importorskip("numpy")
+
+    columns = datapoints_to_columns(iter(RECORDS))
+
+    assert columns["time"].dtype == numpy.int64
+    assert columns["unit_id"].dtype == numpy.int32
+    assert columns["value"].dtype == numpy.float32
+
+    assert columns["time"].tolist() == [EPOCH_MS, EPOCH_MS + 1000, EPOCH_MS + 2000]
+    assert columns["unit_id"].tolist() == [3, 4, -1]
+    assert columns["value"].tolist()[:2] == [0.5, 21.0]
+    assert math.isnan(columns["value"][2])
+
+
+def test_columns_survive_save_and_load(tmp_path):
+    pytest.importorskip("numpy")
+
+    path = str(tmp_path / "datapoints.npz")
+    columns = datapoints_to_columns(RECORDS)
+
+    save_columns(path, columns)
+    loaded = load_columns(path)
+
+    assert loaded["time"].tolist() == columns["time"].tolist()
+    assert loaded["unit_id"].tolist() == columns["unit_id"].tolist()
+    assert loaded["value"][:2].tolist() == columns["value"][:2].tolist()
+
+
+def test_missing_numpy_is_reported(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    with pytest.raises(ImportError, match="casambi\\[numpy\\]"):
+        datapoints_to_columns(RECORDS)
@@ -0,0 +1,116 @@
+import datetime
+import time
+
+import pytest
+
+from casambi import Casambi
+from casambi.datapoint_columns import to_epoch_ms
+from casambi.datapoint_store import DatapointStore, split_buckets
+from casambi.datapoints import parse_time
+
+HOUR = datetime.timedelta(hours=1)
+
+
+def test_split_buckets_aligns_to_the_bucket_size():
+    buckets = split_buckets(
+        from_time="20240102103000", to_time="20240102121500", bucket=HOUR
+    )
+
+    assert buckets == [
+        (
+            datetime.datetime(2024, 1, 2, hour),
+            datetime.datetime(2024, 1, 2, hour, 59, 59),
+        )
+        for hour in (10, 11, 12)
+    ]
+
+
+def test_split_buckets_single_bucket():
+    buckets = split_buckets(from_time="20240102", to_time="20240102235959")
+
+    assert buckets == [
+        (datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 2, 23, 59, 59))
+    ]
+
+
+def test_split_buckets_timezone_aware_range():
+    from_time = datetime.datetime(2024, 1, 2, 10, 30, tzinfo=datetime.timezone.utc)
+    to_time = from_time + 2 * HOUR
+
+    buckets = split_buckets(from_time=from_time, to_time=to_time, bucket=HOUR)
+
+    # Aware times are taken as the same instant in naive local time
+    local_from = from_time.astimezone().replace(tzinfo=None)
+
+    assert len(buckets) == 3
+    assert buckets[0][0] <= local_from <= buckets[0][1]
+    assert all(start.tzinfo is None for (start, _) in buckets)
+
+
+def test_parse_time_converts_aware_to_local():
+    value = datetime.datetime(2024, 6, 1, 12, tzinfo=datetime.timezone.utc)
+
+    assert parse_time(value) == value.astimezone().replace(tzinfo=None)
+
+
+def test_store_keeps_buckets(tmp_path):
+    bucket_start = datetime.datetime(2024, 1, 2)
+
+    with DatapointStore(str(tmp_path / "datapoints.db")) as store:
+        store.put_bucket(
+            network_id="n",
+            sensor_type=0,
+            bucket_start=bucket_start,
+            records=[{"time": 1}, {"time": 2}],
+            complete=True,
+        )
+
+        assert store.complete_buckets(network_id="n", sensor_type=0) == {
+            bucket_start
+        }
+        assert store.get_bucket(
+            network_id="n", sensor_type=0, bucket_start=bucket_start
+        ) == [{"time": 1}, {"time": 2}]
+        assert store.complete_buckets(network_id="n", sensor_type=1) == set()
+
+
+@pytest.fixture
+def utc_plus_3(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is needed to change the local timezone")
+
+    # POSIX offsets are west of UTC, this is UTC+3
+    monkeypatch.setenv("TZ", "XXX-3")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_times_are_local_time(utc_plus_3, tmp_path, monkeypatch):
+    casambi = Casambi(
+        api_key="key", email="email", user_password="user", network_password="net"
+    )
+    casambi.network_id = "n"
+    records = [
+        {"id": "before", "time": "2024-01-02T09:30:00"},
+        {"id": "local", "time": "2024-01-02T10:30:00"},
+        {"id": "utc", "time": "2024-01-02T07:45:00Z"},
+        {"id": "epoch", "time": to_epoch_ms("2024-01-02T07:50:00+00:00")},
+        {"id": "after", "time": "2024-01-02T11:00:00"},
+    ]
+    monkeypatch.setattr(casambi, "_fetch_network_datapoints", lambda **kwargs: records)
+
+    assert to_epoch_ms(datetime.datetime(2024, 1, 2, 10)) == to_epoch_ms(
+        "2024-01-02T07:00:00Z"
+    )
+
+    with DatapointStore(str(tmp_path / "datapoints.db")) as store:
+        stored = casambi.get_stored_network_datapoints(
+            store=store,
+            from_time="20240102100000",
+            to_time="20240102105959",
+            bucket=HOUR,
+        )
+
+    assert [record["id"] for record in stored] == ["local", "utc", "epoch"]
@@ -0,0 +1,105 @@
+import datetime
+import threading
+
+import pytest
+
+from casambi import Casambi
+from casambi.datapoints import format_time, parse_time, split_windows
+from casambi.exceptions import CasambiApiException
+
+DAY = datetime.timedelta(days=1)
+
+
+def test_parse_time_formats():
+    assert parse_time("20240102") == datetime.datetime(2024, 1, 2)
+    assert parse_time("2024010210") == datetime.datetime(2024, 1, 2, 10)
+    assert parse_time("202401021030") == datetime.datetime(2024, 1, 2, 10, 30)
+    assert parse_time("20240102103015") == datetime.datetime(2024, 1, 2, 10, 30, 15)
+    assert parse_time(datetime.date(2024, 1, 2)) == datetime.datetime(2024, 1, 2)
+
+    with pytest.raises(CasambiApiException):
+        parse_time("2024-01-02")
+
+
+def test_format_time_roundtrip():
+    value = datetime.datetime(2024, 1, 2, 10, 30, 15)
+
+    assert format_time(value) == "20240102103015"
+    assert parse_time(format_time(value)) == value
+
+
+def test_windows_cover_the_range_without_overlap():
+    windows = split_windows(from_time="20240101", to_time="20240103120000", window=DAY)
+
+    assert windows == [
+        (datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1, 23, 59, 59)),
+        (datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 2, 23, 59, 59)),
+        (datetime.datetime(2024, 1, 3), datetime.datetime(2024, 1, 3, 12)),
+    ]
+
+
+def test_window_needs_to_be_at_least_one_second():
+    with pytest.raises(CasambiApiException):
+        split_windows(
+            from_time="20240101",
+            to_time="20240102",
+            window=datetime.timedelta(milliseconds=10),
+        )
+
+
+def make_casambi(monkeypatch, fetch):
+    casambi = Casambi(
+        api_key="key", email="email", user_password="user", network_password="net"
+    )
+    monkeypatch.setattr(casambi, "_fetch_network_datapoints", fetch)
+
+    return casambi
+
+
+def test_windows_are_yielded_in_time_order(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(*, from_time, to_time, sensor_type):
+        with lock:
+            calls.append((from_time, to_time))
+
+        day = int(from_time[6:8])
+
+        # Unsorted within the window
+        return [{"time": day * 10 + 1}, {"time": day * 10}]
+
+    casambi = make_casambi(monkeypatch, fetch)
+    records = casambi.iter_network_datapoints(
+        from_time="20240101", to_time="20240104235959", window=DAY, max_workers=2
+    )
+
+    assert [record["time"] for record in records] == [10, 11, 20, 21, 30, 31, 40, 41]
+    assert sorted(calls) == [
+        ("20240101000000", "20240101235959"),
+        ("20240102000000", "20240102235959"),
+        ("20240103000000", "20240103235959"),
+        ("20240104000000", "20240104235959"),
+    ]
+
+
+def test_sensor_types_are_merged(monkeypatch):
+    def fetch(*, from_time, to_time, sensor_type):
+        if sensor_type == 0:
+            return [{"time": 1}, {"time": 4}]
+
+        return [{"time": 2}, {"time": 3}]
+
+    casambi = make_casambi(monkeypatch, fetch)
+    records = casambi.iter_network_datapoints(
+        from_time="20240101", to_time="20240101235959", sensor_types=(0, 1)
+    )
+
+    assert [record["time"] for record in records] == [1, 2, 3, 4]
+
+
+def test_invalid_sensor_type(monkeypatch):
+    casambi = make_casambi(monkeypatch, lambda **kwargs: [])
+
+    with pytest.raises(CasambiApiException):
+        list(casambi.iter_network_datapoints(sensor_types=(2,)))
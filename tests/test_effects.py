@@ -0,0 +1,139 @@
+import pytest
+
+from casambi.capabilities import UnitCapabilities
+from casambi.effects import EffectsEngine, Transition
+from casambi.unit_state import CAP_CCT
+
+
+class FakeCasambi:
+    def __init__(self):
+        self.command_queue = None
+        self.sent = []
+
+    def get_unit_capabilities(self, *, unit_id):
+        return UnitCapabilities(
+            unit_id=unit_id, capabilities=CAP_CCT, cct_min=2000, cct_max=6000
+        )
+
+    def set_units_target_controls(self, *, target_controls):
+        self.sent.append(target_controls)
+
+        return dict.fromkeys(target_controls)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def engine():
+    return EffectsEngine(casambi=FakeCasambi(), clock=FakeClock())
+
+
+def test_keyframes_are_interpolated():
+    transition = Transition(
+        unit_ids=[1], control="Dimmer", keyframes=[(2.0, 1.0), (0.0, 0.0)]
+    )
+
+    assert transition.value_at(-1.0) == 0.0
+    assert transition.value_at(0.5) == 0.25
+    assert transition.value_at(3.0) == 1.0
+    assert transition.done_at(2.0)
+
+
+def test_repeating_keyframes_loop():
+    transition = Transition(
+        unit_ids=[1],
+        control="RGB",
+        keyframes=[(0.0, (0, 0, 0)), (1.0, (255, 0, 0))],
+        repeat=True,
+    )
+
+    assert transition.value_at(1.5) == (127.5, 0.0, 0.0)
+    assert not transition.done_at(10.0)
+
+
+def test_unknown_control_raises():
+    with pytest.raises(ValueError):
+        Transition(unit_ids=[1], control="Brightness", keyframes=[(0.0, 1.0)])
+
+
+def test_only_changed_levels_are_rendered():
+    effects = engine()
+    effects.fade(unit_ids=[1, 2], start=0.0, end=1.0, duration=1.0)
+
+    assert effects.render(0.0) == {
+        1: {"Dimmer": {"value": 0.0}},
+        2: {"Dimmer": {"value": 0.0}},
+    }
+    assert effects.render(0.001) == {}
+    assert effects.unchanged == 2
+
+    frame = effects.render(0.5)
+    assert frame[1] == {"Dimmer": {"value": 128 / 255}}
+
+
+def test_finished_transition_is_removed():
+    effects = engine()
+    transition = effects.fade(unit_ids=[1], start=0.0, end=1.0, duration=1.0)
+
+    effects.render(1.0)
+
+    assert effects.active == 0
+    assert transition.wait(0)
+
+
+def test_later_transition_takes_over_the_unit():
+    effects = engine()
+    first = effects.fade(unit_ids=[1, 2], start=0.0, end=1.0, duration=10.0)
+    effects.fade(unit_ids=[2], start=1.0, end=1.0, duration=10.0)
+
+    frame = effects.render(0.0)
+
+    assert frame == {
+        1: {"Dimmer": {"value": 0.0}},
+        2: {"Dimmer": {"value": 1.0}},
+    }
+    assert not first.finished.is_set()
+
+
+def test_color_temperature_is_clamped_per_unit():
+    effects = engine()
+    effects.fade(unit_ids=[1], control="CCT", start=1000, end=9000, duration=1.0)
+
+    assert effects.render(0.0)[1]["ColorTemperature"] == {"value": 2000}
+    assert effects.render(1.0)[1]["ColorTemperature"] == {"value": 6000}
+
+
+def test_failed_units_are_sent_again():
+    effects = engine()
+    effects.casambi.set_units_target_controls = lambda target_controls: {
+        unit_id: RuntimeError("failed") for unit_id in target_controls
+    }
+    effects.fade(unit_ids=[1], start=0.5, end=0.5, duration=10.0)
+
+    effects._send(effects.render(0.0))
+
+    assert effects.errors == 1
+    assert effects.render(0.1) == {1: {"Dimmer": {"value": 128 / 255}}}
+
+
+def test_frame_rate_backs_off_and_recovers():
+    effects = EffectsEngine(
+        casambi=FakeCasambi(), frame_rate=20.0, min_frame_rate=5.0, clock=FakeClock()
+    )
+
+    effects._adapt(backlog=10, previous_units=10, send_seconds=0.0)
+    assert effects.frame_rate == 10.0
+
+    effects._adapt(backlog=10, previous_units=10, send_seconds=0.0)
+    effects._adapt(backlog=10, previous_units=10, send_seconds=0.0)
+    assert effects.frame_rate == 5.0
+
+    for _ in range(50):
+        effects._adapt(backlog=0, previous_units=10, send_seconds=0.0)
+
+    assert effects.frame_rate == 20.0
@@ -0,0 +1,88 @@
+import pytest
+
+from casambi import Casambi
+from casambi.exceptions import CasambiApiException
+from casambi.fixture_catalog import FixtureCatalog
+from casambi.unit_index import UnitIndex
+
+UNIT_LIST = {
+    "1": {"id": 1, "name": "Desk", "fixtureId": 10},
+    "2": {"id": 2, "name": "Wall", "fixtureId": 20},
+    "3": {"id": 3, "name": "Spot", "fixtureId": 10},
+}
+
+
+def make_casambi(monkeypatch, fetched):
+    casambi = Casambi(
+        api_key="key", email="email", user_password="user", network_password="net"
+    )
+
+    def get_fixtures_information(*, fixture_ids, max_workers=None):
+        fetched.append(list(fixture_ids))
+        return {fixture_id: {"id": fixture_id} for fixture_id in fixture_ids}
+
+    monkeypatch.setattr(casambi, "get_fixtures_information", get_fixtures_information)
+
+    return casambi
+
+
+def test_missing_is_unique_and_keeps_order():
+    catalog = FixtureCatalog()
+    catalog.put(20, {"id": 20})
+
+    assert catalog.missing([30, "10", 20, 30, 10, 40]) == [30, 10, 40]
+
+
+def test_catalog_survives_a_restart(tmp_path):
+    path = str(tmp_path / "fixtures.json")
+
+    catalog = FixtureCatalog(path=path)
+    catalog.put(10, {"id": 10, "model": "Spot"})
+    catalog.save()
+
+    catalog = FixtureCatalog(path=path)
+
+    assert len(catalog) == 1
+    assert "10" in catalog
+    assert catalog.get(10) == {"id": 10, "model": "Spot"}
+
+
+def test_fixture_ids_are_taken_from_the_unit_index(monkeypatch):
+    fetched = []
+    casambi = make_casambi(monkeypatch, fetched)
+
+    def get_unit_list():
+        raise AssertionError("the unit list is not fetched")
+
+    monkeypatch.setattr(casambi, "get_unit_list", get_unit_list)
+
+    casambi.unit_index = UnitIndex()
+    casambi.unit_index.build(unit_list=UNIT_LIST)
+
+    catalog = FixtureCatalog()
+    catalog.put(20, {"id": 20})
+
+    fixtures = casambi.get_fixture_catalog(catalog=catalog)
+
+    assert fetched == [[10]]
+    assert fixtures == {10: {"id": 10}, 20: {"id": 20}}
+
+    # Everything is in the catalog now
+    casambi.get_fixture_catalog(catalog=catalog)
+    assert fetched == [[10]]
+
+
+def test_unit_list_is_only_fetched_when_asked_for(monkeypatch):
+    fetched = []
+    casambi = make_casambi(monkeypatch, fetched)
+    monkeypatch.setattr(casambi, "get_unit_list", lambda: UNIT_LIST)
+
+    with pytest.raises(CasambiApiException):
+        casambi.get_fixture_catalog(catalog=FixtureCatalog())
+
+    assert fetched == []
+
+    fixtures = casambi.get_fixture_catalog(catalog=FixtureCatalog(), fetch_units=True)
+
+    assert fetched == [[10, 20]]
+    assert sorted(fixtures) == [10, 20]
@@ -0,0 +1,38 @@
+import json
+
+from casambi.frames import FrameEncoder, quantize_level, target_controls
+
+
+def test_frames_match_json_dumps():
+    encoder = FrameEncoder(wire_id=1)
+    controls = {"Dimmer": {"value": 0.5}}
+
+    assert encoder.control_unit(3, controls) == json.dumps(
+        {"wire": 1, "method": "controlUnit", "id": 3, "targetControls": controls}
+    )
+    assert encoder.dimmer(3, 0.5) == encoder.control_unit(3, controls)
+    assert encoder.scene(4, 0) == json.dumps(
+        {"wire": 1, "method": "controlScene", "id": 4, "level": 0}
+    )
+
+
+def test_encoded_target_controls_are_reused():
+    encoder = FrameEncoder(wire_id=2, compact=True)
+    controls = {"Dimmer": {"value": 1}}
+    body = encoder.encode_json(controls)
+
+    assert encoder.control_unit_encoded(5, body) == encoder.control_unit(5, controls)
+
+
+def test_target_controls_keep_the_value():
+    assert target_controls("Dimmer", 0.5) == {"Dimmer": {"value": 0.5}}
+    assert target_controls("RGB", (0.1, 0.2)) == {
+        "RGB": {"hue": 0.1, "sat": 0.2},
+        "Colorsource": {"source": "RGB"},
+    }
+
+
+def test_quantize_level():
+    assert quantize_level(0.5) == 128
+    assert quantize_level(2) == 255
+    assert quantize_level(-1) == 0
@@ -0,0 +1,150 @@
+import urllib.request
+
+import pytest
+
+from casambi import Casambi
+from casambi.metrics import (
+    REST_REQUEST_SECONDS,
+    WS_EVENT_DECODE_SECONDS,
+    WS_RECEIVED_BYTES,
+    WS_SEND_SECONDS,
+    WS_SENT_BYTES,
+    Histogram,
+    MetricsExporter,
+    MetricsRegistry,
+    endpoint_name,
+    frame_method,
+    observe_ws_event,
+)
+
+
+def test_endpoint_name_replaces_ids():
+    assert (
+        endpoint_name("https://door.casambi.com/v1/networks/abc/units/12/state")
+        == "/v1/networks/{id}/units/{id}/state"
+    )
+    assert endpoint_name("https://door.casambi.com/v1/networks/session/") == (
+        "/v1/networks/session/"
+    )
+    assert endpoint_name("https://door.casambi.com/v1/fixtures/7") == (
+        "/v1/fixtures/{id}"
+    )
+
+
+def test_frame_method():
+    assert frame_method('{"wire": 1, "method": "controlUnit", "id": 2}') == (
+        "controlUnit"
+    )
+    assert frame_method(b'{"method":"ping"}') == "ping"
+    assert frame_method('{"wire": 1}') == ""
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_registry_keys_on_name_and_labels():
+    metrics = MetricsRegistry(buckets=(1.0,))
+    metrics.observe(REST_REQUEST_SECONDS, 0.5, endpoint="/a", status="200")
+    metrics.observe(REST_REQUEST_SECONDS, 0.5, status="200", endpoint="/a")
+    metrics.observe(REST_REQUEST_SECONDS, 0.5, endpoint="/a", status="401")
+    metrics.inc(WS_SENT_BYTES, 10, method="controlUnit")
+    metrics.inc(WS_SENT_BYTES, 5, method="controlUnit")
+
+    histogram = metrics.histogram(REST_REQUEST_SECONDS, endpoint="/a", status="200")
+
+    assert histogram.count == 2
+    assert metrics.histogram(REST_REQUEST_SECONDS, endpoint="/b") is None
+    assert metrics.counter(WS_SENT_BYTES, method="controlUnit") == 15
+    assert len(metrics.snapshot()[REST_REQUEST_SECONDS]) == 2
+
+
+def test_failing_hook_does_not_stop_the_others():
+    metrics = MetricsRegistry()
+    seen = []
+
+    def fail(name, value, labels):
+        raise RuntimeError("hook failed")
+
+    def record(name, value, labels):
+        seen.append((name, value, labels))
+
+    metrics.add_hook(fail)
+    metrics.add_hook(record)
+    metrics.inc(WS_SENT_BYTES, 3, method="ping")
+
+    metrics.remove_hook(record)
+    metrics.inc(WS_SENT_BYTES, 3, method="ping")
+
+    assert seen == [(WS_SENT_BYTES, 3, {"method": "ping"})]
+    assert metrics.counter(WS_SENT_BYTES, method="ping") == 6
+
+
+def test_open_reply_is_counted_as_wire_status():
+    metrics = MetricsRegistry()
+    observe_ws_event(metrics, {"wire": 1, "wireStatus": "openWireSucceed"}, 40, 0.001)
+
+    assert metrics.counter(WS_RECEIVED_BYTES, method="wireStatus") == 40
+    assert metrics.histogram(WS_EVENT_DECODE_SECONDS, method="wireStatus").count == 1
+
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry(buckets=(1.0,))
+    metrics.observe(REST_REQUEST_SECONDS, 0.5, endpoint='/a"b')
+    metrics.inc(WS_SENT_BYTES, 7, method="ping")
+
+    assert metrics.to_prometheus().splitlines() == [
+        f"# TYPE {REST_REQUEST_SECONDS} histogram",
+        f'{REST_REQUEST_SECONDS}_bucket{{endpoint="/a\\"b",le="1.0"}} 1',
+        f'{REST_REQUEST_SECONDS}_bucket{{endpoint="/a\\"b",le="+Inf"}} 1',
+        f'{REST_REQUEST_SECONDS}_sum{{endpoint="/a\\"b"}} 0.5',
+        f'{REST_REQUEST_SECONDS}_count{{endpoint="/a\\"b"}} 1',
+        f"# TYPE {WS_SENT_BYTES} counter",
+        f'{WS_SENT_BYTES}{{method="ping"}} 7',
+    ]
+
+
+def test_exporter_serves_the_registry():
+    metrics = MetricsRegistry()
+    metrics.inc(WS_SENT_BYTES, 7, method="ping")
+
+    with MetricsExporter(metrics) as exporter:
+        with urllib.request.urlopen(exporter.url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+
+    assert body == metrics.to_prometheus()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def test_client_times_websocket_sends():
+    metrics = MetricsRegistry()
+    casambi = Casambi(
+        api_key="key",
+        email="email",
+        user_password="user",
+        network_password="net",
+        metrics=metrics,
+    )
+    casambi.web_sock = FakeWebSocket()
+
+    casambi.turn_unit_on(unit_id=1)
+    casambi.turn_unit_off(unit_id=1)
+
+    frame_bytes = sum(len(frame) for frame in casambi.web_sock.sent)
+
+    assert metrics.histogram(WS_SEND_SECONDS, method="controlUnit").count == 2
+    assert metrics.counter(WS_SENT_BYTES, method="controlUnit") == frame_bytes
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from casambi.async_casambi_api import AsyncCasambi  # noqa: E402
+from casambi.mock_cloud import (  # noqa: E402
+    SCENE_SIZE,
+    MockCasambiCloud,
+    apply_target_controls,
+    make_scenes,
+    make_unit,
+)
+from casambi.unit_state import CAP_CCT, CAP_RGBW, UnitState  # noqa: E402
+
+
+def test_synthetic_units_cycle_through_the_unit_types():
+    assert UnitState.from_dict(make_unit(3)).supports(CAP_CCT)
+    assert UnitState.from_dict(make_unit(4)).supports(CAP_RGBW)
+    assert UnitState.from_dict(make_unit(5)).capabilities == 1
+
+
+def test_scenes_hold_scene_size_units():
+    scenes = make_scenes(SCENE_SIZE + 3)
+
+    assert list(scenes) == [1, 2]
+    assert scenes[1]["units"] == list(range(1, SCENE_SIZE + 1))
+    assert scenes[2]["units"] == list(range(SCENE_SIZE + 1, SCENE_SIZE + 4))
+
+
+def test_target_controls_update_the_unit():
+    unit = make_unit(4)
+
+    apply_target_controls(
+        unit,
+        {
+            "Dimmer": {"value": 0.5},
+            "RGB": {"hue": 0.3, "sat": 1.0},
+            "Vertical": {"value": 0.2},
+        },
+    )
+    state = UnitState.from_dict(unit)
+
+    assert unit["on"]
+    assert (state.dimmer, state.hue, state.sat, state.vertical) == (0.5, 0.3, 1.0, 0.2)
+
+
+def test_messages_need_an_open_wire():
+    cloud = MockCasambiCloud(units=SCENE_SIZE)
+    session = cloud._new_session()
+    wires = {}
+
+    control = {"wire": 1, "method": "controlUnit", "id": 1}
+
+    assert cloud._handle_message(control, wires) == []
+    assert cloud._handle_message(
+        {"wire": 1, "method": "open", "id": "other", "session": session}, wires
+    ) == [{"wire": 1, "wireStatus": "openWireFailed"}]
+    assert cloud._handle_message(
+        {"wire": 1, "method": "open", "id": cloud.network_id, "session": "old"}, wires
+    ) == [{"wire": 1, "wireStatus": "invalidSession"}]
+    assert cloud._handle_message(
+        {"wire": 1, "method": "open", "id": cloud.network_id, "session": session},
+        wires,
+    ) == [{"wire": 1, "wireStatus": "openWireSucceed"}]
+
+    events = cloud._handle_message(
+        {"wire": 1, "method": "controlScene", "id": 1, "level": 1}, wires
+    )
+
+    assert [event["id"] for event in events] == list(range(1, SCENE_SIZE + 1))
+    assert all(cloud.units[unit_id]["on"] for unit_id in range(1, SCENE_SIZE + 1))
+    assert cloud.commands == 1
+
+
+def test_async_client_against_the_mock_cloud():
+    async def run(cloud):
+        async with AsyncCasambi(
+            api_key="key",
+            email="email",
+            user_password="user",
+            network_password="net",
+            api_url=cloud.api_url,
+            ws_url=cloud.ws_url,
+        ) as casambi:
+            await casambi.login()
+            assert casambi.network_id == cloud.network_id
+
+            assert len(await casambi.get_unit_list()) == 3
+            assert await casambi.unit_supports_color_temperature(unit_id=3)
+
+            # The client logs in again after the sessions expired
+            cloud.expire_sessions()
+            assert (await casambi.get_unit_state(unit_id=1))["id"] == 1
+
+            await casambi.ws_open()
+            await casambi.turn_unit_on(unit_id=2)
+
+            return await casambi.ws_recieve_message()
+
+    with MockCasambiCloud(units=3) as cloud:
+        event = asyncio.run(run(cloud))
+
+    assert (event["method"], event["id"], event["on"]) == ("unitChanged", 2, True)
+    assert cloud.units[2]["dimLevel"] == 1.0
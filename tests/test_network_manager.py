@@ -0,0 +1,214 @@
+import json
+
+import pytest
+
+from casambi.exceptions import CasambiApiException
+from casambi.session_store import SessionStore
+import casambi.network_manager as network_manager
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeHttpSession:
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.posts = []
+        self.closed = False
+
+    def post(self, url, json=None):
+        self.posts.append((url, json))
+        return self.responses.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+
+def manager(monkeypatch, responses=(), **kwargs):
+    http = FakeHttpSession(responses)
+    monkeypatch.setattr(network_manager, "create_http_session", lambda **_: http)
+
+    return network_manager.CasambiNetworkManager(
+        api_key="key",
+        email="user@example.com",
+        user_password="user",
+        network_password="net",
+        **kwargs,
+    )
+
+
+def sessions_response(*network_ids):
+    return FakeResponse(
+        200,
+        {
+            network_id: {"sessionId": f"session-{network_id}"}
+            for network_id in network_ids
+        },
+    )
+
+
+def test_create_network_sessions_creates_a_client_per_network(monkeypatch):
+    networks = manager(monkeypatch, [sessions_response("a", "b")])
+
+    assert networks.create_network_sessions() == ["a", "b"]
+    assert sorted(networks) == ["a", "b"]
+
+    client = networks["a"]
+    assert client.network_id == "a"
+    assert client._session_id == "session-a"
+    assert client._http is networks._http
+
+    # Wire ids are unique within the manager
+    assert {networks["a"].wire_id, networks["b"].wire_id} == {1, 2}
+
+
+def test_create_network_sessions_failure_raises(monkeypatch):
+    networks = manager(monkeypatch, [FakeResponse(401, {"error": "denied"})])
+
+    with pytest.raises(CasambiApiException):
+        networks.create_network_sessions()
+
+
+def test_create_clients_keeps_existing_and_closes_removed(monkeypatch):
+    networks = manager(monkeypatch)
+
+    networks._create_clients({"a": "s1", "b": "s2"})
+    client_a = networks["a"]
+    client_b = networks["b"]
+    closed = []
+    client_b.close = lambda: closed.append("b")
+
+    networks._create_clients({"a": "s3", "c": "s4"})
+
+    assert networks["a"] is client_a
+    assert client_a._session_id == "s3"
+    assert sorted(networks) == ["a", "c"]
+    assert closed == ["b"]
+    assert networks["c"].wire_id == 3
+
+
+def test_unknown_network_raises(monkeypatch):
+    networks = manager(monkeypatch)
+
+    with pytest.raises(CasambiApiException):
+        networks.get_client("missing")
+
+
+def test_restore_sessions_from_the_store(monkeypatch, tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.json"))
+    networks = manager(monkeypatch, [sessions_response("a")], session_store=store)
+
+    assert not networks.restore_sessions()
+
+    networks.create_network_sessions()
+
+    restored = manager(monkeypatch, session_store=store)
+    assert restored.restore_sessions()
+    assert restored["a"]._session_id == "session-a"
+
+
+def test_login_skips_the_network_session_when_restored(monkeypatch, tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.json"))
+    store.save(
+        "public-networks:user@example.com",
+        {"networks": {"a": "saved"}},
+        expires=2 ** 40,
+    )
+    networks = manager(monkeypatch, session_store=store)
+
+    networks.login()
+
+    assert networks._http.posts == []
+    assert networks["a"]._session_id == "saved"
+
+
+def test_restore_sessions_without_store(monkeypatch):
+    assert not manager(monkeypatch).restore_sessions()
+
+
+def test_commands_are_routed_per_network(monkeypatch):
+    networks = manager(monkeypatch)
+    networks._create_clients({"a": "s1", "b": "s2"})
+
+    for client in networks.networks.values():
+        client.web_sock = FakeWebSocket()
+
+    networks.turn_unit_on(network_id="a", unit_id=1)
+    networks.set_unit_value(network_id="b", unit_id=2, value=0.5)
+
+    assert networks["a"].web_sock.sent == [
+        {
+            "wire": networks["a"].wire_id,
+            "method": "controlUnit",
+            "id": 1,
+            "targetControls": {"Dimmer": {"value": 1}},
+        }
+    ]
+    assert [message["id"] for message in networks["b"].web_sock.sent] == [2]
+    assert networks["b"].web_sock.sent[0]["wire"] == networks["b"].wire_id
+
+
+def test_bulk_commands_are_routed_per_network(monkeypatch):
+    networks = manager(monkeypatch)
+    networks._create_clients({"a": "s1", "b": "s2"})
+
+    for client in networks.networks.values():
+        client.web_sock = FakeWebSocket()
+
+    dimmer = {"Dimmer": {"value": 1}}
+    results = networks.set_units_target_controls(
+        target_controls={("a", 1): dimmer, ("b", 1): dimmer, ("x", 1): dimmer}
+    )
+
+    assert results[("a", 1)] is None
+    assert results[("b", 1)] is None
+    assert isinstance(results[("x", 1)], CasambiApiException)
+    assert len(networks["a"].web_sock.sent) == 1
+    assert len(networks["b"].web_sock.sent) == 1
+
+
+def test_event_callbacks_get_the_network_id(monkeypatch):
+    networks = manager(monkeypatch)
+    networks._create_clients({"a": "s1", "b": "s2"})
+    received = []
+
+    def callback(network_id, message):
+        received.append((network_id, message["id"]))
+
+    networks.add_event_callback(callback, method="unitChanged")
+
+    networks["b"]._event_callbacks.dispatch({"method": "unitChanged", "id": 3})
+    networks["a"]._event_callbacks.dispatch({"method": "unitChanged", "id": 4})
+
+    assert received == [("b", 3), ("a", 4)]
+
+    networks.remove_event_callback(callback)
+    networks["a"]._event_callbacks.dispatch({"method": "unitChanged", "id": 5})
+
+    assert len(received) == 2
+
+
+def test_close_closes_clients_and_the_shared_session(monkeypatch):
+    networks = manager(monkeypatch)
+    networks._create_clients({"a": "s1"})
+    http = networks._http
+
+    networks.close()
+
+    assert len(networks) == 0
+    assert http.closed
@@ -0,0 +1,81 @@
+from casambi.network_state import NetworkStateMirror
+from casambi.unit_state import CAP_CCT, CAP_DIMMER, UnitState
+
+UNIT = {
+    "id": 1,
+    "name": "Desk",
+    "on": True,
+    "controls": [
+        [
+            {"type": "Dimmer", "value": 0.2},
+            {"type": "CCT", "value": 3000, "min": 2200, "max": 6000},
+        ]
+    ],
+}
+
+
+def seeded_mirror():
+    mirror = NetworkStateMirror()
+    mirror.seed(
+        network_state={"units": {"1": UNIT}},
+        unit_list={"1": {"id": 1, "fixtureId": 7}},
+    )
+
+    return mirror
+
+
+def test_seed_parses_the_units():
+    state = seeded_mirror().get_unit_state_model(1)
+
+    assert state.dimmer == 0.2
+    assert state.cct == 3000
+    assert state.capabilities == CAP_DIMMER | CAP_CCT
+
+
+def test_event_updates_the_parsed_state():
+    mirror = seeded_mirror()
+    before = mirror.get_unit_state_model(1)
+
+    state = mirror.apply_event(
+        {
+            "method": "unitChanged",
+            "wire": 1,
+            "id": 1,
+            "on": False,
+            "controls": [{"type": "Dimmer", "value": 0.7}],
+        }
+    )
+
+    assert state is mirror.get_unit_state_model(1)
+    assert state == UnitState.from_dict(mirror.get_unit_state(1), unit_id=1)
+    assert state.dimmer == 0.7
+    assert state.capabilities == CAP_DIMMER
+
+    # States are replaced, not changed
+    assert before.dimmer == 0.2
+
+
+def test_event_without_controls_keeps_them():
+    mirror = seeded_mirror()
+
+    state = mirror.apply_event({"method": "unitChanged", "id": 1, "on": False})
+
+    assert state.on is False
+    assert state.cct == 3000
+
+
+def test_events_during_seed_are_replayed():
+    mirror = NetworkStateMirror()
+    mirror.begin_seed()
+    mirror.apply_event({"method": "unitChanged", "id": 1, "on": False})
+    mirror.seed(network_state={"units": [UNIT]})
+
+    assert mirror.get_unit_state_model(1).on is False
+    assert mirror.get_unit_state(1)["on"] is False
+
+
+def test_other_methods_are_ignored():
+    mirror = seeded_mirror()
+
+    assert mirror.apply_event({"method": "peerChanged", "online": True}) is None
+    assert mirror.events == 0
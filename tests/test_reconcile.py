@@ -0,0 +1,174 @@
+import json
+
+import pytest
+
+from casambi.public_casambi_api import Casambi
+from casambi.reconcile import plan
+from casambi.unit_state import CAP_CCT, CAP_DIMMER, CAP_RGB, UnitState
+
+
+def unit(unit_id, **kwargs):
+    kwargs.setdefault("capabilities", CAP_DIMMER)
+    kwargs.setdefault("dimmer", 0.0)
+
+    return UnitState(unit_id=unit_id, **kwargs)
+
+
+def network(*unit_ids, **kwargs):
+    return {unit_id: unit(unit_id, **kwargs) for unit_id in unit_ids}
+
+
+def test_frames_have_the_desired_value():
+    (frames, report) = plan({1: {"Dimmer": 0.5}}, network(1, 2))
+
+    assert frames == [("controlUnit", 1, {"Dimmer": {"value": 0.5}})]
+    assert not report.skipped
+
+
+def test_values_are_clamped():
+    (frames, _) = plan({1: {"Dimmer": 1.5}}, network(1))
+
+    assert frames == [("controlUnit", 1, {"Dimmer": {"value": 1}})]
+
+
+def test_values_at_the_same_level_are_unchanged():
+    (frames, report) = plan({1: {"Dimmer": 0.501}}, network(1, dimmer=0.5))
+
+    assert frames == []
+    assert report.skipped == {1: "Dimmer unchanged"}
+
+
+def test_unknown_and_unsupported_are_skipped():
+    (frames, report) = plan({1: {"CCT": 3000}, 9: {"Dimmer": 1}}, network(1))
+
+    assert frames == []
+    assert report.skipped == {1: "CCT not supported", 9: "unknown unit"}
+
+
+def test_unknown_control_raises():
+    with pytest.raises(ValueError):
+        plan({1: {"Brightness": 1}}, network(1))
+
+
+def test_color_temperature_is_snapped_and_clamped():
+    current = network(
+        1, capabilities=CAP_CCT, dimmer=None, cct=3000, cct_min=2200, cct_max=6000
+    )
+
+    (frames, _) = plan({1: {"CCT": 3010}}, current)
+    assert frames == [
+        (
+            "controlUnit",
+            1,
+            {"ColorTemperature": {"value": 3050}, "Colorsource": {"source": "TW"}},
+        )
+    ]
+
+    (frames, _) = plan({1: {"CCT": 9000}}, current)
+    assert frames[0][2]["ColorTemperature"] == {"value": 6000}
+
+    (frames, report) = plan({1: {"CCT": 2990}}, current)
+    assert frames == []
+    assert report.skipped == {1: "CCT unchanged"}
+
+
+def test_rgb_is_sent_as_hue_and_sat():
+    current = network(1, capabilities=CAP_RGB, dimmer=None, hue=0.0, sat=0.0)
+
+    (frames, _) = plan({1: {"RGB": (0, 0, 255)}}, current)
+    assert frames[0][2] == {
+        "RGB": {"hue": 0.7, "sat": 1.0},
+        "Colorsource": {"source": "RGB"},
+    }
+
+    (frames, _) = plan({1: {"RGB": (0.66, 0.99)}}, current)
+    assert frames[0][2]["RGB"] == {"hue": 0.66, "sat": 0.99}
+
+
+def test_network_shortcut_has_the_desired_value():
+    (frames, _) = plan(
+        {unit_id: {"Dimmer": 0.5} for unit_id in (1, 2, 3)}, network(1, 2, 3)
+    )
+
+    assert frames == [("controlNetwork", None, {"Dimmer": {"value": 0.5}})]
+
+
+def test_no_network_shortcut_for_a_part_of_the_network():
+    (frames, _) = plan({1: {"Dimmer": 0.5}, 2: {"Dimmer": 0.5}}, network(1, 2, 3))
+
+    assert [frame[0] for frame in frames] == ["controlUnit", "controlUnit"]
+
+
+def test_no_shortcuts_when_disabled():
+    (frames, _) = plan(
+        {unit_id: {"Dimmer": 0.5} for unit_id in (1, 2, 3)},
+        network(1, 2, 3),
+        shortcuts=False,
+    )
+
+    assert len(frames) == 3
+
+
+def test_scene_shortcut_turns_off_a_scene():
+    current = network(1, 2, 3, 4, dimmer=1.0)
+    scenes = {7: {"id": 7, "units": [1, 2, 3]}}
+    desired = {1: {"Dimmer": 0}, 2: {"Dimmer": 0}, 3: {"Dimmer": 0}}
+
+    (frames, _) = plan(desired, current, scenes=scenes)
+
+    assert frames == [("controlScene", 7, {"level": 0})]
+
+
+def test_network_shortcut_keeps_other_controls():
+    current = network(
+        1, 2, capabilities=CAP_DIMMER | CAP_CCT, cct=3000, cct_min=2000, cct_max=6000
+    )
+    desired = {1: {"Dimmer": 1, "CCT": 4000}, 2: {"Dimmer": 1}}
+
+    (frames, _) = plan(desired, current)
+
+    assert frames == [
+        ("controlNetwork", None, {"Dimmer": {"value": 1}}),
+        (
+            "controlUnit",
+            1,
+            {"ColorTemperature": {"value": 4000}, "Colorsource": {"source": "TW"}},
+        ),
+    ]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+
+def test_apply_state_sends_the_desired_value(monkeypatch):
+    casambi = Casambi(
+        api_key="key", email="email", user_password="user", network_password="net"
+    )
+    casambi.web_sock = FakeWebSocket()
+    monkeypatch.setattr(
+        casambi,
+        "get_network_state",
+        lambda: {
+            "units": {
+                "1": {"id": 1, "controls": [{"type": "Dimmer", "value": 0.0}]},
+                "2": {"id": 2, "controls": [{"type": "Dimmer", "value": 0.0}]},
+            }
+        },
+    )
+
+    report = casambi.apply_state({1: {"Dimmer": 0.5}})
+
+    assert report.frames == 1
+    assert casambi.web_sock.sent[0]["targetControls"] == {"Dimmer": {"value": 0.5}}
+
+    report = casambi.apply_state(
+        {1: {"Dimmer": 0.0}}, shortcuts=False, dry_run=True
+    )
+
+    assert report.dry_run
+    assert report.skipped == {1: "Dimmer unchanged"}
@@ -0,0 +1,150 @@
+import json
+import os
+import time
+
+import pytest
+
+from casambi import Casambi
+from casambi.exceptions import CasambiApiException
+from casambi.session_store import SessionStore, select_network_id
+
+
+def test_select_network_id_keeps_the_current_network():
+    assert select_network_id("b", ["a", "b"]) == "b"
+
+
+def test_select_network_id_defaults_to_the_first_network():
+    assert select_network_id(None, ["a", "b"]) == "a"
+    assert select_network_id("gone", {"a": {}, "b": {}}.keys()) == "a"
+
+
+def test_select_network_id_without_networks():
+    with pytest.raises(ValueError):
+        select_network_id(None, [])
+
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeHttpSession:
+    """
+    Logs in with a new session each time, GETs are answered from statuses
+    """
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.logins = 0
+        self.get_sessions = []
+
+    def post(self, url, json=None):
+        if url.endswith("/users/session/"):
+            self.logins += 1
+            return FakeResponse(
+                200,
+                {
+                    "sessionId": f"user-{self.logins}",
+                    "networks": {"home": {"id": "net"}},
+                },
+            )
+
+        return FakeResponse(200, {"net": {"sessionId": f"net-{self.logins}"}})
+
+    def get(self, url, headers=None):
+        self.get_sessions.append(headers["X-Casambi-Session"])
+        status_code = self.statuses.pop(0)
+
+        return FakeResponse(status_code, {"id": "net"} if status_code == 200 else {})
+
+    def close(self):
+        pass
+
+
+def make_casambi(http, **kwargs):
+    return Casambi(
+        api_key="key",
+        email="user@example.com",
+        user_password="user",
+        network_password="net",
+        http_session=http,
+        **kwargs,
+    )
+
+
+def test_rejected_session_logs_in_again_once():
+    http = FakeHttpSession([401, 200])
+    casambi = make_casambi(http)
+    casambi.login()
+
+    assert casambi.get_network_information() == {"id": "net"}
+    assert http.logins == 2
+    assert http.get_sessions == ["net-1", "net-2"]
+
+
+def test_rejected_retry_is_not_retried_again():
+    http = FakeHttpSession([401, 401])
+    casambi = make_casambi(http)
+    casambi.login()
+
+    with pytest.raises(CasambiApiException):
+        casambi.get_network_information()
+
+    assert http.logins == 2
+    assert http.get_sessions == ["net-1", "net-2"]
+
+
+def test_saved_session_is_restored(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.json"))
+
+    http = FakeHttpSession()
+    make_casambi(http, session_store=store).login()
+    assert http.logins == 1
+
+    http = FakeHttpSession()
+    casambi = make_casambi(http, session_store=store)
+    casambi.login()
+
+    assert http.logins == 0
+    assert (casambi.network_id, casambi._session_id) == ("net", "net-1")
+    assert os.stat(store.path).st_mode & 0o777 == 0o600
+
+
+def test_expired_session_is_not_restored(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.json"))
+    store.save(
+        "public:user@example.com",
+        {"session_id": "old", "network_id": "net"},
+        expires=time.time() - 1,
+    )
+
+    http = FakeHttpSession()
+    casambi = make_casambi(http, session_store=store)
+    casambi.login()
+
+    assert http.logins == 1
+    assert casambi._session_id == "net-1"
+
+
+def test_relogin_replaces_the_saved_session(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.json"))
+    http = FakeHttpSession([401, 200])
+    casambi = make_casambi(http, session_store=store)
+    casambi.login()
+
+    casambi.get_network_information()
+
+    assert store.load("public:user@example.com")["session_id"] == "net-2"
+
+
+def test_corrupt_store_is_ignored(tmp_path):
+    path = tmp_path / "sessions.json"
+    path.write_text("{not json")
+
+    assert SessionStore(str(path)).load("public:user@example.com") is None
@@ -0,0 +1,109 @@
+import pytest
+
+from casambi.unit_index import UnitIndex
+
+UNIT_LIST = {
+    "1": {"id": 1, "name": "Desk", "groupId": 10, "fixtureId": 100, "address": "a1"},
+    "2": {"id": 2, "name": "desk ", "groupId": 10, "fixtureId": 200, "address": "a2"},
+    "3": {"id": 3, "name": "Hall", "groupId": 20, "fixtureId": 100, "address": "a3"},
+}
+
+UNIT_STATES = {
+    "1": {
+        "id": 1,
+        "controls": [
+            {"type": "Dimmer", "value": 1},
+            {"type": "CCT", "value": 3000, "min": 2200, "max": 6500},
+        ],
+    },
+    "2": {"id": 2, "controls": [{"type": "Dimmer", "value": 0}]},
+    "3": {
+        "id": 3,
+        "controls": [[{"type": "Color", "hue": 0}, {"type": "White", "value": 1}]],
+    },
+}
+
+SCENES = {"5": {"id": 5, "name": "Evening", "units": {"1": {}, "3": {}, "9": {}}}}
+
+GROUPS = [{"id": 10, "name": "Office 2"}, {"id": 20, "name": "Corridor"}]
+
+
+def make_index():
+    index = UnitIndex()
+    index.build(
+        unit_list=UNIT_LIST, scenes_list=SCENES, unit_states=UNIT_STATES, groups=GROUPS
+    )
+
+    return index
+
+
+def test_lookups():
+    index = make_index()
+
+    assert index.units_by_name("DESK") == {1, 2}
+    assert index.units_by_group(10) == {1, 2}
+    assert index.units_by_fixture(100) == {1, 3}
+    assert index.unit_by_address("a3") == 3
+    assert index.unit_by_address("missing") is None
+    assert index.units_with_capability("Dimmer") == {1, 2}
+    assert index.units_with_capability("RGBW") == {3}
+    assert index.scenes_by_name("evening") == {5}
+    assert index.groups_by_name("office 2") == {10}
+    assert index.fixture_ids() == {100, 200}
+
+    with pytest.raises(ValueError):
+        index.units_with_capability("Laser")
+
+
+def test_select_intersects_the_selectors():
+    index = make_index()
+
+    assert index.select(group_name="Office 2", capability="CCT") == {1}
+    assert index.select(scene_id=5) == {1, 3}
+    assert index.select(name="desk", fixture_id=100) == {1}
+    assert index.select(name="desk", group_id=20) == set()
+    assert index.select() == {1, 2, 3}
+
+
+def test_event_reindexes_only_the_unit():
+    index = make_index()
+
+    assert index.apply_event(
+        {"method": "unitChanged", "id": 2, "wire": 1, "name": "Lamp", "groupId": 20}
+    )
+    assert not index.apply_event({"method": "peerChanged", "id": 2})
+
+    assert index.units_by_name("desk") == {1}
+    assert index.units_by_name("lamp") == {2}
+    assert index.units_by_group(20) == {2, 3}
+    assert index.units_by_fixture(200) == {2}
+    assert "wire" not in index.get_units()[2]
+
+    index.remove_unit(unit_id=2)
+
+    assert index.units_by_name("lamp") == set()
+    assert index.units_with_capability("Dimmer") == {1}
+    assert 200 not in index.fixture_ids()
+
+
+def test_rebuild_replaces_the_content():
+    index = make_index()
+    index.build(unit_list={"4": {"id": 4, "name": "Desk"}})
+
+    assert index.units_by_name("desk") == {4}
+    assert index.units_by_group(10) == set()
+    assert index.units_with_capability("Dimmer") == set()
+    assert index.scenes_by_name("evening") == set()
+
+
+def test_events_during_a_build_are_applied_again():
+    index = UnitIndex()
+    index.begin_build()
+
+    # Received after the unit list below was read
+    index.apply_event({"method": "unitChanged", "id": 1, "name": "Renamed"})
+
+    index.build(unit_list={"1": {"id": 1, "name": "Desk"}})
+
+    assert index.units_by_name("renamed") == {1}
+    assert index.units_by_name("desk") == set()
@@ -0,0 +1,105 @@
+import pytest
+
+from casambi.unit_state import (
+    CAP_CCT,
+    CAP_DIMMER,
+    CAP_RGB,
+    CAP_RGBW,
+    CAP_VERTICAL,
+    CAP_WHITE,
+    UnitState,
+)
+
+STATE = {
+    "id": "7",
+    "name": "Desk",
+    "on": True,
+    "online": True,
+    "controls": [
+        [
+            {"type": "Dimmer", "value": 0.5},
+            {"type": "Color", "hue": 0.25, "sat": 1.0},
+            {"type": "White", "value": 0.1},
+        ],
+        [{"type": "CCT", "value": 3000, "min": 2200, "max": 6500}],
+    ],
+}
+
+
+def test_controls_are_parsed_into_fields_and_bits():
+    state = UnitState.from_dict(STATE)
+
+    assert state.unit_id == 7
+    assert (state.name, state.on, state.online) == ("Desk", True, True)
+    assert (state.dimmer, state.hue, state.sat, state.white) == (0.5, 0.25, 1.0, 0.1)
+    assert (state.cct, state.cct_min, state.cct_max) == (3000, 2200, 6500)
+    assert state.vertical is None
+    assert state.capabilities == CAP_DIMMER | CAP_RGB | CAP_WHITE | CAP_CCT
+
+
+@pytest.mark.parametrize(
+    "controls, capabilities",
+    [
+        ([], 0),
+        ([{"type": "Dimmer"}], CAP_DIMMER),
+        ([{"type": "Vertical", "value": 0.3}], CAP_VERTICAL),
+        ([{"type": "Color"}], CAP_RGB),
+        ([[{"type": "Color"}, {"type": "White"}]], CAP_RGBW),
+        ([{"type": "Unknown"}], 0),
+    ],
+)
+def test_flat_and_nested_controls(controls, capabilities):
+    state = UnitState.from_dict({"controls": controls}, unit_id=1)
+
+    assert state.capabilities == capabilities
+
+
+def test_supports_needs_every_bit():
+    state = UnitState.from_dict(
+        {"controls": [{"type": "Dimmer"}, {"type": "Color"}]}, unit_id=1
+    )
+
+    assert state.supports_dimmer
+    assert state.supports_rgb
+    assert not state.supports_rgbw
+    assert not state.supports(CAP_DIMMER | CAP_CCT)
+    assert not state.supports_vertical
+    assert not state.supports_color_temperature
+
+
+def test_slots_keep_the_state_compact():
+    state = UnitState(unit_id=1)
+
+    assert not hasattr(state, "__dict__")
+
+    with pytest.raises(AttributeError):
+        state.brightness = 1
+
+
+def test_updated_is_copy_on_write():
+    state = UnitState.from_dict(STATE)
+
+    renamed = state.updated({"name": "Lamp", "on": False})
+
+    assert (renamed.name, renamed.on) == ("Lamp", False)
+    assert renamed.capabilities == state.capabilities
+    assert state.name == "Desk"
+
+    controls = {"controls": [{"type": "Dimmer", "value": 0.1}]}
+    dimmed = state.updated(controls)
+
+    assert dimmed.dimmer == 0.1
+    assert dimmed.capabilities == CAP_DIMMER
+    assert (dimmed.hue, dimmed.cct, dimmed.cct_max) == (None, None, 0)
+    assert state.capabilities != CAP_DIMMER
+
+    assert dimmed == UnitState.from_dict({**STATE, **controls})
+
+
+def test_equality_and_repr():
+    state = UnitState.from_dict(STATE)
+
+    assert state == UnitState.from_dict(STATE)
+    assert state != state.updated({"on": False})
+    assert "vertical" not in repr(state)
+    assert "name='Desk'" in repr(state)
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from casambi import Casambi
+from casambi.exceptions import CasambiApiException
+from casambi.ws_multiplexer import WebSocketMultiplexer
+
+
+class FakeWebSocket:
+    """
+    Records sent frames and answers open messages on the multiplexer
+    """
+
+    def __init__(self, multiplexer):
+        self.multiplexer = multiplexer
+        self.sent = []
+
+    def send(self, data):
+        message = json.loads(data)
+        self.sent.append(message)
+
+        if message.get("method") == "open":
+            self.multiplexer._dispatch(
+                {"wire": message["wire"], "wireStatus": "openWireSucceed"}
+            )
+
+    def close(self):
+        pass
+
+
+def make_multiplexer():
+    multiplexer = WebSocketMultiplexer(api_key="key", open_timeout=1.0)
+    multiplexer.web_sock = FakeWebSocket(multiplexer)
+
+    return multiplexer
+
+
+def make_client(*, wire_id, network_id):
+    casambi = Casambi(
+        api_key="key",
+        email="email",
+        user_password="user",
+        network_password="net",
+        wire_id=wire_id,
+    )
+    casambi._session_id = f"session-{network_id}"
+    casambi.network_id = network_id
+
+    return casambi
+
+
+def test_frames_are_routed_on_wire_id_to_each_network():
+    multiplexer = make_multiplexer()
+    first = make_client(wire_id=1, network_id="network-1")
+    second = make_client(wire_id=2, network_id="network-2")
+
+    assert first.ws_open(multiplexer=multiplexer)
+    assert second.ws_open(multiplexer=multiplexer)
+
+    first_events = []
+    second_events = []
+    first.add_event_callback(first_events.append, method="unitChanged")
+    second.add_event_callback(second_events.append, method="unitChanged")
+
+    multiplexer._dispatch({"wire": 1, "method": "unitChanged", "id": 10})
+    multiplexer._dispatch({"wire": 2, "method": "unitChanged", "id": 20})
+    multiplexer._dispatch({"wire": 1, "method": "unitChanged", "id": 11})
+    multiplexer._dispatch({"wire": 3, "method": "unitChanged", "id": 30})
+
+    assert [message["id"] for message in first_events] == [10, 11]
+    assert [message["id"] for message in second_events] == [20]
+    assert multiplexer.unrouted == 1
+    assert sorted(multiplexer.wires) == [1, 2]
+
+    opens = multiplexer.web_sock.sent
+    assert [(message["wire"], message["id"]) for message in opens] == [
+        (1, "network-1"),
+        (2, "network-2"),
+    ]
+
+
+def test_closed_wire_is_no_longer_routed():
+    multiplexer = make_multiplexer()
+    received = []
+
+    multiplexer.open_wire(
+        wire_id=1, network_id="network-1", session_id="s", handler=received.append
+    )
+    multiplexer.wire(1).close()
+    multiplexer._dispatch({"wire": 1, "method": "unitChanged"})
+
+    assert received == []
+    assert multiplexer.unrouted == 1
+
+
+def test_wire_id_can_only_be_opened_once():
+    multiplexer = make_multiplexer()
+    multiplexer.open_wire(
+        wire_id=1, network_id="network-1", session_id="s", handler=print
+    )
+
+    with pytest.raises(CasambiApiException):
+        multiplexer.open_wire(
+            wire_id=1, network_id="network-2", session_id="s", handler=print
+        )
+
+
+def test_multiplexed_wire_can_not_be_supervised():
+    multiplexer = make_multiplexer()
+    casambi = make_client(wire_id=1, network_id="network-1")
+    casambi.ws_open(multiplexer=multiplexer)
+
+    with pytest.raises(CasambiApiException):
+        casambi.ws_start_supervisor()
@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+
+from casambi.ws_reader import EventCallbacks, WebSocketReader
+
+
+def test_callbacks_are_filtered_on_method_and_unit():
+    callbacks = EventCallbacks()
+    everything = []
+    unit_changed = []
+    unit_2 = []
+
+    callbacks.add(everything.append)
+    callbacks.add(unit_changed.append, method="unitChanged")
+    callbacks.add(unit_2.append, method="unitChanged", unit_id="2")
+
+    callbacks.dispatch({"method": "unitChanged", "id": 1})
+    callbacks.dispatch({"method": "unitChanged", "id": 2})
+    callbacks.dispatch({"method": "peerChanged"})
+
+    assert len(everything) == 3
+    assert [message["id"] for message in unit_changed] == [1, 2]
+    assert [message["id"] for message in unit_2] == [2]
+
+
+def test_failing_callback_does_not_stop_dispatch():
+    callbacks = EventCallbacks()
+    received = []
+
+    def fail(message):
+        raise RuntimeError("callback failed")
+
+    callbacks.add(fail)
+    callbacks.add(received.append)
+    callbacks.dispatch({"method": "unitChanged"})
+
+    assert callbacks.errors == 1
+    assert len(received) == 1
+
+
+def test_removed_callback_is_not_called():
+    callbacks = EventCallbacks()
+    received = []
+
+    def callback(message):
+        received.append(message)
+
+    callbacks.add(callback)
+    callbacks.remove(callback)
+    callbacks.dispatch({"method": "unitChanged"})
+
+    assert received == []
+
+
+def test_full_queue_drops_the_oldest_message():
+    reader = WebSocketReader(web_sock=None, dispatch=lambda message: None, queue_size=2)
+
+    for index in range(3):
+        reader._enqueue({"index": index})
+
+    assert reader.dropped == 1
+    assert [reader._queue.get_nowait()["index"] for _ in range(2)] == [1, 2]
+
+
+class FakeWebSocket:
+    """
+    Returns frames from recv_data and then reports the connection as closed
+    """
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv_data(self, control_frame=False):
+        import websocket
+
+        if not self.frames:
+            raise websocket.WebSocketConnectionClosedException("closed")
+
+        return self.frames.pop(0)
+
+
+def test_reader_dispatches_and_reports_disconnect():
+    websocket = pytest.importorskip("websocket")
+    text = websocket.ABNF.OPCODE_TEXT
+
+    received = []
+    disconnected = threading.Event()
+
+    reader = WebSocketReader(
+        web_sock=FakeWebSocket(
+            [
+                (text, json.dumps({"method": "unitChanged", "id": 1}).encode()),
+                (text, b"not json"),
+                (websocket.ABNF.OPCODE_PONG, b""),
+                (text, json.dumps({"method": "unitChanged", "id": 2}).encode()),
+            ]
+        ),
+        dispatch=received.append,
+        on_disconnect=lambda reason: disconnected.set(),
+    )
+    reader.start()
+
+    assert disconnected.wait(5)
+    reader.stop(timeout=5)
+
+    assert [message["id"] for message in received] == [1, 2]
+    assert reader.received == 2
+    assert reader.decode_errors == 1
@@ -0,0 +1,226 @@
+import time
+
+from casambi.ws_supervisor import WebSocketSupervisor, backoff_delay
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = 0
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self):
+        self.closed += 1
+
+
+class FakeIndex:
+    pass
+
+
+class FakeCasambi:
+    """
+    Client with ws_open results in open_results, True opens the wire,
+    a wire status refuses it
+    """
+
+    def __init__(self, open_results):
+        self.open_results = list(open_results)
+        self.web_sock = FakeWebSocket()
+        self.ws_reader = None
+        self.state_mirror = None
+        self.unit_index = None
+        self.wire_status = None
+
+        self.reseed_error = None
+        self.stop_reader_errors = []
+
+        self.logins = 0
+        self.mirror_refreshes = 0
+        self.index_builds = 0
+
+    def ws_stop_reader(self):
+        if self.stop_reader_errors:
+            raise self.stop_reader_errors.pop(0)
+
+    def ws_open(self):
+        result = self.open_results.pop(0)
+
+        if isinstance(result, Exception):
+            raise result
+
+        if result is True:
+            self.wire_status = "openWireSucceed"
+            return True
+
+        self.wire_status = result
+        return False
+
+    def create_user_session(self):
+        self.logins += 1
+
+    def create_network_session(self):
+        pass
+
+    def refresh_state_mirror(self):
+        self.mirror_refreshes += 1
+
+        if self.reseed_error:
+            raise self.reseed_error
+
+    def build_unit_index(self):
+        self.index_builds += 1
+
+        if self.reseed_error:
+            raise self.reseed_error
+
+
+def supervisor(casambi, **kwargs):
+    # Never started, _reconnect is called directly, no backoff delay
+    return WebSocketSupervisor(casambi=casambi, backoff_base=0.0, **kwargs)
+
+
+def test_backoff_delay_is_capped(monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+
+    delays = [backoff_delay(attempt, base=1.0, maximum=10.0) for attempt in range(6)]
+
+    assert delays == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_backoff_delay_is_jittered(monkeypatch):
+    monkeypatch.setattr("random.uniform", lambda low, high: low)
+
+    assert backoff_delay(3, base=1.0, maximum=10.0) == 0
+
+
+def test_commands_are_queued_while_down_and_replayed():
+    casambi = FakeCasambi([True])
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher.send("a")
+    watcher.send("b")
+
+    assert casambi.web_sock.sent == []
+    assert watcher.metrics()["queued_commands"] == 2
+
+    watcher._reconnect()
+
+    assert casambi.web_sock.sent == ["a", "b"]
+    assert watcher.connected
+    assert watcher.reconnects == 1
+    assert watcher.replayed_commands == 2
+    assert watcher.metrics()["queued_commands"] == 0
+
+
+def test_queued_commands_are_dropped_without_replay():
+    casambi = FakeCasambi([True])
+    watcher = supervisor(casambi, replay_queued=False)
+
+    watcher.notify_disconnect("test")
+    watcher.send("a")
+    watcher._reconnect()
+
+    assert casambi.web_sock.sent == []
+    assert watcher.dropped_commands == 1
+
+
+def test_oldest_queued_commands_are_dropped():
+    casambi = FakeCasambi([True])
+    watcher = supervisor(casambi, max_queued=2)
+
+    watcher.notify_disconnect("test")
+    for message in ("a", "b", "c"):
+        watcher.send(message)
+
+    watcher._reconnect()
+
+    assert casambi.web_sock.sent == ["b", "c"]
+    assert watcher.dropped_commands == 1
+
+
+def test_failed_attempts_are_retried():
+    casambi = FakeCasambi([OSError("refused"), "keyAuthorizeFailed", True])
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher._reconnect()
+
+    assert watcher.connected
+    assert watcher.reconnect_failures == 2
+    assert casambi.logins == 0
+
+
+def test_invalid_session_logs_in_again():
+    casambi = FakeCasambi(["invalidSession", True])
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher._reconnect()
+
+    assert watcher.connected
+    assert watcher.reauthentications == 1
+    assert casambi.logins == 1
+
+
+def test_mirror_and_index_are_seeded_again():
+    casambi = FakeCasambi([True])
+    casambi.state_mirror = object()
+    casambi.unit_index = FakeIndex()
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher._reconnect()
+
+    assert casambi.mirror_refreshes == 1
+    assert casambi.index_builds == 1
+
+
+def test_failed_reseed_still_finishes_the_reconnect():
+    casambi = FakeCasambi([True])
+    casambi.state_mirror = object()
+    casambi.unit_index = FakeIndex()
+    casambi.reseed_error = ConnectionError("REST api unreachable")
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher.send("a")
+    watcher._reconnect()
+
+    assert watcher.connected
+    assert casambi.web_sock.sent == ["a"]
+    assert casambi.mirror_refreshes == 1
+    assert casambi.index_builds == 1
+
+
+def test_supervisor_thread_survives_a_failed_step():
+    casambi = FakeCasambi([True])
+    casambi.stop_reader_errors = [RuntimeError("unexpected")]
+    watcher = supervisor(casambi, ping_interval=0.01)
+
+    watcher.start()
+
+    try:
+        watcher.notify_disconnect("test")
+
+        deadline = time.monotonic() + 5
+        while not watcher.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert watcher.running
+        assert watcher.connected
+    finally:
+        watcher.stop(timeout=5)
+
+
+def test_nothing_is_seeded_without_mirror_or_index():
+    casambi = FakeCasambi([True])
+    watcher = supervisor(casambi)
+
+    watcher.notify_disconnect("test")
+    watcher._reconnect()
+
+    assert casambi.mirror_refreshes == 0
+    assert casambi.index_builds == 0